@@ -1,17 +1,30 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, PriceChange
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
+    # Snapshotted when the line is added; see cart.repricing
+    readonly_fields = ['unit_price']
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'created_at', 'updated_at']
+    list_display = ['user', 'item_count', 'subtotal', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
+    # Maintained from the lines; see cart.summary
+    readonly_fields = ['item_count', 'subtotal']
     inlines = [CartItemInline]
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ['cart', 'controller', 'quantity', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'updated_at'] 
\ No newline at end of file
+    list_display = ['cart', 'controller', 'quantity', 'unit_price', 'created_at', 'updated_at']
+    list_filter = ['created_at', 'updated_at']
+    readonly_fields = ['unit_price']
+
+@admin.register(PriceChange)
+class PriceChangeAdmin(admin.ModelAdmin):
+    list_display = ['controller', 'old_price', 'new_price', 'created_at', 'repriced_at',
+                    'lines_repriced', 'carts_repriced']
+    list_filter = ['repriced_at']
+    list_select_related = ['controller']
+    readonly_fields = list_display 
\ No newline at end of file
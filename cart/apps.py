@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'cart' 
\ No newline at end of file
+    name = 'cart'
+
+    def ready(self):
+        from . import signals  # noqa: F401
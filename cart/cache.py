@@ -0,0 +1,46 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from game_ctrl.metrics import record_cache
+from .store import get_cart_store
+
+
+def cart_badge_key(user_id):
+    return f'cart:badge:{user_id}'
+
+
+def get_cart_badge(user_id):
+    """The user's cart item count and subtotal, cached between cart changes.
+
+    A hit is one cache read; a miss is one read of the cart's stored
+    totals. Views that change a cart call invalidate_cart_badge();
+    changes made elsewhere (repricing, background jobs) show once the
+    entry times out.
+    """
+    key = cart_badge_key(user_id)
+    badge = cache.get(key)
+    record_cache('cart_badge', badge is not None)
+    if badge is None:
+        badge = get_cart_store().summary(user_id)
+        cache.set(key, badge, settings.CART_BADGE_CACHE_TIMEOUT)
+    return badge
+
+
+async def aget_cart_badge(user_id):
+    """get_cart_badge() for async views"""
+    key = cart_badge_key(user_id)
+    badge = await cache.aget(key)
+    record_cache('cart_badge', badge is not None)
+    if badge is None:
+        badge = await sync_to_async(get_cart_store().summary)(user_id)
+        await cache.aset(key, badge, settings.CART_BADGE_CACHE_TIMEOUT)
+    return badge
+
+
+def invalidate_cart_badge(user_id):
+    cache.delete(cart_badge_key(user_id))
+
+
+async def ainvalidate_cart_badge(user_id):
+    await cache.adelete(cart_badge_key(user_id))
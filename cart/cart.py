@@ -1,61 +1,165 @@
 from decimal import Decimal
 from django.conf import settings
 from products.models import Controller
+from .models import Cart, CartItem
+from .store import CartSummary, get_cart_store
+from .summary import MAX_LINE_QUANTITY, LineState, check_change
+from django.core.exceptions import ValidationError
+
+
+def cart_for(request):
+    """The request's cart: the user's stored cart, or the session cart for visitors"""
+    if request.user.is_authenticated:
+        return UserCart(get_cart_store(), request.user.id)
+    return SessionCart(request)
+
+
+class UserCart:
+    """The configured cart store, bound to one user"""
+
+    def __init__(self, store, user_id):
+        self.store = store
+        self.user_id = user_id
+
+    def detail(self):
+        return self.store.detail(self.user_id)
+
+    def summary(self):
+        return self.store.summary(self.user_id)
+
+    def add(self, controller, quantity=1):
+        return self.store.add(self.user_id, controller, quantity)
+
+    def set_many(self, quantities, controllers):
+        return self.store.set_many(self.user_id, quantities, controllers)
+
+    def remove(self, controller_id):
+        self.store.remove(self.user_id, controller_id)
+
+
+class SessionCart:
+    """An anonymous visitor's cart, kept in the session.
+
+    The session holds only integers, as a flat list
+    ``[controller_id, quantity, controller_id, quantity, ...]``; prices
+    are looked up in the catalog when they are needed, so they are never
+    stale and never serialized. Limits match the stored cart's.
+    """
 
-class Cart:
     def __init__(self, request):
         """Initialize the cart."""
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # save an empty cart in the session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
-
-    def add(self, controller, quantity=1, override_quantity=False):
-        """Add a controller to the cart or update its quantity."""
-        controller_id = str(controller.id)
-        if controller_id not in self.cart:
-            self.cart[controller_id] = {'quantity': 0,
-                                      'price': str(controller.price)}
-        if override_quantity:
-            self.cart[controller_id]['quantity'] = quantity
-        else:
-            self.cart[controller_id]['quantity'] += quantity
-        self.save()
+        self.quantities = self._decode(self.session.get(settings.CART_SESSION_ID))
+        self._prices = None
+
+    @staticmethod
+    def _decode(data):
+        if isinstance(data, dict):
+            # Sessions written before the compact encoding
+            return {int(controller_id): int(item['quantity']) for controller_id, item in data.items()}
+        data = data or []
+        return dict(zip(data[::2], data[1::2]))
 
     def save(self):
-        # mark the session as "modified" to make sure it gets saved
-        self.session.modified = True
+        self.session[settings.CART_SESSION_ID] = [
+            number for line in sorted(self.quantities.items()) for number in line
+        ]
+        self._prices = None
+
+    def prices(self):
+        """Current prices of the controllers in the cart, in one query"""
+        if self._prices is None:
+            self._prices = dict(
+                Controller.objects.filter(pk__in=list(self.quantities)).values_list('pk', 'price')
+            ) if self.quantities else {}
+        return self._prices
+
+    def summary(self):
+        prices = self.prices()
+        return CartSummary(
+            sum(quantity for controller_id, quantity in self.quantities.items() if controller_id in prices),
+            sum((prices[controller_id] * quantity for controller_id, quantity in self.quantities.items()
+                 if controller_id in prices), Decimal('0.00')),
+        )
+
+    def detail(self):
+        """A summary Cart and lines with their controllers, like the stores return"""
+        controllers = Controller.objects.in_bulk(list(self.quantities)) if self.quantities else {}
+        self._prices = {controller_id: controller.price for controller_id, controller in controllers.items()}
+        lines = [
+            CartItem(controller=controllers[controller_id], quantity=quantity,
+                     unit_price=controllers[controller_id].price)
+            for controller_id, quantity in sorted(self.quantities.items())
+            if controller_id in controllers
+        ]
+        if not lines:
+            return None, []
+        summary = self.summary()
+        return Cart(item_count=summary.item_count, subtotal=summary.subtotal), lines
 
-    def remove(self, controller):
+    def add(self, controller, quantity=1):
+        """Add a controller to the cart or increase its quantity."""
+        current = self.quantities.get(controller.id, 0)
+        if current + quantity > MAX_LINE_QUANTITY:
+            raise ValidationError("Maximum quantity exceeded")
+        summary = self.summary()
+        check_change(summary.item_count, summary.subtotal, quantity, controller.price * quantity)
+        self.quantities[controller.id] = current + quantity
+        self.save()
+        return LineState(None, current + quantity, created=not current)
+
+    def set_many(self, quantities, controllers):
+        """Set several quantities at once; 0 removes a line."""
+        prices = self.prices()
+        units = amount = 0
+        for controller_id, quantity in quantities.items():
+            current = self.quantities.get(controller_id, 0) if controller_id in prices else 0
+            units += quantity - current
+            amount += controllers[controller_id].price * quantity - prices.get(controller_id, 0) * current
+        summary = self.summary()
+        check_change(summary.item_count, summary.subtotal, units, amount)
+        for controller_id, quantity in quantities.items():
+            if quantity:
+                self.quantities[controller_id] = quantity
+            else:
+                self.quantities.pop(controller_id, None)
+        self.save()
+        return self.summary()
+
+    def remove(self, controller_id):
         """Remove a controller from the cart."""
-        controller_id = str(controller.id)
-        if controller_id in self.cart:
-            del self.cart[controller_id]
+        if self.quantities.pop(int(controller_id), None) is not None:
             self.save()
 
     def __iter__(self):
-        """Iterate over the items in the cart and get the controllers from the database."""
-        controller_ids = self.cart.keys()
-        # get the controller objects and add them to the cart
-        controllers = Controller.objects.filter(id__in=controller_ids)
-        cart = self.cart.copy()
-        for controller in controllers:
-            cart[str(controller.id)]['controller'] = controller
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        """Iterate over the lines, with their controllers, without touching the session."""
+        return iter(self.detail()[1])
 
     def __len__(self):
         """Count all items in the cart."""
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(self.quantities.values())
 
     def get_total_price(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return self.summary().subtotal
+
+    def merge_into(self, store, user_id):
+        """Move the visitor's lines into a user's stored cart, then empty this one.
+
+        Returns the number of lines merged.
+        """
+        controllers = Controller.objects.in_bulk(list(self.quantities)) if self.quantities else {}
+        if controllers:
+            store.merge(
+                user_id,
+                {controller_id: quantity for controller_id, quantity in self.quantities.items()
+                 if controller_id in controllers},
+                controllers,
+            )
+        self.clear()
+        return len(controllers)
 
     def clear(self):
         # remove cart from session
-        del self.session[settings.CART_SESSION_ID]
-        self.save() 
\ No newline at end of file
+        self.quantities = {}
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self._prices = None
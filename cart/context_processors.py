@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django.utils.functional import SimpleLazyObject
+
+from .cache import aget_cart_badge, get_cart_badge
+from .store import CartSummary
+
+
+def cart_badge(request):
+    """The navbar cart badge, looked up only if a template reads it.
+
+    Visitors get an empty badge: anonymous catalog pages are cached and
+    shared (see products.cache), so they must not show a session cart.
+    """
+    def badge():
+        if not request.user.is_authenticated:
+            return CartSummary(0, Decimal('0.00'))
+        return get_cart_badge(request.user.id)
+
+    return {'cart_badge': SimpleLazyObject(badge)}
+
+
+async def acart_badge(request):
+    """The badge for async views, looked up up front.
+
+    Templates render synchronously, so inside the event loop the lazy
+    badge above cannot reach the database; async views put this in their
+    context instead, which takes precedence over the context processor.
+    ``request.user`` must already be resolved.
+    """
+    if not request.user.is_authenticated:
+        return {'cart_badge': CartSummary(0, Decimal('0.00'))}
+    return {'cart_badge': await aget_cart_badge(request.user.id)}
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from cart.store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the cart store back to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Carts written per database transaction')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no carts are dirty')
+        parser.add_argument('--once', action='store_true',
+                            help='Flush everything dirty now, then exit')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        store = get_cart_store()
+        total = 0
+        try:
+            while True:
+                flushed = store.flush(options['batch_size'])
+                total += flushed
+                if flushed and options['verbosity'] >= 2:
+                    self.stdout.write(f'Flushed {flushed} carts')
+                if flushed < options['batch_size']:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Whatever is still dirty stays dirty for the next worker
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} carts'))
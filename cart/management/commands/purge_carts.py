@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from cart.purge import purge_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete carts nobody has touched for a number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Delete carts not changed for this many days')
+        parser.add_argument('--empty-days', type=int,
+                            help='Delete empty carts after this many days instead')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Carts deleted per database transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to wait between chunks')
+        parser.add_argument('--archive',
+                            help='Append the deleted carts to this gzipped JSONL file first')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the carts that would be deleted without deleting them')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        if options['days'] < 1 or (options['empty_days'] is not None and options['empty_days'] < 1):
+            raise CommandError('--days and --empty-days must be positive')
+        try:
+            result = purge_carts(
+                options['days'], options['empty_days'], options['chunk_size'],
+                archive_path=options['archive'], dry_run=options['dry_run'], pause=options['pause'],
+            )
+        except OSError as e:
+            raise CommandError(f'Cannot write archive: {e}')
+        if options['dry_run']:
+            self.stdout.write(f'Would delete {result.carts} carts with {result.lines} lines')
+            return
+        reclaimed = '' if result.bytes_reclaimed is None else f', {filesizeformat(result.bytes_reclaimed)}'
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {result.carts} carts and {result.lines} lines in {result.chunks} chunks{reclaimed}'
+        ))
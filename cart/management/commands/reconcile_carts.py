@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from cart.models import Cart
+from cart.summary import drifted, refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Find carts whose item_count or subtotal drifted from their lines and fix them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Carts checked per UPDATE, by primary key range')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count drifted carts')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        last = Cart.objects.aggregate(last=Max('pk'))['last'] or 0
+        found = 0
+        # Key ranges keep each statement small and the row locks short
+        for start in range(0, last + 1, batch_size):
+            carts = Cart.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            if options['dry_run']:
+                found += drifted(carts).count()
+            else:
+                found += refresh_summaries(carts)
+        if options['dry_run']:
+            self.stdout.write(f'{found} carts have drifted')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {found} drifted carts'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from cart.repricing import reprice_pending
+
+
+class Command(BaseCommand):
+    help = 'Carry recorded controller price changes into cart lines and totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Cart lines repriced per database transaction')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait when no price changes are pending')
+        parser.add_argument('--once', action='store_true',
+                            help='Apply every pending change now, then exit')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        applied = lines = 0
+        try:
+            while True:
+                changes = reprice_pending(options['batch_size'], limit=100)
+                for change in changes:
+                    applied += 1
+                    lines += change.lines_repriced
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(
+                            f'{change}: {change.lines_repriced} lines in {change.carts_repriced} carts'
+                        )
+                if not changes:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Changes not yet marked repriced are picked up by the next run
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} price changes to {lines} cart lines'))
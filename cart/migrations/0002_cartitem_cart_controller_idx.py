@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('products', '0004_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'controller'], name='cartitem_cart_controller_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold repeated (cart, controller) lines into the oldest one"""
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.order_by().values('cart_id', 'controller_id')
+        .annotate(n=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        lines = CartItem.objects.filter(cart_id=row['cart_id'], controller_id=row['controller_id'])
+        lines.filter(pk=row['keep']).update(quantity=row['quantity'])
+        lines.exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0004_cart_summary'),
+        ('products', '0006_controller_sku'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'controller'), name='cartitem_cart_controller_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='cartitem',
+            name='cartitem_cart_controller_idx',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_prices(apps, schema_editor):
+    """Existing lines take their controller's current price"""
+    CartItem = apps.get_model('cart', 'CartItem')
+    Controller = apps.get_model('products', 'Controller')
+    CartItem.objects.update(unit_price=Subquery(
+        Controller.objects.filter(pk=OuterRef('controller_id')).values('price')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_cartitem_unique_line'),
+        ('products', '0006_controller_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('repriced_at', models.DateTimeField(blank=True, null=True)),
+                ('lines_repriced', models.PositiveIntegerField(default=0)),
+                ('carts_repriced', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['controller', 'id'], name='cartitem_controller_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='cartitem',
+            name='controller',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='products.controller'),
+        ),
+        migrations.AddField(
+            model_name='pricechange',
+            name='controller',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_changes', to='products.controller'),
+        ),
+        migrations.AddIndex(
+            model_name='pricechange',
+            index=models.Index(condition=models.Q(('repriced_at__isnull', True)), fields=['id'], name='pricechange_pending_idx'),
+        ),
+    ]
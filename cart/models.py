@@ -1,30 +1,114 @@
 from django.db import models
+from django.db.models import DecimalField, F, Prefetch
 from django.contrib.auth.models import User
 from products.models import Controller
 from decimal import Decimal
 
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_total():
+    return models.ExpressionWrapper(F('quantity') * F('unit_price'), output_field=MONEY)
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Join each line's controller (for its name) and annotate ``line_total``"""
+        return self.select_related('controller').annotate(line_total=line_total())
+
+
+class CartQuerySet(models.QuerySet):
+    def with_lines(self):
+        """Prefetch each cart's lines, with totals, into ``cart.lines``"""
+        # Ordered along the (cart, controller) index so no sort is needed
+        return self.prefetch_related(Prefetch(
+            'items',
+            queryset=CartItem.objects.with_totals().order_by('cart_id', 'controller_id'),
+            to_attr='lines',
+        ))
+
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Units and value of the lines, kept current by cart.summary
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Carts by last activity, for keyset chunks in cart.purge
+            models.Index(fields=['updated_at', 'id'], name='cart_updated_at_id_idx'),
+        ]
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.subtotal
 
     def __str__(self):
         return f"Cart for {self.user.username}"
 
 class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
-    controller = models.ForeignKey(Controller, on_delete=models.CASCADE)
+    # Indexed by cartitem_cart_controller_uniq, which also serves line order
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE, db_index=False)
+    # Indexed by cartitem_controller_id_idx
+    controller = models.ForeignKey(Controller, on_delete=models.CASCADE, db_index=False)
     quantity = models.PositiveIntegerField(default=1)
+    # The controller's price when the line was added; only cart.repricing
+    # moves it to a newer price
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One line per controller; the conflict target of summary.upsert_line
+            models.UniqueConstraint(fields=['cart', 'controller'], name='cartitem_cart_controller_uniq'),
+        ]
+        indexes = [
+            # A controller's lines in id order, for keyset batches in cart.repricing
+            models.Index(fields=['controller', 'id'], name='cartitem_controller_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.controller.price
+        super().save(*args, **kwargs)
+
     @property
     def total_price(self):
-        return self.controller.price * self.quantity
+        if hasattr(self, 'line_total'):
+            return self.line_total
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.quantity}x {self.controller.name}" 
+
+class PriceChange(models.Model):
+    """A controller's price moved; cart.repricing carries it into carts"""
+    controller = models.ForeignKey(Controller, related_name='price_changes', on_delete=models.CASCADE)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Filled in by cart.repricing
+    repriced_at = models.DateTimeField(null=True, blank=True)
+    lines_repriced = models.PositiveIntegerField(default=0)
+    carts_repriced = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The queue of changes still to process
+            models.Index(fields=['id'], condition=models.Q(repriced_at__isnull=True),
+                         name='pricechange_pending_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.quantity}x {self.controller.name}" 
\ No newline at end of file
+        return f"{self.controller_id}: {self.old_price} -> {self.new_price}"
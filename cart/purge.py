@@ -0,0 +1,165 @@
+"""
+Removing abandoned carts.
+
+Cart.updated_at moves on every change a shopper makes (see cart.summary),
+so a cart whose updated_at is older than the cutoff has been left alone
+that long. purge_carts(), run by the purge_carts command, deletes such
+carts and their lines. Empty carts, left behind by shoppers who removed
+everything, can be given a shorter cutoff of their own.
+
+The candidates are walked in (updated_at, id) order along
+cart_updated_at_id_idx, in keyset chunks. Each chunk is one short
+transaction that:
+
+* locks the chunk's carts, skipping any a shopper holds right now, and
+  re-checks them against the cutoff, so a cart touched since it was
+  read is kept;
+* optionally appends each cart and its lines to a gzipped JSONL archive;
+* deletes the lines, then the carts, with one statement each and no
+  signals, since the summaries go with the carts.
+
+Carts live in Redis are written back by the next flush, so the age
+should stay well above CART_REDIS_TTL. On PostgreSQL the bytes reported
+are the size of the deleted rows, which VACUUM makes reusable; the
+indexes shrink by more than that.
+"""
+import gzip
+import json
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import cart_badge_key
+from .models import Cart, CartItem
+
+ARCHIVE_CART_FIELDS = ('id', 'user_id', 'created_at', 'updated_at', 'item_count', 'subtotal')
+ARCHIVE_LINE_FIELDS = ('cart_id', 'controller_id', 'quantity', 'unit_price', 'created_at', 'updated_at')
+
+
+@dataclass
+class PurgeResult:
+    carts: int = 0
+    lines: int = 0
+    # Size of the deleted rows; None where the database cannot say
+    bytes_reclaimed: int = None
+    chunks: int = 0
+
+    def add(self, carts, lines, size):
+        self.carts += carts
+        self.lines += lines
+        if size is not None:
+            self.bytes_reclaimed = (self.bytes_reclaimed or 0) + size
+        self.chunks += 1
+
+
+def stale_carts(days, empty_days=None, now=None):
+    """Carts untouched for ``days``, and empty ones untouched for ``empty_days``"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=days)
+    if empty_days is None:
+        return Cart.objects.filter(updated_at__lt=cutoff)
+    empty_cutoff = now - timedelta(days=empty_days)
+    # One range over the index, the rest a filter on the rows it returns;
+    # emptiness is read from the summary so the walk never reads lines
+    return Cart.objects.filter(
+        Q(updated_at__lt=cutoff) | Q(item_count=0, updated_at__lt=empty_cutoff),
+        updated_at__lt=max(cutoff, empty_cutoff),
+    )
+
+
+def _next_chunk(carts, after, chunk_size):
+    """(updated_at, id) of the next ``chunk_size`` carts after the ``after`` pair"""
+    if after is not None:
+        updated_at, pk = after
+        carts = carts.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk),
+            updated_at__gte=updated_at,
+        )
+    return list(carts.order_by('updated_at', 'pk').values_list('updated_at', 'pk')[:chunk_size])
+
+
+def _delete(model, column, ids):
+    """Delete ``model`` rows whose ``column`` is in ``ids``; returns (rows, bytes or None)"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    where = f"{connection.ops.quote_name(column)} IN ({', '.join(['%s'] * len(ids))})"
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"WITH gone AS (DELETE FROM {table} AS t WHERE {where} RETURNING pg_column_size(t.*) AS size) "
+                f"SELECT count(*), coalesce(sum(size), 0) FROM gone",
+                list(ids),
+            )
+            rows, size = cursor.fetchone()
+            return rows, int(size)
+        cursor.execute(f"DELETE FROM {table} WHERE {where}", list(ids))
+        return cursor.rowcount, None
+
+
+def _archive(archive, cart_ids):
+    """Append the carts, each with its lines, to ``archive`` as JSON lines"""
+    lines = {}
+    for line in (
+        CartItem.objects.filter(cart_id__in=cart_ids)
+        .order_by('cart_id', 'controller_id').values(*ARCHIVE_LINE_FIELDS)
+    ):
+        lines.setdefault(line.pop('cart_id'), []).append(line)
+    for cart in Cart.objects.filter(pk__in=cart_ids).order_by('pk').values(*ARCHIVE_CART_FIELDS):
+        cart['items'] = lines.get(cart['id'], [])
+        archive.write(json.dumps(cart, cls=DjangoJSONEncoder) + '\n')
+    # Out of the compressor before the delete commits
+    archive.flush()
+
+
+def _purge_chunk(carts, candidates, archive, dry_run):
+    with transaction.atomic():
+        locked = carts.filter(pk__in=candidates)
+        if not dry_run:
+            locked = locked.select_for_update(skip_locked=True)
+        locked = list(locked.order_by('pk').values_list('pk', 'user_id'))
+        cart_ids = [pk for pk, _ in locked]
+        if not cart_ids:
+            return 0, 0, None, []
+        if dry_run:
+            lines = CartItem.objects.filter(cart_id__in=cart_ids).count()
+            return len(cart_ids), lines, None, []
+        if archive is not None:
+            _archive(archive, cart_ids)
+        lines, line_bytes = _delete(CartItem, 'cart_id', cart_ids)
+        deleted, cart_bytes = _delete(Cart, 'id', cart_ids)
+    size = None if cart_bytes is None else cart_bytes + line_bytes
+    return deleted, lines, size, [user_id for _, user_id in locked]
+
+
+def purge_carts(days, empty_days=None, chunk_size=500, archive_path=None, dry_run=False, pause=0):
+    """Delete carts untouched for ``days`` (empty ones after ``empty_days``).
+
+    Appends them to the gzipped JSONL file at ``archive_path`` first when
+    given, and sleeps ``pause`` seconds between chunks. With ``dry_run``
+    nothing is written or deleted; the result counts what would go.
+    Returns a PurgeResult.
+    """
+    carts = stale_carts(days, empty_days)
+    result = PurgeResult()
+    archive = gzip.open(archive_path, 'at', encoding='utf-8') if archive_path and not dry_run else None
+    try:
+        after = None
+        while True:
+            chunk = _next_chunk(carts, after, chunk_size)
+            if not chunk:
+                break
+            after = chunk[-1]
+            deleted, lines, size, user_ids = _purge_chunk(carts, [pk for _, pk in chunk], archive, dry_run)
+            result.add(deleted, lines, size)
+            cache.delete_many([cart_badge_key(user_id) for user_id in user_ids])
+            if pause and len(chunk) == chunk_size:
+                time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+    return result
@@ -0,0 +1,86 @@
+"""
+Carrying controller price changes into carts.
+
+Cart lines keep the unit price they were added at, so saving a
+controller only records a PriceChange (see cart.signals); the storefront
+never reprices carts inline. reprice_pending(), run by the reprice_carts
+command, works through the recorded changes. For each one it walks the
+controller's lines in id order, in keyset batches over the
+(controller, id) index, and for each batch:
+
+* locks the batch's carts, in the same cart-then-line order as
+  cart.summary, so it cannot deadlock with shoppers;
+* moves the lines still at another price to the controller's current
+  price with one UPDATE, and re-totals their carts with another;
+* commits, so locks are short and an interrupted run loses nothing.
+
+The change row then records when it was applied and how many lines and
+carts it touched.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Controller
+from .models import Cart, CartItem, PriceChange
+from .store import get_cart_store
+from .summary import refresh_summaries
+
+
+def _reprice_batch(controller_id, price, after, batch_size):
+    """Reprice the next batch of a controller's lines after id ``after``.
+
+    Returns (last line id seen or None when done, lines repriced, carts repriced).
+    """
+    with transaction.atomic():
+        batch = list(
+            CartItem.objects.filter(controller_id=controller_id, pk__gt=after)
+            .exclude(unit_price=price)
+            .order_by('pk')
+            .values_list('pk', 'cart_id')[:batch_size]
+        )
+        if not batch:
+            return None, 0, 0
+        cart_ids = {cart_id for _, cart_id in batch}
+        user_ids = list(
+            Cart.objects.select_for_update().filter(pk__in=cart_ids).order_by('pk')
+            .values_list('user_id', flat=True)
+        )
+        lines = (
+            CartItem.objects.filter(pk__in=[pk for pk, _ in batch])
+            .exclude(unit_price=price)
+            .update(unit_price=price, updated_at=timezone.now())
+        )
+        refresh_summaries(Cart.objects.filter(pk__in=cart_ids))
+    get_cart_store().reprice(user_ids, controller_id, price)
+    return batch[-1][0], lines, len(cart_ids)
+
+
+def reprice_change(change, batch_size=1000):
+    """Move every cart line for ``change.controller`` to its current price.
+
+    The current price rather than ``change.new_price``: when a price
+    moves twice before the job runs, the first change applies the latest
+    price and the second finds nothing left to do.
+    """
+    price = Controller.objects.filter(pk=change.controller_id).values_list('price', flat=True).get()
+    after, lines, carts = 0, 0, 0
+    while after is not None:
+        after, batch_lines, batch_carts = _reprice_batch(change.controller_id, price, after, batch_size)
+        lines += batch_lines
+        carts += batch_carts
+    change.repriced_at = timezone.now()
+    change.lines_repriced, change.carts_repriced = lines, carts
+    change.save(update_fields=['repriced_at', 'lines_repriced', 'carts_repriced'])
+    return change
+
+
+def pending_changes():
+    return PriceChange.objects.filter(repriced_at__isnull=True).order_by('pk')
+
+
+def reprice_pending(batch_size=1000, limit=None):
+    """Apply up to ``limit`` pending price changes, oldest first; returns those applied"""
+    changes = pending_changes()
+    if limit is not None:
+        changes = changes[:limit]
+    return [reprice_change(change, batch_size) for change in changes]
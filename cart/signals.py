@@ -0,0 +1,88 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from game_ctrl.metrics import record_cart_mutation
+from products.models import Controller
+from .cache import invalidate_cart_badge
+from .cart import SessionCart
+from .models import CartItem, PriceChange
+from .store import get_cart_store
+from .summary import adjust
+
+
+def _apply(instance, units, amount):
+    """Adjust the line's cart, and a cart already loaded on the line too"""
+    adjust(instance.cart_id, units, amount)
+    cart = instance._state.fields_cache.get('cart')
+    if cart is not None:
+        cart.item_count = max(cart.item_count + units, 0)
+        cart.subtotal = max(cart.subtotal + amount, 0)
+
+
+@receiver(pre_save, sender=CartItem)
+def remember_line(sender, instance, raw=False, **kwargs):
+    """Note what a line contributed to its cart before this save"""
+    instance._line_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._line_before = (
+        CartItem.objects.filter(pk=instance.pk)
+        .values_list('cart_id', 'quantity', 'unit_price')
+        .first()
+    )
+
+
+@receiver(post_save, sender=CartItem)
+def count_line(sender, instance, created, raw=False, **kwargs):
+    """Move a saved line's units and value into its cart's summary"""
+    if raw:
+        return
+    units, amount = instance.quantity, instance.quantity * instance.unit_price
+    before = getattr(instance, '_line_before', None)
+    if before is not None:
+        cart_id, quantity, price = before
+        if cart_id == instance.cart_id:
+            units, amount = units - quantity, amount - quantity * price
+        else:
+            adjust(cart_id, -quantity, -quantity * price)
+    _apply(instance, units, amount)
+
+
+@receiver(pre_delete, sender=CartItem)
+def release_line(sender, instance, **kwargs):
+    """Take a line out of its cart's summary as it is deleted"""
+    _apply(instance, -instance.quantity, -instance.quantity * instance.unit_price)
+
+
+@receiver(pre_save, sender=Controller)
+def remember_price(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Note a controller's stored price before this save"""
+    instance._price_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    instance._price_before = (
+        Controller.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Controller)
+def record_price_change(sender, instance, created, raw=False, **kwargs):
+    """Queue a price change for cart.repricing; carts keep their prices until then"""
+    before = getattr(instance, '_price_before', None)
+    if raw or created or before is None or before == instance.price:
+        return
+    PriceChange.objects.create(controller=instance, old_price=before, new_price=instance.price)
+
+
+@receiver(user_logged_in)
+def persist_cart_on_login(sender, request, user, **kwargs):
+    """Fold the visitor's session cart into the user's, then make it durable"""
+    store = get_cart_store()
+    if request is not None and hasattr(request, 'session'):
+        if SessionCart(request).merge_into(store, user.pk):
+            record_cart_mutation('merge')
+        invalidate_cart_badge(user.pk)
+    store.persist(user.pk)
@@ -0,0 +1,355 @@
+"""
+Pluggable cart storage.
+
+Views read and change carts through get_cart_store(), which returns the
+backend named by settings.CART_STORE.
+
+DatabaseCartStore, the default, works on Cart and CartItem directly
+through cart.summary.
+
+RedisCartStore keeps each live cart as a Redis hash, so showing or
+changing a cart needs no database writes. Every change bumps the cart's
+version and marks it dirty; the flush_carts worker copies dirty carts to
+Cart/CartItem in batches (write-behind), and persist() does the same at
+once for one cart where durability matters, such as login and checkout.
+A cart is only marked clean if its version did not move while it was
+being written, so a crash or a concurrent change leaves it dirty for the
+next flush. A cart missing from Redis, whether idle past CART_REDIS_TTL
+or lost with the Redis server, is loaded back from the database on first
+use. Lines keep the unit price they were added at, as in the database;
+reprice() moves live carts along with cart.repricing.
+
+Hash layout, one per user::
+
+    cart:<user_id>  item_count, subtotal, version,
+                    q:<controller_id> quantity, p:<controller_id> unit price
+    cart:dirty      set of user ids awaiting a flush
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from products.models import Controller
+from .models import Cart, CartItem
+from .summary import (
+    MAX_LINE_QUANTITY, LineState, add_item, check_change, delete_lines,
+    merge_lines, refresh_summaries, set_quantities,
+)
+
+_stores = {}
+
+
+def get_cart_store():
+    """The configured cart store, created once per backend path"""
+    path = settings.CART_STORE
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+@dataclass
+class CartSummary:
+    item_count: int
+    subtotal: Decimal
+
+
+class DatabaseCartStore:
+    """Carts live only in Cart and CartItem"""
+
+    def detail(self, user_id):
+        """The cart and its lines with their controllers, or (None, [])"""
+        try:
+            cart = Cart.objects.with_lines().get(user_id=user_id)
+        except Cart.DoesNotExist:
+            return None, []
+        return cart, cart.lines
+
+    def summary(self, user_id):
+        """The cart's stored totals, from one single-row read"""
+        row = Cart.objects.filter(user_id=user_id).values_list('item_count', 'subtotal').first()
+        return CartSummary(*row) if row else CartSummary(0, Decimal('0.00'))
+
+    def add(self, user_id, controller, quantity):
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        return add_item(cart, controller, quantity)
+
+    def set_many(self, user_id, quantities, controllers):
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        return set_quantities(cart, quantities, controllers)
+
+    def remove(self, user_id, controller_id):
+        CartItem.objects.filter(cart__user_id=user_id, controller_id=controller_id).delete()
+
+    def merge(self, user_id, quantities, controllers):
+        """Add a visitor's lines to the user's cart in one bulk upsert"""
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        merge_lines(cart.pk, quantities, {
+            controller_id: controller.price for controller_id, controller in controllers.items()
+        })
+
+    def reprice(self, user_ids, controller_id, price):
+        """Nothing to do; cart.repricing updates the database lines itself"""
+
+    def persist(self, user_id):
+        """Nothing to do; every change is already in the database"""
+
+    def flush(self, limit=None):
+        return 0
+
+
+def write_carts(carts):
+    """Make users' database carts match ``carts``, {user_id: {controller_id: (quantity, unit price)}}.
+
+    One transaction for the whole batch. Lines for controllers or users
+    deleted since the change was made are dropped.
+    """
+    controller_ids = {controller_id for lines in carts.values() for controller_id in lines}
+    with transaction.atomic():
+        users = set(User.objects.filter(pk__in=list(carts)).values_list('pk', flat=True))
+        live = set(Controller.objects.filter(pk__in=list(controller_ids)).values_list('pk', flat=True))
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in users], ignore_conflicts=True)
+        cart_ids = dict(Cart.objects.filter(user_id__in=list(users)).values_list('user_id', 'pk'))
+        # The changes happened in Redis; record them as cart activity
+        Cart.objects.filter(pk__in=list(cart_ids.values())).update(updated_at=timezone.now())
+        existing = {
+            (line.cart_id, line.controller_id): line
+            for line in CartItem.objects.filter(cart_id__in=list(cart_ids.values()))
+        }
+
+        created, changed, wanted = [], [], set()
+        now = timezone.now()
+        for user_id, cart_id in cart_ids.items():
+            for controller_id, (quantity, price) in carts[user_id].items():
+                if controller_id not in live:
+                    continue
+                wanted.add((cart_id, controller_id))
+                line = existing.get((cart_id, controller_id))
+                if line is None:
+                    created.append(CartItem(
+                        cart_id=cart_id, controller_id=controller_id, quantity=quantity, unit_price=price,
+                    ))
+                elif (line.quantity, line.unit_price) != (quantity, price):
+                    line.quantity, line.unit_price, line.updated_at = quantity, price, now
+                    changed.append(line)
+
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(changed, ['quantity', 'unit_price', 'updated_at'])
+        delete_lines([line.pk for key, line in existing.items() if key not in wanted])
+        refresh_summaries(Cart.objects.filter(pk__in=list(cart_ids.values())))
+    return len(cart_ids)
+
+
+def _lines(state):
+    """{controller_id: (quantity, unit price)} from a cart hash"""
+    return {
+        int(field[2:]): (int(value), Decimal(state[f'p:{field[2:]}']))
+        for field, value in state.items()
+        if field.startswith('q:')
+    }
+
+
+class RedisCartStore:
+    """Live carts as Redis hashes, written behind to the database"""
+
+    def __init__(self, client=None, prefix='cart', ttl=None):
+        self.client = client or redis.Redis.from_url(settings.CART_REDIS_URL, decode_responses=True)
+        self.prefix = prefix
+        self.ttl = settings.CART_REDIS_TTL if ttl is None else ttl
+        self.dirty_key = f'{prefix}:dirty'
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def load(self, user_id):
+        """A user's database cart as hash fields"""
+        state = {'version': '0'}
+        item_count, subtotal = 0, Decimal('0.00')
+        lines = (
+            CartItem.objects.filter(cart__user_id=user_id)
+            .values_list('controller_id', 'quantity', 'unit_price')
+        )
+        for controller_id, quantity, price in lines:
+            state[f'q:{controller_id}'] = str(quantity)
+            state[f'p:{controller_id}'] = str(price)
+            item_count += quantity
+            subtotal += quantity * price
+        state.update(item_count=str(item_count), subtotal=str(subtotal))
+        return state
+
+    def _update(self, user_id, targets, prices, limits=True):
+        """Set lines to ``targets(lines)`` atomically; returns (summary, lines before)"""
+        key = self.key(user_id)
+
+        def apply(pipe):
+            state = pipe.hgetall(key)
+            loaded = not state
+            if loaded:
+                state = self.load(user_id)
+            lines = _lines(state)
+            units, amount = 0, Decimal('0.00')
+            fields, removed = {}, []
+            for controller_id, quantity in targets(lines).items():
+                current, price = lines.get(controller_id, (0, None))
+                if quantity == current:
+                    continue
+                if not current:
+                    # New lines take the catalog price; existing ones keep theirs
+                    price = prices[controller_id]
+                units += quantity - current
+                amount += price * (quantity - current)
+                if quantity:
+                    fields.update({f'q:{controller_id}': quantity, f'p:{controller_id}': str(price)})
+                else:
+                    removed += [f'q:{controller_id}', f'p:{controller_id}']
+
+            item_count, subtotal = int(state['item_count']), Decimal(state['subtotal'])
+            if limits:
+                check_change(item_count, subtotal, units, amount)
+            summary = CartSummary(item_count + units, subtotal + amount)
+            pipe.multi()
+            if loaded:
+                pipe.hset(key, mapping=state)
+            if fields or removed:
+                fields.update(item_count=summary.item_count, subtotal=str(summary.subtotal))
+                pipe.hset(key, mapping=fields)
+                if removed:
+                    pipe.hdel(key, *removed)
+                pipe.hincrby(key, 'version', 1)
+                pipe.sadd(self.dirty_key, user_id)
+            if self.ttl:
+                pipe.expire(key, self.ttl)
+            return summary, lines
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def _state(self, user_id):
+        """The cart hash, loading it from the database if Redis has none"""
+        key = self.key(user_id)
+
+        def read(pipe):
+            state = pipe.hgetall(key)
+            if not state:
+                state = self.load(user_id)
+                pipe.multi()
+                pipe.hset(key, mapping=state)
+                if self.ttl:
+                    pipe.expire(key, self.ttl)
+            return state
+
+        return self.client.transaction(read, key, value_from_callable=True)
+
+    def detail(self, user_id):
+        """The cart summary and its lines, with controllers loaded in one query"""
+        state = self._state(user_id)
+        lines = _lines(state)
+        controllers = Controller.objects.in_bulk(list(lines)) if lines else {}
+        cart = Cart(user_id=user_id, item_count=int(state['item_count']), subtotal=Decimal(state['subtotal']))
+        items = []
+        for controller_id, (quantity, price) in sorted(lines.items()):
+            if controller_id in controllers:
+                items.append(CartItem(controller=controllers[controller_id], quantity=quantity, unit_price=price))
+        return cart, items
+
+    def summary(self, user_id):
+        state = self._state(user_id)
+        return CartSummary(int(state['item_count']), Decimal(state['subtotal']))
+
+    def add(self, user_id, controller, quantity):
+        def targets(lines):
+            total = lines.get(controller.pk, (0,))[0] + quantity
+            if total > MAX_LINE_QUANTITY:
+                raise ValidationError("Maximum quantity exceeded")
+            return {controller.pk: total}
+
+        summary, before = self._update(user_id, targets, {controller.pk: controller.price})
+        current = before.get(controller.pk, (0,))[0]
+        return LineState(None, current + quantity, created=not current)
+
+    def set_many(self, user_id, quantities, controllers):
+        prices = {controller_id: controller.price for controller_id, controller in controllers.items()}
+        summary, before = self._update(user_id, lambda lines: quantities, prices)
+        return summary
+
+    def remove(self, user_id, controller_id):
+        self._update(user_id, lambda lines: {controller_id: 0}, {})
+
+    def merge(self, user_id, quantities, controllers):
+        """Add a visitor's lines to the user's cart, clamping each at the line cap"""
+        def targets(lines):
+            return {
+                controller_id: min(lines.get(controller_id, (0,))[0] + quantity, MAX_LINE_QUANTITY)
+                for controller_id, quantity in quantities.items()
+            }
+
+        prices = {controller_id: controller.price for controller_id, controller in controllers.items()}
+        self._update(user_id, targets, prices, limits=False)
+
+    def reprice(self, user_ids, controller_id, price):
+        """Move live carts' lines for a controller to ``price``.
+
+        Carts not in Redis load the repriced lines from the database when
+        next used, so only existing hashes are changed.
+        """
+        quantity_field, price_field = f'q:{controller_id}', f'p:{controller_id}'
+        for user_id in user_ids:
+            key = self.key(user_id)
+
+            def apply(pipe):
+                state = pipe.hgetall(key)
+                if quantity_field not in state or Decimal(state[price_field]) == price:
+                    return
+                amount = int(state[quantity_field]) * (price - Decimal(state[price_field]))
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    price_field: str(price), 'subtotal': str(Decimal(state['subtotal']) + amount),
+                })
+                pipe.hincrby(key, 'version', 1)
+                pipe.sadd(self.dirty_key, user_id)
+
+            self.client.transaction(apply, key)
+
+    def persist(self, user_id):
+        """Write one cart to the database now"""
+        state = self.client.hgetall(self.key(user_id))
+        if state:
+            write_carts({user_id: _lines(state)})
+            self._settle({user_id: state})
+
+    def flush(self, limit=500):
+        """Write up to ``limit`` dirty carts to the database; returns how many were written"""
+        user_ids = [int(user_id) for user_id in self.client.srandmember(self.dirty_key, limit)]
+        if not user_ids:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(self.key(user_id))
+        snapshots = dict(zip(user_ids, pipe.execute()))
+        # An expired or lost hash has nothing newer than the database
+        write_carts({user_id: _lines(state) for user_id, state in snapshots.items() if state})
+        self._settle(snapshots)
+        return len(user_ids)
+
+    def _settle(self, snapshots):
+        """Mark carts clean unless they changed after their snapshot was taken"""
+        keys = [self.key(user_id) for user_id in snapshots]
+
+        def settle(pipe):
+            clean = [
+                user_id for user_id, state in snapshots.items()
+                if pipe.hget(self.key(user_id), 'version') in (None, state.get('version'))
+            ]
+            pipe.multi()
+            if clean:
+                pipe.srem(self.dirty_key, *clean)
+
+        self.client.transaction(settle, *keys)
+
+    def dirty_count(self):
+        return self.client.scard(self.dirty_key)
@@ -0,0 +1,357 @@
+"""
+Denormalized cart summaries.
+
+Cart.item_count and Cart.subtotal hold the units in a cart and their
+value, so limit checks read one row instead of aggregating the lines.
+Lines saved or deleted through the ORM keep the summary current via the
+handlers in cart.signals, inside the same transaction as the line write.
+
+add_item() and set_quantity() go one step further for the storefront:
+they claim room for a change with a single conditional UPDATE on the
+cart row, which both enforces the limits and serialises concurrent
+writers to one cart, then write the line with statements that send no
+signals. add_item() writes its line with upsert_line(), a single
+INSERT ... ON CONFLICT DO UPDATE bounded by the per-line cap.
+
+Lines are valued at CartItem.unit_price, the controller's price when the
+line was added, so summaries never depend on the live catalog. Units
+added to an existing line take the line's price; cart.repricing moves
+lines to a new price once a change is processed.
+
+Every write that changes a cart's lines also moves Cart.updated_at, the
+activity clock cart.purge uses to find abandoned carts; refresh_summaries()
+and repricing leave it alone, since they are not the shopper's doing.
+
+Bulk writes that skip signals (bulk_create, COPY, raw SQL) must call
+refresh_summaries() for the carts they touch; reconcile_carts finds and
+fixes any remaining drift.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import MONEY, Cart, CartItem, line_total
+
+MAX_CART_ITEMS = 20  # Maximum total items in cart
+MAX_TOTAL_PRICE = 20000  # Maximum cart total
+MAX_LINE_QUANTITY = 10  # Maximum units of one controller
+
+
+@dataclass
+class LineState:
+    """A cart line as it stands after an upsert"""
+    item_id: int
+    quantity: int
+    created: bool
+    unit_price: Decimal = None
+
+
+def adjust(cart_id, units, amount):
+    """Add ``units`` and ``amount`` (either may be negative) to a cart's summary"""
+    if not units and not amount:
+        return
+    # Clamped at zero so a drifted summary never fails a delete
+    Cart.objects.filter(pk=cart_id).update(
+        item_count=Greatest(F('item_count') + units, 0),
+        subtotal=Greatest(F('subtotal') + amount, Value(Decimal('0.00')), output_field=MONEY),
+        updated_at=timezone.now(),
+    )
+
+
+def reserve(cart_id, units, amount):
+    """Add to a cart's summary only if it stays within the limits.
+
+    Returns whether the cart row was updated. The row stays locked until
+    the surrounding transaction ends.
+    """
+    return bool(Cart.objects.filter(
+        pk=cart_id,
+        item_count__lte=MAX_CART_ITEMS - units,
+        subtotal__lte=Decimal(MAX_TOTAL_PRICE) - amount,
+    ).update(
+        item_count=F('item_count') + units, subtotal=F('subtotal') + amount, updated_at=timezone.now(),
+    ))
+
+
+def check_limits(cart_id, units=0, amount=0):
+    """Raise ValidationError if adding to the cart would pass a limit"""
+    item_count, subtotal = Cart.objects.filter(pk=cart_id).values_list('item_count', 'subtotal').get()
+    if item_count + units > MAX_CART_ITEMS:
+        raise ValidationError(f"Cart cannot exceed {MAX_CART_ITEMS} items")
+    if subtotal + amount > MAX_TOTAL_PRICE:
+        raise ValidationError(f"Cart total cannot exceed ${MAX_TOTAL_PRICE}")
+
+
+def check_change(item_count, subtotal, units, amount):
+    """Raise ValidationError if a change takes a cart past a limit.
+
+    Shrinking a cart that is already over a limit is always allowed.
+    """
+    if units > 0 and item_count + units > MAX_CART_ITEMS:
+        raise ValidationError(f"Cart cannot exceed {MAX_CART_ITEMS} items")
+    if amount > 0 and subtotal + amount > MAX_TOTAL_PRICE:
+        raise ValidationError(f"Cart total cannot exceed ${MAX_TOTAL_PRICE}")
+
+
+def delete_lines(item_ids):
+    """Delete lines by primary key in one statement, without signals"""
+    if not item_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(CartItem._meta.db_table)} "
+            f"WHERE id IN ({', '.join(['%s'] * len(item_ids))})",
+            list(item_ids),
+        )
+
+
+def _claim(cart_id, units, amount):
+    if units <= 0:
+        adjust(cart_id, units, amount)
+    elif not reserve(cart_id, units, amount):
+        # Only reached on failure, to say which limit was hit
+        check_limits(cart_id, units, amount)
+        raise ValidationError("Cart limits exceeded")
+
+
+def _upsert_sql():
+    qn = connection.ops.quote_name
+    table = qn(CartItem._meta.db_table)
+    return (
+        f"INSERT INTO {table} (cart_id, controller_id, quantity, unit_price, created_at, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT (cart_id, controller_id) DO UPDATE "
+        f"SET quantity = {table}.quantity + excluded.quantity, updated_at = excluded.updated_at "
+        f"WHERE {table}.quantity + excluded.quantity <= %s "
+        f"RETURNING id, quantity, unit_price"
+    )
+
+
+def _db_money(value):
+    return CartItem._meta.get_field('unit_price').get_db_prep_value(value, connection)
+
+
+def upsert_line(cart_id, controller_id, quantity, price, cap=MAX_LINE_QUANTITY):
+    """Insert a line at ``price`` or add ``quantity`` to it, never passing ``cap`` units.
+
+    PostgreSQL and SQLite 3.35+ do this in one statement. An existing
+    line keeps its own unit price. Returns the line's LineState, or None
+    when the cap would be passed. Sends no signals; callers keep the
+    cart summary in step.
+    """
+    if quantity > cap:
+        return None
+    features = connection.features
+    if features.supports_update_conflicts_with_target and features.can_return_columns_from_insert:
+        now = CartItem._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(), [cart_id, controller_id, quantity, _db_money(price), now, now, cap])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        # A line that existed already held at least one unit
+        # SQLite hands decimals back as floats
+        return LineState(
+            row[0], row[1], created=row[1] == quantity,
+            unit_price=Decimal(str(row[2])).quantize(Decimal('0.01')),
+        )
+    return _upsert_line_portable(cart_id, controller_id, quantity, price, cap)
+
+
+def _upsert_line_portable(cart_id, controller_id, quantity, price, cap):
+    """upsert_line() for databases without INSERT ... ON CONFLICT ... RETURNING"""
+    line = CartItem.objects.filter(cart_id=cart_id, controller_id=controller_id)
+    for _ in range(2):
+        if line.filter(quantity__lte=cap - quantity).update(
+            quantity=F('quantity') + quantity, updated_at=timezone.now()
+        ):
+            item_id, total, unit_price = line.values_list('pk', 'quantity', 'unit_price').get()
+            return LineState(item_id, total, created=False, unit_price=unit_price)
+        if line.exists():
+            return None
+        try:
+            with transaction.atomic():
+                CartItem.objects.bulk_create([
+                    CartItem(cart_id=cart_id, controller_id=controller_id, quantity=quantity, unit_price=price)
+                ])
+            # Not every backend returns primary keys from bulk inserts
+            return LineState(line.values_list('pk', flat=True).get(), quantity, created=True, unit_price=price)
+        except IntegrityError:
+            # A concurrent insert won; add to its line instead
+            continue
+    return None
+
+
+def merge_lines(cart_id, quantities, prices, cap=MAX_LINE_QUANTITY):
+    """Add ``quantities`` ({controller_id: quantity}) to a cart's lines at once.
+
+    One multi-row INSERT ... ON CONFLICT DO UPDATE where the database
+    supports it, clamping every line at ``cap``. New lines take their
+    price from ``prices`` ({controller_id: price}); the cart is
+    re-totalled afterwards. Cart-wide limits are not applied, so nothing a visitor
+    chose is dropped at login; a cart left over a limit can only shrink.
+    """
+    rows = [
+        (controller_id, min(quantity, cap))
+        for controller_id, quantity in sorted(quantities.items()) if quantity > 0
+    ]
+    if not rows:
+        return
+    with transaction.atomic():
+        # Locks the cart before its lines, as add_item does
+        Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now())
+        if connection.features.supports_update_conflicts_with_target:
+            table = connection.ops.quote_name(CartItem._meta.db_table)
+            now = CartItem._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+            total = f"{table}.quantity + excluded.quantity"
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (cart_id, controller_id, quantity, unit_price, created_at, updated_at) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))} "
+                    f"ON CONFLICT (cart_id, controller_id) DO UPDATE "
+                    f"SET quantity = CASE WHEN {total} > %s THEN %s ELSE {total} END, "
+                    f"updated_at = excluded.updated_at",
+                    [value for controller_id, quantity in rows
+                     for value in (cart_id, controller_id, quantity, _db_money(prices[controller_id]), now, now)]
+                    + [cap, cap],
+                )
+        else:
+            existing = {
+                line.controller_id: line
+                for line in CartItem.objects.filter(cart_id=cart_id, controller_id__in=[c for c, q in rows])
+            }
+            changed, created = [], []
+            for controller_id, quantity in rows:
+                line = existing.get(controller_id)
+                if line is None:
+                    created.append(CartItem(
+                        cart_id=cart_id, controller_id=controller_id, quantity=quantity,
+                        unit_price=prices[controller_id],
+                    ))
+                else:
+                    line.quantity = min(line.quantity + quantity, cap)
+                    line.updated_at = timezone.now()
+                    changed.append(line)
+            CartItem.objects.bulk_create(created)
+            CartItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+        refresh_summaries(Cart.objects.filter(pk=cart_id))
+
+
+def add_item(cart, controller, quantity):
+    """Add ``quantity`` units of ``controller`` to ``cart`` within the limits.
+
+    One transaction: a conditional UPDATE claims room on the cart row,
+    then upsert_line() writes the line. Returns the line's LineState.
+    """
+    with transaction.atomic():
+        _claim(cart.pk, quantity, controller.price * quantity)
+        state = upsert_line(cart.pk, controller.pk, quantity, controller.price)
+        if state is None:
+            # Rolls the claim back with the transaction
+            raise ValidationError("Maximum quantity exceeded")
+        if state.unit_price != controller.price:
+            # The line predates a price change not yet repriced; the
+            # units were added at the line's price, not the catalog's
+            adjust(cart.pk, 0, (state.unit_price - controller.price) * quantity)
+    return state
+
+
+def set_quantity(item, quantity):
+    """Set a line's quantity within the limits, removing it at zero"""
+    with transaction.atomic():
+        if not quantity:
+            item.delete()
+            return
+        # Lock the cart before the line, in the same order as add_item
+        list(Cart.objects.select_for_update().filter(pk=item.cart_id).values_list('pk'))
+        current, price = (
+            CartItem.objects.filter(pk=item.pk)
+            .values_list('quantity', 'unit_price').get()
+        )
+        units = quantity - current
+        _claim(item.cart_id, units, price * units)
+        CartItem.objects.filter(pk=item.pk).update(quantity=quantity, updated_at=timezone.now())
+        item.quantity = quantity
+
+
+def set_quantities(cart, quantities, controllers):
+    """Set several lines at once, checking the limits for the batch as a whole.
+
+    ``quantities`` maps controller id to the new quantity (0 removes the
+    line) and ``controllers`` maps the same ids to Controller instances.
+    One transaction on the locked cart row: new lines are written with
+    bulk_create, changed ones with bulk_update and removed ones with a
+    single DELETE. Returns the cart with its new summary.
+    """
+    with transaction.atomic():
+        locked = Cart.objects.select_for_update().get(pk=cart.pk)
+        lines = {
+            line.controller_id: line
+            for line in CartItem.objects.filter(cart=locked, controller_id__in=list(quantities))
+        }
+        units, amount = 0, Decimal('0.00')
+        created, changed, removed = [], [], []
+        now = timezone.now()
+        for controller_id, quantity in quantities.items():
+            line = lines.get(controller_id)
+            current = line.quantity if line else 0
+            if quantity == current:
+                continue
+            units += quantity - current
+            price = line.unit_price if line else controllers[controller_id].price
+            amount += price * (quantity - current)
+            if line is None:
+                created.append(CartItem(
+                    cart=locked, controller_id=controller_id, quantity=quantity, unit_price=price,
+                ))
+            elif quantity:
+                line.quantity, line.updated_at = quantity, now
+                changed.append(line)
+            else:
+                removed.append(line.pk)
+
+        check_change(locked.item_count, locked.subtotal, units, amount)
+
+        # None of these send signals; the summary moves once below
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+        delete_lines(removed)
+        adjust(locked.pk, units, amount)
+        locked.item_count += units
+        locked.subtotal += amount
+    return locked
+
+
+def line_sums():
+    """Units and value of each cart's lines, as subqueries on the cart"""
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    item_count = Coalesce(Subquery(lines.annotate(n=Sum('quantity')).values('n')), 0)
+    subtotal = Coalesce(
+        Subquery(lines.annotate(total=Sum(line_total())).values('total'), output_field=MONEY),
+        Value(Decimal('0.00')),
+        output_field=MONEY,
+    )
+    return item_count, subtotal
+
+
+def drifted(carts=None):
+    """Carts whose stored summary disagrees with their lines"""
+    carts = Cart.objects.all() if carts is None else carts
+    item_count, subtotal = line_sums()
+    return carts.alias(actual_count=item_count, actual_subtotal=subtotal).exclude(
+        item_count=F('actual_count'), subtotal=F('actual_subtotal'),
+    )
+
+
+def refresh_summaries(carts=None):
+    """Recompute drifted summaries among ``carts`` (default all) in one UPDATE"""
+    carts = Cart.objects.all() if carts is None else carts
+    item_count, subtotal = line_sums()
+    return Cart.objects.filter(pk__in=drifted(carts).values('pk')).update(
+        item_count=item_count, subtotal=subtotal,
+    )
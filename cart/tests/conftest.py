@@ -0,0 +1,30 @@
+import os
+import pytest
+import redis
+from cart import store as cart_store
+from cart.store import RedisCartStore
+from .fake_redis import FakeRedis
+
+REDIS_STORE = 'cart.store.RedisCartStore'
+
+
+@pytest.fixture
+def redis_client():
+    """A real Redis when CART_TEST_REDIS_URL is set, otherwise the in-memory stand-in"""
+    url = os.environ.get('CART_TEST_REDIS_URL')
+    if not url:
+        yield FakeRedis()
+        return
+    client = redis.Redis.from_url(url, decode_responses=True)
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture
+def store(redis_client, settings, monkeypatch):
+    """A Redis cart store that the views use too"""
+    instance = RedisCartStore(client=redis_client, prefix='test-cart', ttl=60)
+    settings.CART_STORE = REDIS_STORE
+    monkeypatch.setitem(cart_store._stores, REDIS_STORE, instance)
+    return instance
@@ -0,0 +1,143 @@
+"""
+An in-memory stand-in for the parts of redis.Redis (decode_responses=True)
+that cart.store uses, including WATCH/MULTI optimistic transactions, so
+the store can be tested without a Redis server.
+"""
+import threading
+
+from redis.exceptions import WatchError
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        # Bumped on every write to a key, for WATCH
+        self.versions = {}
+        self.lock = threading.RLock()
+
+    def _written(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self.data.get(key, {}))
+
+    def hget(self, key, field):
+        with self.lock:
+            return self.data.get(key, {}).get(field)
+
+    def hset(self, key, mapping):
+        with self.lock:
+            hash_ = self.data.setdefault(key, {})
+            added = len(set(mapping) - set(hash_))
+            hash_.update({field: str(value) for field, value in mapping.items()})
+            self._written(key)
+            return added
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            hash_ = self.data.get(key, {})
+            removed = sum(hash_.pop(field, None) is not None for field in fields)
+            if not hash_:
+                self.data.pop(key, None)
+            self._written(key)
+            return removed
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            hash_ = self.data.setdefault(key, {})
+            hash_[field] = str(int(hash_.get(field, 0)) + amount)
+            self._written(key)
+            return int(hash_[field])
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def sadd(self, key, *members):
+        with self.lock:
+            set_ = self.data.setdefault(key, set())
+            added = len({str(member) for member in members} - set_)
+            set_.update(str(member) for member in members)
+            self._written(key)
+            return added
+
+    def srem(self, key, *members):
+        with self.lock:
+            set_ = self.data.get(key, set())
+            removed = len(set_ & {str(member) for member in members})
+            set_.difference_update(str(member) for member in members)
+            self._written(key)
+            return removed
+
+    def srandmember(self, key, number):
+        with self.lock:
+            return sorted(self.data.get(key, set()))[:number]
+
+    def scard(self, key):
+        with self.lock:
+            return len(self.data.get(key, set()))
+
+    def flushdb(self):
+        with self.lock:
+            for key in self.data:
+                self._written(key)
+            self.data.clear()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        while True:
+            with self.pipeline() as pipe:
+                try:
+                    pipe.watch(*watches)
+                    value = func(pipe)
+                    result = pipe.execute()
+                except WatchError:
+                    continue
+                return value if value_from_callable else result
+
+
+class FakePipeline:
+    """Buffers commands until execute(), except between watch() and multi()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.reset()
+
+    def reset(self):
+        self.watched = {}
+        self.immediate = False
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def watch(self, *keys):
+        self.watched = {key: self.client.versions.get(key, 0) for key in keys}
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if self.immediate:
+                return command(*args, **kwargs)
+            self.commands.append((command, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        with self.client.lock:
+            try:
+                if any(self.client.versions.get(key, 0) != version for key, version in self.watched.items()):
+                    raise WatchError('Watched variable changed.')
+                return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+            finally:
+                self.reset()
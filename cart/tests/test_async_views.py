@@ -0,0 +1,92 @@
+import pytest
+from asgiref.sync import async_to_sync
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.models import CartItem
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'async-view-tests',
+    }
+}
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    """The views through the ASGI handler, as uvicorn workers serve them"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CACHES = LOCMEM_CACHES
+        settings.ALLOWED_HOSTS = ['testserver']
+        cache.clear()
+        self.client = AsyncClient()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category,
+            price=Decimal('50.00'), is_featured=True,
+        )
+        yield
+        cache.clear()
+
+    def get(self, url):
+        return async_to_sync(self.client.get)(url)
+
+    def post(self, url, data):
+        return async_to_sync(self.client.post)(url, data, headers={'referer': 'http://testserver/'})
+
+    def test_catalog_pages(self):
+        """Test the home and controller pages render, and are cached for visitors"""
+        detail = reverse('products:controller_detail', kwargs={'id': self.controller.pk})
+        for url in (reverse('products:home'), detail):
+            response = self.get(url)
+            assert response.status_code == 200
+            assert b'Test Controller' in response.content
+        Controller.objects.filter(pk=self.controller.pk).update(name='Renamed')
+        assert b'Test Controller' in self.get(detail).content
+        assert self.get(reverse('products:controller_detail', kwargs={'id': 999})).status_code == 404
+
+    def test_cart_round_trip(self):
+        """Test adding, updating and viewing a cart, with the badge following along"""
+        self.client.force_login(self.user)
+        response = self.post(reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 2})
+        assert response.status_code == 302
+        item = CartItem.objects.get(cart__user=self.user)
+        assert item.quantity == 2
+        assert b'2 &middot; $100.00' in self.get(reverse('products:home')).content
+
+        self.post(reverse('cart:update_cart'), {'controller_id': self.controller.pk, 'quantity': 3})
+        response = self.get(reverse('cart:cart_detail'))
+        assert response.status_code == 200
+        assert b'Subtotal: $150.00' in response.content
+        assert b'3 &middot; $150.00' in self.get(reverse('products:home')).content
+
+    def test_session_cart(self):
+        """Test visitors can fill a session cart through the async views"""
+        self.post(reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 1})
+        response = self.get(reverse('cart:cart_detail'))
+        assert b'Subtotal: $50.00' in response.content
+
+    def test_session_cart_update(self):
+        """Test visitors can change and remove session cart lines"""
+        self.post(reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 1})
+        response = self.post(reverse('cart:update_cart'), {'controller_id': self.controller.pk, 'quantity': 3})
+        assert response.status_code == 302
+        assert b'Subtotal: $150.00' in self.get(reverse('cart:cart_detail')).content
+
+        self.post(reverse('cart:update_cart'), {'controller_id': self.controller.pk, 'quantity': 0})
+        assert b'Your cart is empty' in self.get(reverse('cart:cart_detail')).content
+
+    def test_rate_limit(self):
+        """Test the rate limit applies to async views"""
+        url = reverse('cart:cart_detail')
+        assert all(self.get(url).status_code == 200 for _ in range(30))
+        response = self.get(url)
+        assert response.status_code == 429
+        assert int(response['Retry-After']) >= 1
@@ -0,0 +1,88 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.cache import cart_badge_key
+from cart.context_processors import cart_badge
+from cart.models import Cart, CartItem
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cart-badge-tests',
+    }
+}
+
+
+@pytest.mark.django_db
+class TestCartBadge:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CACHES = LOCMEM_CACHES
+        settings.ALLOWED_HOSTS = ['testserver']
+        cache.clear()
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, controller=self.controller, quantity=2)
+        self.client.force_login(self.user)
+        yield
+        cache.clear()
+
+    def cart_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in context.captured_queries if 'cart_cart' in query['sql']]
+
+    def test_badge_is_cached(self):
+        """Test the badge reads the cart once, then comes from the cache"""
+        url = reverse('products:category_detail', kwargs={'slug': 'test-category'})
+        response, queries = self.cart_queries(url)
+        assert b'2 &middot; $100.00' in response.content
+        assert len(queries) == 1
+
+        response, queries = self.cart_queries(url)
+        assert b'2 &middot; $100.00' in response.content
+        assert queries == []
+
+    def test_cart_views_invalidate_the_badge(self):
+        """Test changing the cart through the views refreshes the badge"""
+        url = reverse('products:category_detail', kwargs={'slug': 'test-category'})
+        self.client.get(url)
+        self.client.post(
+            reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 1},
+            HTTP_REFERER='http://testserver/',
+        )
+        assert cache.get(cart_badge_key(self.user.pk)) is None
+        assert b'3 &middot; $150.00' in self.client.get(url).content
+
+        self.client.post(reverse('cart:cart_remove', kwargs={'controller_id': self.controller.pk}))
+        assert b'&middot;' not in self.client.get(url).content
+
+    def test_badge_is_lazy(self, django_assert_num_queries):
+        """Test the context processor reads nothing until the badge is rendered"""
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with django_assert_num_queries(0):
+            context = cart_badge(request)
+        assert cache.get(cart_badge_key(self.user.pk)) is None
+
+        assert context['cart_badge'].item_count == 2
+        assert cache.get(cart_badge_key(self.user.pk)).subtotal == Decimal('100.00')
+
+    def test_anonymous_badge_is_empty(self, django_assert_num_queries):
+        """Test visitors get an empty badge without any lookup"""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with django_assert_num_queries(0):
+            assert cart_badge(request)['cart_badge'].item_count == 0
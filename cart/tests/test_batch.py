@@ -0,0 +1,106 @@
+import json
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.models import Cart, CartItem
+from cart.summary import drifted
+
+
+@pytest.mark.django_db
+class TestBatchUpdate:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.ALLOWED_HOSTS = ['testserver']
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controllers = [
+            Controller.objects.create(
+                name=f'Controller {i}', description='Test', category=category,
+                price=Decimal('10.00') * (i + 1),
+            )
+            for i in range(4)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        self.url = reverse('cart:batch_update')
+
+    def post(self, operations):
+        return self.client.post(
+            self.url, json.dumps({'operations': operations}),
+            content_type='application/json', HTTP_REFERER='http://testserver/',
+        )
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('controller_id', 'quantity'))
+
+    def test_create_update_and_remove(self):
+        """Test one request creates, changes and removes lines and returns the summary"""
+        first, second, third, _ = self.controllers
+        CartItem.objects.create(cart=self.cart, controller=first, quantity=1)
+        CartItem.objects.create(cart=self.cart, controller=second, quantity=1)
+
+        response = self.post([
+            {'controller_id': first.id, 'quantity': 3},
+            {'controller_id': second.id, 'quantity': 0},
+            {'controller_id': third.id, 'quantity': 2},
+        ])
+
+        assert response.status_code == 200
+        assert response.json() == {
+            'item_count': 5,
+            'subtotal': '90.00',
+            'lines': [
+                {'controller_id': first.id, 'quantity': 3},
+                {'controller_id': second.id, 'quantity': 0},
+                {'controller_id': third.id, 'quantity': 2},
+            ],
+        }
+        assert self.lines() == {first.id: 3, third.id: 2}
+        assert not drifted().exists()
+
+    def test_limits_apply_to_the_batch(self):
+        """Test a batch passing the cart limit is rejected as a whole"""
+        response = self.post([
+            {'controller_id': controller.id, 'quantity': 6} for controller in self.controllers
+        ])
+        assert response.status_code == 400
+        assert 'cannot exceed 20 items' in response.json()['error']
+        assert self.lines() == {}
+        assert Cart.objects.get(pk=self.cart.pk).item_count == 0
+
+    @pytest.mark.parametrize('body', [
+        'not json',
+        json.dumps({'operations': {'controller_id': 1}}),
+        json.dumps({'operations': [{'controller_id': '1', 'quantity': 1}]}),
+        json.dumps({'operations': [{'controller_id': 1, 'quantity': 11}]}),
+        json.dumps({'operations': [{'controller_id': 999999, 'quantity': 1}]}),
+        json.dumps({'operations': [{'controller_id': 1, 'quantity': 1}] * 2}),
+    ])
+    def test_invalid_batches(self, body):
+        """Test malformed or invalid operations return 400 without changes"""
+        response = self.client.post(
+            self.url, body, content_type='application/json', HTTP_REFERER='http://testserver/'
+        )
+        assert response.status_code == 400
+        assert 'error' in response.json()
+        assert self.lines() == {}
+
+    def test_query_count_is_fixed(self, django_assert_num_queries):
+        """Test a batch costs the same queries however many lines it touches"""
+        CartItem.objects.create(cart=self.cart, controller=self.controllers[0], quantity=1)
+        CartItem.objects.create(cart=self.cart, controller=self.controllers[1], quantity=1)
+        operations = [
+            {'controller_id': self.controllers[0].id, 'quantity': 2},
+            {'controller_id': self.controllers[1].id, 'quantity': 0},
+            {'controller_id': self.controllers[2].id, 'quantity': 1},
+            {'controller_id': self.controllers[3].id, 'quantity': 1},
+        ]
+        # session, user, controllers, cart, savepoint, lock, lines,
+        # insert, update, delete, summary, release
+        with django_assert_num_queries(12):
+            response = self.post(operations)
+        assert response.status_code == 200
@@ -0,0 +1,98 @@
+import gzip
+import json
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from products.models import Category, Controller
+from cart.models import Cart, CartItem
+from cart.purge import _purge_chunk, purge_carts, stale_carts
+from cart.summary import add_item
+
+
+@pytest.mark.django_db
+class TestPurgeCarts:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.User = get_user_model()
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+
+    def cart(self, name, age, quantity=1):
+        cart = Cart.objects.create(user=self.User.objects.create_user(username=name))
+        if quantity:
+            add_item(cart, self.controller, quantity)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=age))
+        return cart
+
+    def remaining(self):
+        return set(Cart.objects.values_list('user__username', flat=True))
+
+    def test_stale_carts_are_deleted_in_chunks(self):
+        """Test carts idle past the cutoff go with their lines and recent ones stay"""
+        for i in range(5):
+            self.cart(f'idle{i}', 100 + i)
+        self.cart('recent', 10)
+
+        result = purge_carts(90, chunk_size=2)
+
+        assert (result.carts, result.lines, result.chunks) == (5, 5, 3)
+        assert self.remaining() == {'recent'}
+        assert CartItem.objects.count() == 1
+
+    def test_empty_carts_have_their_own_cutoff(self):
+        """Test empty carts go after empty_days while carts with lines wait for days"""
+        self.cart('empty', 20, quantity=0)
+        self.cart('full', 20)
+        self.cart('new-empty', 5, quantity=0)
+
+        result = purge_carts(90, empty_days=14)
+
+        assert (result.carts, result.lines) == (1, 0)
+        assert self.remaining() == {'full', 'new-empty'}
+
+    def test_archive(self, tmp_path):
+        """Test each deleted cart is appended to the archive with its lines"""
+        path = tmp_path / 'carts.jsonl.gz'
+        first = self.cart('first', 100, quantity=2)
+        purge_carts(90, archive_path=path)
+        second = self.cart('second', 100)
+        purge_carts(90, archive_path=path)
+
+        with gzip.open(path, 'rt') as archive:
+            rows = [json.loads(line) for line in archive]
+        assert [row['id'] for row in rows] == [first.pk, second.pk]
+        assert rows[0]['subtotal'] == '100.00'
+        assert [(item['controller_id'], item['quantity'], item['unit_price']) for item in rows[0]['items']] == [
+            (self.controller.pk, 2, '50.00'),
+        ]
+
+    def test_dry_run(self, tmp_path):
+        """Test a dry run counts what would go and changes nothing"""
+        self.cart('idle', 100, quantity=3)
+        result = purge_carts(90, archive_path=tmp_path / 'carts.jsonl.gz', dry_run=True)
+        assert (result.carts, result.lines) == (1, 1)
+        assert self.remaining() == {'idle'}
+        assert not (tmp_path / 'carts.jsonl.gz').exists()
+
+    def test_carts_touched_meanwhile_are_kept(self):
+        """Test a cart changed after the chunk was read survives the chunk"""
+        cart = self.cart('shopper', 100)
+        carts = stale_carts(90)
+        add_item(cart, self.controller, 1)
+
+        assert _purge_chunk(carts, [cart.pk], None, False)[:2] == (0, 0)
+        assert self.remaining() == {'shopper'}
+
+    def test_purge_carts_command(self):
+        """Test purge_carts deletes idle carts and reports them"""
+        self.cart('idle', 100)
+        out = StringIO()
+        call_command('purge_carts', days=90, stdout=out)
+        assert 'Deleted 1 carts and 1 lines in 1 chunks' in out.getvalue()
+        assert not Cart.objects.exists()
@@ -0,0 +1,130 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from cart.purge import _next_chunk, stale_carts
+from cart.repricing import _reprice_batch
+from game_ctrl.query_plans import is_select, plan_problems
+from products.models import Category, Controller
+
+SEED_CONTROLLERS = 2000
+SEED_CARTS = 1000
+ITEMS_PER_CART = 3
+
+
+@pytest.mark.django_db
+class TestCartQueryPlans:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = Client()
+        User = get_user_model()
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        controllers = Controller.objects.bulk_create([
+            Controller(
+                name=f'Controller {i}',
+                description='Seeded controller',
+                price=Decimal('49.99'),
+                category=category,
+            )
+            for i in range(SEED_CONTROLLERS)
+        ], batch_size=1000)
+        users = User.objects.bulk_create([
+            User(username=f'shopper{i}', password='!') for i in range(SEED_CARTS)
+        ], batch_size=1000)
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users], batch_size=1000)
+        CartItem.objects.bulk_create([
+            CartItem(
+                cart=cart,
+                controller=controllers[(i * ITEMS_PER_CART + j) % SEED_CONTROLLERS],
+                quantity=1,
+                unit_price=Decimal('49.99'),
+            )
+            for i, cart in enumerate(carts)
+            for j in range(ITEMS_PER_CART)
+        ], batch_size=1000)
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.cart = Cart.objects.create(user=self.user)
+        self.controller = controllers[0]
+        self.item = CartItem.objects.create(cart=self.cart, controller=self.controller, quantity=2)
+        CartItem.objects.create(cart=self.cart, controller=controllers[1], quantity=1)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.client.login(username='testuser', password='testpass123')
+
+    def assert_indexed(self, queries):
+        selects = [q['sql'] for q in queries.captured_queries if is_select(q['sql'])]
+        assert selects
+        problems = {sql: plan_problems(sql) for sql in selects}
+        assert not {sql: p for sql, p in problems.items() if p}
+
+    def test_cart_detail(self):
+        """Test rendering the cart reads only indexed rows"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart:cart_detail'))
+        assert response.status_code == 200
+        self.assert_indexed(queries)
+
+    def test_update_cart(self):
+        """Test updating a line finds it by (cart, controller)"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('cart:update_cart'), {'controller_id': self.controller.id, 'quantity': 3})
+        self.assert_indexed(queries)
+
+    def test_cart_remove(self):
+        """Test removing a controller finds the line by (cart, controller)"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('cart:cart_remove', kwargs={'controller_id': self.controller.id}))
+        self.assert_indexed(queries)
+
+    def test_add_to_cart_lookups(self):
+        """Test the lookups add_to_cart makes use the (cart, controller) index"""
+        with CaptureQueriesContext(connection) as queries:
+            Cart.objects.get(user=self.user)
+            list(CartItem.objects.filter(cart=self.cart, controller=self.controller))
+            self.cart.items.aggregate(Sum('quantity'))
+            list(self.cart.items.all())
+        self.assert_indexed(queries)
+
+    def test_reprice_batch(self):
+        """Test repricing walks a popular controller's lines along the (controller, id) index"""
+        popular = Controller.objects.create(
+            name='Popular', description='In every cart', price=Decimal('39.99'),
+            category=self.controller.category,
+        )
+        CartItem.objects.bulk_create([
+            CartItem(cart_id=cart_id, controller=popular, quantity=1, unit_price=Decimal('49.99'))
+            for cart_id in Cart.objects.exclude(pk=self.cart.pk).values_list('pk', flat=True)
+        ], batch_size=1000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as queries:
+            _reprice_batch(popular.pk, popular.price, 0, 20)
+        # The keyset read; the carts it then locks are a handful of rows
+        # that the planner may scan for in a table this small
+        keyset = [q['sql'] for q in queries.captured_queries
+                  if is_select(q['sql']) and q['sql'].startswith('SELECT "cart_cartitem"')]
+        assert len(keyset) == 1
+        assert plan_problems(keyset[0]) == []
+
+    def test_purge_chunks(self):
+        """Test the purge walks idle carts along the (updated_at, id) index"""
+        idle = timezone.now() - timedelta(days=100)
+        Cart.objects.exclude(pk=self.cart.pk).update(updated_at=idle)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        carts = stale_carts(90, empty_days=14)
+        with CaptureQueriesContext(connection) as queries:
+            first = _next_chunk(carts, None, 20)
+            _next_chunk(carts, first[-1], 20)
+        self.assert_indexed(queries)
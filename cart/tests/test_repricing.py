@@ -0,0 +1,115 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.models import Cart, CartItem, PriceChange
+from cart.repricing import reprice_pending
+from cart.summary import add_item, drifted
+
+
+@pytest.mark.django_db
+class TestRepricing:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.pad, self.stick = [
+            Controller.objects.create(name=name, description='Test', category=category, price=price)
+            for name, price in (('Pad', Decimal('50.00')), ('Stick', Decimal('200.00')))
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        self.carts = [self.cart] + [
+            Cart.objects.create(user=User.objects.create_user(username=f'shopper{i}'))
+            for i in range(6)
+        ]
+
+    def summary(self, cart=None):
+        return Cart.objects.values_list('item_count', 'subtotal').get(pk=(cart or self.cart).pk)
+
+    def reprice_pad(self, price):
+        self.pad.price = price
+        self.pad.save()
+
+    def test_price_changes_are_recorded(self):
+        """Test saving a new price queues one change and other saves queue none"""
+        self.pad.name = 'Pad Pro'
+        self.pad.save()
+        self.pad.save(update_fields=['name'])
+        assert not PriceChange.objects.exists()
+
+        self.reprice_pad(Decimal('45.00'))
+        change = PriceChange.objects.get()
+        assert (change.controller, change.old_price, change.new_price) == (self.pad, Decimal('50.00'), Decimal('45.00'))
+        assert change.repriced_at is None
+
+    def test_lines_keep_their_price_until_repriced(self):
+        """Test a cart shows the price it was added at until the job runs"""
+        add_item(self.cart, self.pad, 2)
+        self.reprice_pad(Decimal('60.00'))
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('cart:cart_detail'))
+        assert b'Price: $50.00' in response.content
+        assert b'Subtotal: $100.00' in response.content
+
+        reprice_pending()
+        response = client.get(reverse('cart:cart_detail'))
+        assert b'Price: $60.00' in response.content
+        assert b'Subtotal: $120.00' in response.content
+
+    def test_adding_to_a_stale_line_uses_its_price(self):
+        """Test units added before repricing take the line's price and keep the summary exact"""
+        add_item(self.cart, self.pad, 1)
+        self.reprice_pad(Decimal('70.00'))
+        add_item(self.cart, self.pad, 1)
+        add_item(self.cart, self.stick, 1)
+        assert self.summary() == (3, Decimal('300.00'))
+        assert not drifted().exists()
+
+    def test_keyset_batches(self):
+        """Test every affected cart is repriced in batches and the change records it"""
+        for cart in self.carts:
+            add_item(cart, self.pad, 2)
+            add_item(cart, self.stick, 1)
+        self.reprice_pad(Decimal('40.00'))
+        self.reprice_pad(Decimal('30.00'))
+
+        changes = reprice_pending(batch_size=3)
+
+        assert [(c.lines_repriced, c.carts_repriced) for c in changes] == [(7, 7), (0, 0)]
+        assert all(change.repriced_at for change in changes)
+        assert set(CartItem.objects.filter(controller=self.pad).values_list('unit_price', flat=True)) == {
+            Decimal('30.00'),
+        }
+        assert {self.summary(cart) for cart in self.carts} == {(3, Decimal('260.00'))}
+        assert not drifted().exists()
+        assert reprice_pending() == []
+
+    def test_redis_carts_are_repriced(self, store):
+        """Test live Redis carts move to the new price and flush it to the database"""
+        store.add(self.user.pk, self.pad, 2)
+        store.persist(self.user.pk)
+        self.reprice_pad(Decimal('45.00'))
+
+        reprice_pending()
+
+        cart, lines = store.detail(self.user.pk)
+        assert cart.subtotal == Decimal('90.00')
+        assert [line.unit_price for line in lines] == [Decimal('45.00')]
+        store.flush()
+        assert CartItem.objects.get(cart__user=self.user).unit_price == Decimal('45.00')
+
+    def test_reprice_carts_command(self):
+        """Test reprice_carts --once applies the pending changes and reports them"""
+        add_item(self.cart, self.pad, 1)
+        self.reprice_pad(Decimal('55.00'))
+        out = StringIO()
+        call_command('reprice_carts', once=True, stdout=out)
+        assert 'Applied 1 price changes to 1 cart lines' in out.getvalue()
+        assert self.summary() == (1, Decimal('55.00'))
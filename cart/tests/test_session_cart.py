@@ -0,0 +1,141 @@
+import json
+import pytest
+from decimal import Decimal
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.cart import SessionCart
+from cart.models import Cart, CartItem
+from cart.store import DatabaseCartStore
+from cart.summary import drifted
+
+
+@pytest.mark.django_db
+class TestSessionCart:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.ALLOWED_HOSTS = ['testserver']
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.pad, self.stick, self.wheel = [
+            Controller.objects.create(name=name, description='Test', category=category, price=price)
+            for name, price in (
+                ('Pad', Decimal('50.00')), ('Stick', Decimal('200.00')), ('Wheel', Decimal('300.00')),
+            )
+        ]
+
+    def add(self, controller, quantity):
+        return self.client.post(
+            reverse('cart:add_to_cart'), {'controller_id': controller.pk, 'quantity': quantity},
+            HTTP_REFERER='http://testserver/',
+        )
+
+    def session_cart(self):
+        return self.client.session.get(django_settings.CART_SESSION_ID)
+
+    def db_lines(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('controller_id', 'quantity'))
+
+    def test_compact_encoding(self):
+        """Test the session holds only controller ids and quantities"""
+        self.add(self.stick, 1)
+        self.add(self.pad, 2)
+        self.add(self.pad, 1)
+        assert self.session_cart() == [self.pad.pk, 3, self.stick.pk, 1]
+        assert not Cart.objects.exists()
+
+    def test_prices_are_read_from_the_catalog(self):
+        """Test the cart page uses current prices, not prices from when items were added"""
+        self.add(self.pad, 2)
+        Controller.objects.filter(pk=self.pad.pk).update(price=Decimal('40.00'))
+
+        response = self.client.get(reverse('cart:cart_detail'))
+        assert response.status_code == 200
+        assert b'Pad' in response.content
+        assert b'Line total: $80.00' in response.content
+        assert b'Subtotal: $80.00' in response.content
+
+    def test_old_session_format_is_read(self):
+        """Test carts saved in the old per-item dict format still load"""
+        session = self.client.session
+        session[django_settings.CART_SESSION_ID] = {
+            str(self.pad.pk): {'quantity': 2, 'price': '1.00'},
+        }
+        session.save()
+
+        response = self.client.get(reverse('cart:cart_detail'))
+        assert b'Subtotal: $100.00' in response.content
+        self.add(self.stick, 1)
+        assert self.session_cart() == [self.pad.pk, 2, self.stick.pk, 1]
+
+    def test_remove_and_batch(self):
+        """Test visitors can remove lines and send batches"""
+        self.add(self.pad, 2)
+        self.add(self.stick, 1)
+        self.client.post(reverse('cart:cart_remove', kwargs={'controller_id': self.stick.pk}))
+        assert self.session_cart() == [self.pad.pk, 2]
+
+        response = self.client.post(
+            reverse('cart:batch_update'),
+            json.dumps({'operations': [
+                {'controller_id': self.pad.pk, 'quantity': 0},
+                {'controller_id': self.wheel.pk, 'quantity': 2},
+            ]}),
+            content_type='application/json', HTTP_REFERER='http://testserver/',
+        )
+        assert response.json()['item_count'] == 2
+        assert response.json()['subtotal'] == '600.00'
+        assert self.session_cart() == [self.wheel.pk, 2]
+
+    def test_limits(self):
+        """Test the session cart enforces the stored cart's limits"""
+        self.add(self.pad, 9)
+        self.add(self.pad, 2)
+        assert self.session_cart() == [self.pad.pk, 9]
+        self.add(self.stick, 10)
+        self.add(self.wheel, 10)
+        assert self.session_cart() == [self.pad.pk, 9, self.stick.pk, 10]
+
+    def test_merge_on_login(self):
+        """Test logging in adds the visitor's lines to the stored cart, clamped per line"""
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, controller=self.pad, quantity=8)
+        self.add(self.pad, 5)
+        self.add(self.stick, 2)
+
+        self.client.force_login(self.user)
+
+        assert self.db_lines() == {self.pad.pk: 10, self.stick.pk: 2}
+        assert not drifted().exists()
+        assert Cart.objects.get(user=self.user).subtotal == Decimal('900.00')
+        assert self.session_cart() is None
+        response = self.client.get(reverse('cart:cart_detail'))
+        assert b'Subtotal: $900.00' in response.content
+
+    def test_merge_is_one_statement(self, django_assert_num_queries):
+        """Test the merge costs the same queries however many lines the visitor had"""
+        Cart.objects.create(user=self.user)
+        for controller in (self.pad, self.stick, self.wheel):
+            self.add(controller, 1)
+        request = self.client.get(reverse('cart:cart_detail')).wsgi_request
+        session_cart = SessionCart(request)
+
+        # controllers, cart, savepoint, touch, upsert, summary, release
+        with django_assert_num_queries(7):
+            session_cart.merge_into(DatabaseCartStore(), self.user.pk)
+        assert self.db_lines() == {self.pad.pk: 1, self.stick.pk: 1, self.wheel.pk: 1}
+
+    def test_merge_into_redis_store(self, store):
+        """Test logging in merges the session cart into a Redis cart and persists it"""
+        store.add(self.user.pk, self.pad, 1)
+        self.add(self.pad, 2)
+
+        self.client.force_login(self.user)
+
+        cart, lines = store.detail(self.user.pk)
+        assert (cart.item_count, cart.subtotal) == (3, Decimal('150.00'))
+        assert self.db_lines() == {self.pad.pk: 3}
+        assert store.dirty_count() == 0
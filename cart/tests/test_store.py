@@ -0,0 +1,158 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart import store as cart_store
+from cart.models import Cart, CartItem
+from cart.summary import drifted
+
+
+@pytest.mark.django_db
+class TestRedisCartStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, store):
+        self.store = store
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.pad, self.stick = [
+            Controller.objects.create(name=name, description='Test', category=category, price=price)
+            for name, price in (('Pad', Decimal('50.00')), ('Stick', Decimal('200.00')))
+        ]
+
+    def db_lines(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('controller_id', 'quantity'))
+
+    def test_changes_stay_in_redis_until_flushed(self, django_assert_num_queries):
+        """Test cart changes write nothing to the database before a flush"""
+        self.store.add(self.user.pk, self.pad, 2)
+        self.store.add(self.user.pk, self.stick, 1)
+        self.store.set_many(self.user.pk, {self.pad.pk: 3}, {self.pad.pk: self.pad})
+
+        assert not Cart.objects.exists()
+        with django_assert_num_queries(1):
+            cart, lines = self.store.detail(self.user.pk)
+        assert (cart.item_count, cart.subtotal) == (4, Decimal('350.00'))
+        assert [(line.controller.name, line.quantity, line.total_price) for line in lines] == [
+            ('Pad', 3, Decimal('150.00')), ('Stick', 1, Decimal('200.00')),
+        ]
+        assert self.store.dirty_count() == 1
+
+    def test_limits(self):
+        """Test the store enforces the same limits as the database path"""
+        self.store.add(self.user.pk, self.pad, 9)
+        with pytest.raises(ValidationError, match='Maximum quantity'):
+            self.store.add(self.user.pk, self.pad, 2)
+        self.store.add(self.user.pk, self.stick, 10)
+        with pytest.raises(ValidationError, match='cannot exceed 20 items'):
+            self.store.set_many(self.user.pk, {self.stick.pk: 10, self.pad.pk: 11}, {
+                self.stick.pk: self.stick, self.pad.pk: self.pad,
+            })
+        cart, lines = self.store.detail(self.user.pk)
+        assert cart.item_count == 19
+
+    def test_flush_writes_behind(self):
+        """Test a flush copies dirty carts to the database and marks them clean"""
+        self.store.add(self.user.pk, self.pad, 2)
+        self.store.add(self.user.pk, self.stick, 1)
+        assert self.store.flush() == 1
+        assert self.db_lines() == {self.pad.pk: 2, self.stick.pk: 1}
+        assert not drifted().exists()
+        assert self.store.dirty_count() == 0
+
+        self.store.remove(self.user.pk, self.stick.pk)
+        self.store.flush()
+        assert self.db_lines() == {self.pad.pk: 2}
+        assert Cart.objects.get(user=self.user).subtotal == Decimal('100.00')
+
+    def test_crash_during_flush_is_recovered(self, monkeypatch):
+        """Test a flush that dies mid-write leaves the cart dirty and the database untouched"""
+        self.store.add(self.user.pk, self.pad, 2)
+
+        def crash(carts):
+            raise RuntimeError('worker killed')
+        monkeypatch.setattr(cart_store, 'refresh_summaries', crash)
+        with pytest.raises(RuntimeError):
+            self.store.flush()
+        assert self.db_lines() == {}
+        assert self.store.dirty_count() == 1
+
+        monkeypatch.undo()
+        assert self.store.flush() == 1
+        assert self.db_lines() == {self.pad.pk: 2}
+        assert self.store.dirty_count() == 0
+
+    def test_change_during_flush_stays_dirty(self, monkeypatch):
+        """Test a cart changed while being flushed is flushed again"""
+        self.store.add(self.user.pk, self.pad, 1)
+        write_carts = cart_store.write_carts
+
+        def write_then_change(carts):
+            written = write_carts(carts)
+            self.store.add(self.user.pk, self.pad, 1)
+            return written
+        monkeypatch.setattr(cart_store, 'write_carts', write_then_change)
+        self.store.flush()
+        monkeypatch.undo()
+
+        assert self.db_lines() == {self.pad.pk: 1}
+        assert self.store.dirty_count() == 1
+        self.store.flush()
+        assert self.db_lines() == {self.pad.pk: 2}
+
+    def test_lost_redis_reloads_from_database(self, redis_client):
+        """Test carts reload from the database after Redis loses its data"""
+        self.store.add(self.user.pk, self.pad, 2)
+        self.store.persist(self.user.pk)
+        redis_client.flushdb()
+
+        cart, lines = self.store.detail(self.user.pk)
+        assert (cart.item_count, cart.subtotal) == (2, Decimal('100.00'))
+        self.store.add(self.user.pk, self.pad, 1)
+        self.store.flush()
+        assert self.db_lines() == {self.pad.pk: 3}
+
+    def test_views_and_login(self, settings):
+        """Test the views use the store and logging in persists the cart"""
+        settings.ALLOWED_HOSTS = ['testserver']
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('cart:add_to_cart'), {'controller_id': self.pad.pk, 'quantity': 2},
+                    HTTP_REFERER='http://testserver/')
+
+        response = client.get(reverse('cart:cart_detail'))
+        assert b'Subtotal: $100.00' in response.content
+        assert self.db_lines() == {}
+
+        Client().force_login(self.user)
+        assert self.db_lines() == {self.pad.pk: 2}
+
+    def test_update_unflushed_line(self):
+        """Test the update view changes lines the database has not seen yet"""
+        client = Client()
+        client.force_login(self.user)
+        self.store.add(self.user.pk, self.pad, 1)
+        self.store.add(self.user.pk, self.stick, 1)
+
+        client.post(reverse('cart:update_cart'), {'controller_id': self.pad.pk, 'quantity': 3})
+        client.post(reverse('cart:update_cart'), {'controller_id': self.stick.pk, 'quantity': 0})
+
+        cart, lines = self.store.detail(self.user.pk)
+        assert [(line.controller.name, line.quantity) for line in lines] == [('Pad', 3)]
+        assert self.db_lines() == {}
+
+    def test_flush_carts_command(self):
+        """Test flush_carts --once drains the dirty set in batches"""
+        users = [
+            get_user_model().objects.create_user(username=f'shopper{i}') for i in range(3)
+        ]
+        for user in users:
+            self.store.add(user.pk, self.stick, 1)
+        out = StringIO()
+        call_command('flush_carts', once=True, batch_size=2, stdout=out)
+        assert 'Flushed 3 carts' in out.getvalue()
+        assert CartItem.objects.count() == 3
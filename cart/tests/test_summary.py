@@ -0,0 +1,114 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from products.models import Category, Controller
+from cart.models import Cart, CartItem
+from cart.repricing import reprice_pending
+from cart.summary import add_item, drifted, refresh_summaries, set_quantity
+
+
+@pytest.mark.django_db
+class TestCartSummary:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        self.category = Category.objects.create(name='Test Category', slug='test-category')
+        self.pad = Controller.objects.create(
+            name='Pad', description='Pad', category=self.category, price=Decimal('50.00')
+        )
+        self.stick = Controller.objects.create(
+            name='Stick', description='Stick', category=self.category, price=Decimal('200.00')
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def summary(self):
+        return Cart.objects.values_list('item_count', 'subtotal').get(pk=self.cart.pk)
+
+    def test_orm_writes_maintain_summary(self):
+        """Test creating, updating and deleting lines keeps the summary current"""
+        line = CartItem.objects.create(cart=self.cart, controller=self.pad, quantity=2)
+        CartItem.objects.create(cart=self.cart, controller=self.stick, quantity=1)
+        assert self.summary() == (3, Decimal('300.00'))
+        assert self.cart.subtotal == Decimal('300.00')
+
+        line.quantity = 4
+        line.save()
+        assert self.summary() == (5, Decimal('400.00'))
+
+        line.delete()
+        assert self.summary() == (1, Decimal('200.00'))
+
+    def test_controller_delete_and_reprice(self):
+        """Test deleting or repricing a controller updates the carts holding it"""
+        CartItem.objects.create(cart=self.cart, controller=self.pad, quantity=2)
+        CartItem.objects.create(cart=self.cart, controller=self.stick, quantity=1)
+
+        self.pad.price = Decimal('40.00')
+        self.pad.save()
+        # Lines keep their price until the repricing job runs
+        assert self.summary() == (3, Decimal('300.00'))
+        reprice_pending()
+        assert self.summary() == (3, Decimal('280.00'))
+
+        self.stick.delete()
+        assert self.summary() == (2, Decimal('80.00'))
+
+    def test_add_item(self, django_assert_num_queries):
+        """Test add_item creates then increments a line within the limits"""
+        add_item(self.cart, self.pad, 2)
+        # savepoint, cart UPDATE, line UPDATE, release
+        with django_assert_num_queries(4):
+            add_item(self.cart, self.pad, 3)
+        assert list(self.cart.items.values_list('quantity', flat=True)) == [5]
+        assert self.summary() == (5, Decimal('250.00'))
+
+    def test_add_item_limits_roll_back(self):
+        """Test a rejected add leaves the lines and summary untouched"""
+        add_item(self.cart, self.pad, 8)
+        with pytest.raises(ValidationError, match='Maximum quantity'):
+            add_item(self.cart, self.pad, 3)
+        add_item(self.cart, self.stick, 10)
+        with pytest.raises(ValidationError, match='cannot exceed 20 items'):
+            add_item(self.cart, self.stick, 3)
+        assert self.summary() == (18, Decimal('2400.00'))
+        assert sorted(self.cart.items.values_list('quantity', flat=True)) == [8, 10]
+
+    def test_set_quantity(self):
+        """Test set_quantity moves the summary by the difference and removes at zero"""
+        add_item(self.cart, self.pad, 5)
+        line = self.cart.items.get()
+        set_quantity(line, 2)
+        assert self.summary() == (2, Decimal('100.00'))
+        set_quantity(line, 0)
+        assert self.summary() == (0, Decimal('0.00'))
+        assert not self.cart.items.exists()
+
+    def test_refresh_fixes_drift(self):
+        """Test drifted carts are found and re-totalled from their lines"""
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, controller=self.pad, quantity=3, unit_price=self.pad.price)
+        ])
+        other = Cart.objects.create(user=get_user_model().objects.create_user(username='other'))
+        assert list(drifted()) == [self.cart]
+
+        assert refresh_summaries() == 1
+        assert self.summary() == (3, Decimal('150.00'))
+        assert Cart.objects.get(pk=other.pk).item_count == 0
+        assert not drifted().exists()
+
+    def test_reconcile_command(self):
+        """Test reconcile_carts reports drift in a dry run and fixes it otherwise"""
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, controller=self.stick, quantity=2, unit_price=self.stick.price)
+        ])
+        out = StringIO()
+        call_command('reconcile_carts', dry_run=True, stdout=out)
+        assert '1 carts have drifted' in out.getvalue()
+        assert self.summary() == (0, Decimal('0.00'))
+
+        call_command('reconcile_carts', batch_size=1, stdout=out)
+        assert 'Fixed 1 drifted carts' in out.getvalue()
+        assert self.summary() == (2, Decimal('400.00'))
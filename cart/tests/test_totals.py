@@ -0,0 +1,104 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.models import Cart, CartItem
+from cart.views import validate_cart_limits
+from django.core.exceptions import ValidationError
+
+
+@pytest.mark.django_db
+class TestCartTotals:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.ALLOWED_HOSTS = ['testserver']
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category'
+        )
+        self.controllers = [
+            Controller.objects.create(
+                name=f'Controller {i}',
+                description='Test Description',
+                category=self.category,
+                price=Decimal('10.25') * (i + 1),
+            )
+            for i in range(6)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill(self, lines):
+        for controller in self.controllers[:lines]:
+            CartItem.objects.create(cart=self.cart, controller=controller, quantity=2)
+
+    def test_stored_totals(self):
+        """Test carts carry their unit count and subtotal"""
+        self.fill(3)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        assert cart.item_count == 6
+        assert cart.subtotal == Decimal('123.00')
+        assert cart.total_price == Decimal('123.00')
+
+    def test_empty_cart_totals(self):
+        """Test an empty cart totals to zero"""
+        cart = Cart.objects.get(pk=self.cart.pk)
+        assert cart.item_count == 0
+        assert cart.subtotal == Decimal('0')
+
+    def test_lines_are_prefetched(self, django_assert_num_queries):
+        """Test lines and their controllers load in one extra query"""
+        self.fill(4)
+        with django_assert_num_queries(2):
+            cart = Cart.objects.with_lines().get(pk=self.cart.pk)
+            totals = [line.total_price for line in cart.lines]
+            names = [line.controller.name for line in cart.lines]
+        assert totals == [Decimal('20.50'), Decimal('41.00'), Decimal('61.50'), Decimal('82.00')]
+        assert names == ['Controller 0', 'Controller 1', 'Controller 2', 'Controller 3']
+
+    def test_total_price_is_free(self, django_assert_num_queries):
+        """Test total_price reads the stored subtotal without a query"""
+        self.fill(5)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with django_assert_num_queries(0):
+            assert cart.total_price == Decimal('307.50')
+
+    def test_limits_use_one_query(self, django_assert_num_queries):
+        """Test limit validation is one query and counts what is added"""
+        self.fill(5)
+        with django_assert_num_queries(1):
+            validate_cart_limits(self.cart, 10)
+        with pytest.raises(ValidationError):
+            validate_cart_limits(self.cart, 11)
+        with pytest.raises(ValidationError):
+            validate_cart_limits(self.cart, 1, Decimal('19700'))
+
+    @pytest.mark.parametrize('lines', [1, 6])
+    def test_cart_page_query_count_is_fixed(self, lines, django_assert_num_queries):
+        """Test the cart page costs the same queries for any cart size"""
+        self.fill(lines)
+        self.client.force_login(self.user)
+        # session, user, cart, lines with controllers
+        with django_assert_num_queries(4):
+            response = self.client.get(reverse('cart:cart_detail'))
+        assert response.status_code == 200
+        assert len(response.context['cart_items']) == lines
+        assert f'Subtotal: ${response.context["cart"].subtotal}'.encode() in response.content
+
+    def test_add_to_cart(self):
+        """Test adding a controller twice increments its line"""
+        self.client.force_login(self.user)
+        url = reverse('cart:add_to_cart')
+        data = {'controller_id': self.controllers[0].id, 'quantity': 2}
+        self.client.post(url, data, HTTP_REFERER='http://testserver/')
+        self.client.post(url, data, HTTP_REFERER='http://testserver/')
+
+        assert list(self.cart.items.values_list('controller_id', 'quantity')) == [
+            (self.controllers[0].id, 4)
+        ]
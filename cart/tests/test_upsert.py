@@ -0,0 +1,117 @@
+import threading
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.urls import reverse
+from products.models import Category, Controller
+from cart.models import Cart, CartItem
+from cart.summary import MAX_LINE_QUANTITY, add_item, upsert_line
+
+
+@pytest.fixture
+def catalog():
+    category = Category.objects.create(name='Test Category', slug='test-category')
+    return [
+        Controller.objects.create(
+            name=f'Controller {i}', description='Test', category=category, price=Decimal('10.00')
+        )
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def cart():
+    user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+    return Cart.objects.create(user=user)
+
+
+@pytest.fixture(params=['upsert', 'portable'])
+def upsert_path(request, monkeypatch):
+    """Run a test through the ON CONFLICT statement and the portable fallback"""
+    if request.param == 'portable':
+        monkeypatch.setattr(connection.features, 'can_return_columns_from_insert', False)
+    return request.param
+
+
+@pytest.mark.django_db
+class TestUpsertLine:
+    def test_insert_then_increment(self, cart, catalog, upsert_path):
+        """Test the first upsert creates a line and later ones add to it"""
+        created = upsert_line(cart.pk, catalog[0].pk, 2, catalog[0].price)
+        assert created.created and created.quantity == 2
+        added = upsert_line(cart.pk, catalog[0].pk, 3, catalog[0].price)
+        assert added.item_id == created.item_id
+        assert not added.created and added.quantity == 5
+        assert list(CartItem.objects.values_list('quantity', flat=True)) == [5]
+
+    def test_cap(self, cart, catalog, upsert_path):
+        """Test an upsert past the cap changes nothing and returns None"""
+        upsert_line(cart.pk, catalog[0].pk, MAX_LINE_QUANTITY - 1, catalog[0].price)
+        assert upsert_line(cart.pk, catalog[0].pk, 2, catalog[0].price) is None
+        assert upsert_line(cart.pk, catalog[1].pk, MAX_LINE_QUANTITY + 1, catalog[1].price) is None
+        assert list(CartItem.objects.values_list('quantity', flat=True)) == [MAX_LINE_QUANTITY - 1]
+
+    def test_add_to_cart_queries(self, cart, catalog, settings, django_assert_num_queries):
+        """Test adding to an existing cart costs a fixed number of queries"""
+        settings.ALLOWED_HOSTS = ['testserver']
+        client = Client()
+        client.force_login(cart.user)
+        url = reverse('cart:add_to_cart')
+        # session, user, controller, cart, then savepoint, cart UPDATE,
+        # line upsert and release in one transaction
+        with django_assert_num_queries(8):
+            client.post(url, {'controller_id': catalog[0].pk, 'quantity': 1},
+                        HTTP_REFERER='http://testserver/')
+        assert Cart.objects.values_list('item_count', flat=True).get(pk=cart.pk) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentAdds:
+    def hammer(self, cart, controllers, threads=8, rounds=5):
+        errors = []
+        barrier = threading.Barrier(threads)
+
+        def worker(n):
+            try:
+                barrier.wait()
+                for i in range(rounds):
+                    controller = controllers[(n + i) % len(controllers)]
+                    while True:
+                        try:
+                            add_item(cart, controller, 1)
+                        except ValidationError:
+                            pass
+                        except OperationalError as exc:
+                            # SQLite locks the database rather than rows;
+                            # the transaction rolled back, so try again
+                            if 'locked' not in str(exc):
+                                raise
+                            continue
+                        break
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return errors
+
+    def test_concurrent_adds_respect_limits(self, cart, catalog):
+        """Test many threads adding to one cart never pass the caps or drift"""
+        errors = self.hammer(cart, catalog)
+
+        assert errors == []
+        quantities = list(CartItem.objects.filter(cart=cart).values_list('quantity', flat=True))
+        assert len(quantities) == len(catalog)
+        assert all(quantity <= MAX_LINE_QUANTITY for quantity in quantities)
+        summary = Cart.objects.values_list('item_count', 'subtotal').get(pk=cart.pk)
+        assert summary == (sum(quantities), Decimal('10.00') * sum(quantities))
+        # 8 threads x 5 adds = 40 units against a 20-unit cart cap
+        assert sum(quantities) == 20
@@ -1,11 +1,22 @@
 from django.urls import path
+from game_ctrl.ratelimit import Policy, limit_patterns
 from . import views
 
 app_name = 'cart'
 
-urlpatterns = [
+# Per client: the user when logged in, else the IP address
+RATE_LIMITS = {
+    'add_to_cart': Policy('10/m', methods=['POST']),
+    'cart_remove': Policy('20/m', methods=['POST']),
+    'update_cart': Policy('20/m', methods=['POST']),
+    'batch_update': Policy('20/m', methods=['POST']),
+    'cart_detail': Policy('30/m', methods=['GET']),
+}
+
+urlpatterns = limit_patterns(app_name, RATE_LIMITS, [
     path('add/', views.add_to_cart, name='add_to_cart'),
     path('remove/<int:controller_id>/', views.cart_remove, name='cart_remove'),
     path('update/', views.update_cart, name='update_cart'),
+    path('batch/', views.batch_update, name='batch_update'),
     path('', views.cart_detail, name='cart_detail'),
-]
\ No newline at end of file
+])
@@ -1,24 +1,27 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.cache import never_cache
 from django.core.exceptions import ValidationError
 from django.utils.html import escape
-from django_ratelimit.decorators import ratelimit
+import json
 import logging
 import re
-from .models import Cart, CartItem
 from products.models import Controller
 from django.conf import settings
-from django.db.models import Sum
 from .forms import CartAddProductForm
+from game_ctrl.metrics import record_cart_mutation
+from game_ctrl.query_check import query_budget
+from .cache import ainvalidate_cart_badge, invalidate_cart_badge
+from .cart import cart_for
+from .summary import MAX_LINE_QUANTITY, check_limits
 
 logger = logging.getLogger('game_ctrl.cart')
 
 # Add constants
-MAX_CART_ITEMS = 20  # Maximum total items in cart
 MAX_ITEM_PRICE = 10000  # Maximum price in dollars
-MAX_TOTAL_PRICE = 20000  # Maximum cart total
+MAX_BATCH_OPERATIONS = 50  # Maximum lines changed by one batch request
 
 def sanitize_input(value):
     """Sanitize user input"""
@@ -37,29 +40,20 @@ def validate_quantity(quantity):
         quantity = int(quantity)
         if quantity < 0:
             raise ValidationError("Quantity must be positive")
-        if quantity > 10:
+        if quantity > MAX_LINE_QUANTITY:
             raise ValidationError("Maximum quantity exceeded")
         return quantity
     except (TypeError, ValueError):
         raise ValidationError("Invalid quantity format")
 
-def validate_cart_limits(cart, new_quantity=0):
+def validate_cart_limits(cart, new_quantity=0, added_price=0):
     """Validate cart limits"""
-    # Check total number of items
-    total_items = cart.items.aggregate(Sum('quantity'))['quantity__sum'] or 0
-    total_items += new_quantity
-    
-    if total_items > MAX_CART_ITEMS:
-        raise ValidationError(f"Cart cannot exceed {MAX_CART_ITEMS} items")
-        
-    # Check total price
-    cart_total = sum(item.total_price for item in cart.items.all())
-    if cart_total > MAX_TOTAL_PRICE:
-        raise ValidationError(f"Cart total cannot exceed ${MAX_TOTAL_PRICE}")
+    # A single-row read of the cart's stored summary
+    check_limits(cart.pk, new_quantity, added_price)
 
 def validate_controller(controller):
     """Validate controller"""
-    if not controller.is_active:
+    if not getattr(controller, 'is_active', True):
         raise ValidationError("Product is not available")
         
     if controller.price > MAX_ITEM_PRICE:
@@ -69,6 +63,40 @@ def validate_controller(controller):
     if hasattr(controller, 'stock') and controller.stock <= 0:
         raise ValidationError("Item is out of stock")
 
+def parse_operations(body):
+    """Parse a batch body into {controller_id: quantity}"""
+    try:
+        operations = json.loads(body)['operations']
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError("Expected a JSON object with an operations list")
+    if not isinstance(operations, list):
+        raise ValidationError("Expected a JSON object with an operations list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValidationError(f"A batch cannot change more than {MAX_BATCH_OPERATIONS} lines")
+
+    quantities = {}
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValidationError("Each operation must be an object")
+        controller_id = operation.get('controller_id')
+        if type(controller_id) is not int or controller_id < 1:
+            raise ValidationError("Invalid controller ID")
+        if controller_id in quantities:
+            raise ValidationError(f"Controller {controller_id} appears more than once")
+        quantities[controller_id] = validate_quantity(operation.get('quantity'))
+    return quantities
+
+def cart_changed(request, action):
+    """Count a cart mutation and drop the user's cached navbar badge"""
+    record_cart_mutation(action)
+    if request.user.is_authenticated:
+        invalidate_cart_badge(request.user.id)
+
+async def acart_changed(request, action):
+    record_cart_mutation(action)
+    if request.user.is_authenticated:
+        await ainvalidate_cart_badge(request.user.id)
+
 def validate_request_origin(request):
     """Validate request origin"""
     referer = request.META.get('HTTP_REFERER', '')
@@ -79,26 +107,21 @@ def validate_request_origin(request):
     if not any(host in referer for host in allowed_hosts):
         raise ValidationError("Invalid request origin")
 
-@login_required
+@query_budget(5)
 @never_cache
-@ratelimit(key='user', rate='30/m', method=['GET'])
-def cart_detail(request):
+async def cart_detail(request):
     """Cart detail view"""
-    try:
-        cart = Cart.objects.get(user=request.user)
-        logger.info(
-            'Cart viewed by user %s (ID: %s)', 
-            sanitize_input(request.user.username), 
-            request.user.id
-        )
-        return render(request, 'cart/detail.html', {'cart': cart})
-    except Cart.DoesNotExist:
-        return render(request, 'cart/detail.html', {'cart': None})
+    # The rate limit in cart/urls.py has resolved request.user.
+    # The cart with its stored totals, then all lines with their controllers;
+    # visitors' carts live in the session until they log in
+    cart, lines = await sync_to_async(cart_for(request).detail)()
+    if cart is not None:
+        logger.info('Cart viewed')
+    # The page already has the totals, so the navbar badge needs no lookup
+    return render(request, 'cart/detail.html', {'cart': cart, 'cart_items': lines, 'cart_badge': cart})
 
-@login_required
 @require_http_methods(["POST"])
-@ratelimit(key='user', rate='10/m', method=['POST'])
-def add_to_cart(request):
+async def add_to_cart(request):
     """Add item to cart"""
     try:
         # Validate request origin
@@ -112,120 +135,135 @@ def add_to_cart(request):
         quantity = validate_quantity(request.POST.get('quantity', 1))
         
         # Get controller and validate
-        controller = get_object_or_404(Controller, id=controller_id)
+        controller = await aget_object_or_404(Controller, id=controller_id)
         validate_controller(controller)
         
-        # Get or create cart and validate limits
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        validate_cart_limits(cart, quantity)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            controller=controller,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            new_quantity = validate_quantity(cart_item.quantity + quantity)
-            validate_cart_limits(cart, new_quantity - cart_item.quantity)
-            cart_item.quantity = new_quantity
-            cart_item.save()
+        # The store checks the limits and updates the cart's totals
+        # together with the line, in a transaction, so off the event loop
+        await sync_to_async(cart_for(request).add)(controller, quantity)
+        await acart_changed(request, 'add')
             
         logger.info(
-            'Item added to cart: user=%s (ID: %s), controller=%s, quantity=%s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Item added to cart: controller=%s, quantity=%s',
             controller.id,
             quantity
         )
             
     except ValidationError as e:
         logger.warning(
-            'Validation error for user %s (ID: %s): %s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Validation error: %s',
             sanitize_input(str(e))
         )
     except Exception as e:
         logger.error(
-            'Cart error for user %s (ID: %s): %s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Cart error: %s',
             sanitize_input(str(e))
         )
         
     return redirect('cart:cart_detail')
 
-@login_required
 @require_http_methods(["POST"])
 @never_cache
-@ratelimit(key='user', rate='20/m', method=['POST'])
-def update_cart(request):
-    """Update cart item quantity"""
+async def update_cart(request):
+    """Set the quantity of a controller in the cart; 0 removes it"""
     try:
         # Sanitize and validate inputs
-        item_id = sanitize_input(request.POST.get('item_id'))
-        if not item_id or not item_id.isdigit():
-            raise ValidationError("Invalid item ID")
-            
+        controller_id = sanitize_input(request.POST.get('controller_id'))
+        if not controller_id or not controller_id.isdigit():
+            raise ValidationError("Invalid controller ID")
+
         quantity = validate_quantity(request.POST.get('quantity', 0))
-        
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-        
+
+        # Keyed on the controller, like cart_remove: with the Redis store a
+        # line may have no CartItem row yet, or an out of date one
+        controller = await aget_object_or_404(Controller, id=controller_id)
+        if quantity > 0:
+            validate_controller(controller)
+
+        await sync_to_async(cart_for(request).set_many)(
+            {controller.id: quantity}, {controller.id: controller},
+        )
+        await acart_changed(request, 'update')
         if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
             logger.info(
-                'Cart item updated: user=%s (ID: %s), item=%s, quantity=%s', 
-                sanitize_input(request.user.username), 
-                request.user.id,
-                item_id,
+                'Cart item updated: controller=%s, quantity=%s',
+                controller.id,
                 quantity
             )
         else:
-            cart_item.delete()
             logger.info(
-                'Cart item removed: user=%s (ID: %s), item=%s', 
-                sanitize_input(request.user.username), 
-                request.user.id,
-                item_id
+                'Cart item removed: controller=%s',
+                controller.id
             )
-            
+
     except ValidationError as e:
         logger.warning(
-            'Validation error for user %s (ID: %s): %s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Validation error: %s',
             sanitize_input(str(e))
         )
     except Exception as e:
         logger.error(
-            'Cart error for user %s (ID: %s): %s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Cart error: %s',
             sanitize_input(str(e))
         )
         
     return redirect('cart:cart_detail')
 
-@login_required
+@require_POST
+@never_cache
+def batch_update(request):
+    """Set several cart lines from one JSON request and return the cart summary"""
+    try:
+        validate_request_origin(request)
+        quantities = parse_operations(request.body)
+
+        controllers = Controller.objects.in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(controllers))
+        if missing:
+            raise ValidationError(f"Unknown controller {missing[0]}")
+        for controller in controllers.values():
+            validate_controller(controller)
+
+        cart = cart_for(request).set_many(quantities, controllers)
+        cart_changed(request, 'batch')
+    except ValidationError as e:
+        logger.warning(
+            'Validation error: %s',
+            sanitize_input(str(e))
+        )
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    except Exception as e:
+        logger.error(
+            'Cart error: %s',
+            sanitize_input(str(e))
+        )
+        return JsonResponse({'error': 'Cart could not be updated'}, status=500)
+
+    logger.info(
+        'Cart batch applied: lines=%s',
+        len(quantities)
+    )
+    return JsonResponse({
+        'item_count': cart.item_count,
+        'subtotal': str(cart.subtotal),
+        'lines': [
+            {'controller_id': controller_id, 'quantity': quantity}
+            for controller_id, quantity in quantities.items()
+        ],
+    })
+
 @require_POST
 def cart_remove(request, controller_id):
     try:
-        cart = Cart.objects.get(user=request.user)
-        controller = get_object_or_404(Controller, id=controller_id)
-        CartItem.objects.filter(cart=cart, controller=controller).delete()
+        cart_for(request).remove(controller_id)
+        cart_changed(request, 'remove')
         logger.info(
-            'Item removed from cart: user=%s (ID: %s), controller=%s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Item removed from cart: controller=%s',
             controller_id
         )
     except Exception as e:
         logger.error(
-            'Error removing item from cart: user=%s (ID: %s), error=%s', 
-            sanitize_input(request.user.username), 
-            request.user.id,
+            'Error removing item from cart: %s',
             sanitize_input(str(e))
         )
     return redirect('cart:cart_detail') 
\ No newline at end of file
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture
+def query_check():
+    """check_queries(budget=None): fail the test if the block runs an N+1 or goes over budget"""
+    from game_ctrl.query_check import check_queries
+    return check_queries
+
+
+@pytest.fixture(autouse=True)
+def rate_limits(monkeypatch):
+    """Fresh rate limit buckets for each test, so one test's requests do not throttle the next"""
+    from game_ctrl import ratelimit
+    monkeypatch.setattr(ratelimit, '_limiters', {})
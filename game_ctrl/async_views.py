@@ -0,0 +1,27 @@
+"""
+Helpers for the storefront's async views.
+
+home, controller_detail and the cart page views are coroutines, so a
+worker served through game_ctrl.asgi keeps handling other requests while
+one waits on the database or the cache. They follow a few rules:
+
+* resolve_user() first; the lazy request.user loads the user
+  synchronously, which Django refuses inside the event loop;
+* plain reads use the async ORM (aget, async for), and templates get
+  evaluated lists rather than querysets;
+* work that needs transaction.atomic, such as the cart stores and
+  cart.summary, runs through sync_to_async, since the async ORM cannot
+  open transactions.
+
+Rate limits, from game_ctrl.ratelimit, wrap these views in the URLconf
+and have resolved request.user before the view runs.
+
+Under WSGI the same views run through async_to_sync, so both deployments
+serve them.
+"""
+
+
+async def resolve_user(request):
+    """Load the request's user without blocking and make it request.user"""
+    request.user = await request.auser()
+    return request.user
@@ -0,0 +1,252 @@
+"""
+End-to-end latency benchmarks for the storefront views.
+
+Each view is driven through the Django test client against whatever
+dataset is loaded (see products.synthetic). For every view we record
+p50/p95/p99 wall-clock latency, the SQL queries one request issues and
+the peak memory one request allocates, and compare the results with a
+JSON baseline.
+
+Caches are replaced by DummyCache and rate limiting is switched off while
+benchmarking, so every request pays the full cost of the view; cache hit
+rates are a deployment concern, not something to regress on here.
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cart.models import Cart, CartItem
+from products.models import Category, Controller
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'memory_kb')
+DEFAULT_TOLERANCES = {
+    'p50_ms': 0.25,
+    'p95_ms': 0.35,
+    'p99_ms': 0.50,
+    # Query counts are deterministic; any extra query is a regression
+    'queries': 0,
+    'memory_kb': 0.25,
+}
+# Memory samples run under tracemalloc, which is slow; a few are enough
+MEMORY_SAMPLES = 3
+BENCHMARK_OVERRIDES = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'RATELIMIT_ENABLE': False,
+}
+
+
+@dataclass
+class Scenario:
+    """One view under test: ``request(client, i)`` issues the i-th request"""
+    name: str
+    request: object
+    user: object = None
+
+
+@dataclass
+class Regression:
+    view: str
+    metric: str
+    baseline: float
+    current: float
+    limit: float
+
+    def __str__(self):
+        return (f'{self.view} {self.metric}: {self.current:g} '
+                f'(baseline {self.baseline:g}, limit {self.limit:g})')
+
+
+@dataclass
+class Comparison:
+    regressions: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+
+
+def percentile(sorted_samples, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_samples) - 1, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def _host():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'testserver'
+
+
+def build_scenarios():
+    """Scenarios for the seeded dataset, picked deterministically"""
+    category = (
+        Category.objects.annotate(n=Count('controllers')).order_by('-n', 'pk').first()
+    )
+    controller_ids = list(Controller.objects.order_by('pk').values_list('pk', flat=True)[:100])
+    if category is None or not controller_ids:
+        raise ValueError('Benchmarks need a dataset; run generate_dataset first')
+    # The fullest cart stands in for a heavy but realistic cart page
+    browsing_cart = (
+        Cart.objects.annotate(n=Count('items')).filter(n__gt=0)
+        .order_by('-n', 'pk').select_related('user').first()
+    )
+    shopper = _shopper(controller_ids)
+    shopper_controllers = controller_ids[:3]
+    host = _host()
+    referer = f'http://{host}/'
+    home = reverse('products:home')
+    category_url = reverse('products:category_detail', kwargs={'slug': category.slug})
+
+    scenarios = [
+        Scenario('home', lambda client, i: client.get(home, HTTP_HOST=host)),
+        Scenario('category_detail', lambda client, i: client.get(category_url, HTTP_HOST=host)),
+        Scenario('controller_detail', lambda client, i: client.get(
+            reverse('products:controller_detail', kwargs={'id': controller_ids[i % len(controller_ids)]}),
+            HTTP_HOST=host,
+        )),
+    ]
+    if browsing_cart is not None:
+        scenarios.append(Scenario(
+            'cart_detail',
+            lambda client, i: client.get(reverse('cart:cart_detail'), HTTP_HOST=host),
+            user=browsing_cart.user,
+        ))
+    scenarios += [
+        Scenario('add_to_cart', lambda client, i: client.post(
+            reverse('cart:add_to_cart'),
+            {'controller_id': controller_ids[i % len(controller_ids)], 'quantity': 1},
+            HTTP_HOST=host, HTTP_REFERER=referer,
+        ), user=shopper),
+        Scenario('update_cart', lambda client, i: client.post(
+            reverse('cart:update_cart'),
+            {'controller_id': shopper_controllers[i % len(shopper_controllers)], 'quantity': 1 + i % 2},
+            HTTP_HOST=host, HTTP_REFERER=referer,
+        ), user=shopper),
+    ]
+    return scenarios
+
+
+def _shopper(controller_ids):
+    """A dedicated user with a small cart for the write scenarios"""
+    user, _ = User.objects.get_or_create(username='benchmark-shopper')
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for controller_id in controller_ids[:3]:
+        CartItem.objects.get_or_create(cart=cart, controller_id=controller_id)
+    return user
+
+
+def measure(scenario, iterations, warmup):
+    """Time ``iterations`` requests after ``warmup``, then sample queries and memory"""
+    client = Client()
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+
+    def issue(i):
+        response = scenario.request(client, i)
+        if response.status_code >= 400:
+            raise AssertionError(f'{scenario.name} returned {response.status_code}')
+
+    for i in range(warmup):
+        issue(i)
+
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter_ns()
+        issue(warmup + i)
+        samples.append((time.perf_counter_ns() - started) / 1e6)
+    samples.sort()
+
+    with CaptureQueriesContext(connection) as queries:
+        issue(warmup + iterations)
+    # Count now; the next request resets the connection's query log
+    query_count = len(queries.captured_queries)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(MEMORY_SAMPLES):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            issue(warmup + iterations + 1 + i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'queries': query_count,
+        'memory_kb': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def run_benchmarks(iterations=50, warmup=5, only=None):
+    """Benchmark every scenario against the current database"""
+    results = {}
+    with override_settings(**BENCHMARK_OVERRIDES):
+        for scenario in build_scenarios():
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = measure(scenario, iterations, warmup)
+    return results
+
+
+def report(results, meta=None):
+    """The JSON document written as a baseline"""
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            **(meta or {}),
+        },
+        'views': results,
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, document):
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerances=None):
+    """Find metrics that grew past their tolerance.
+
+    Fractional tolerances apply to timings and memory; the query
+    tolerance is an absolute number of extra queries.
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    comparison = Comparison()
+    for view, metrics in results.items():
+        expected = baseline.get('views', {}).get(view)
+        if expected is None:
+            comparison.missing.append(view)
+            continue
+        for metric in METRICS:
+            if metric not in expected:
+                continue
+            if metric == 'queries':
+                limit = expected[metric] + tolerances[metric]
+            else:
+                limit = expected[metric] * (1 + tolerances[metric])
+            if metrics[metric] > limit:
+                comparison.regressions.append(
+                    Regression(view, metric, expected[metric], metrics[metric], round(limit, 3))
+                )
+    return comparison
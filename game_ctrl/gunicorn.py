@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for the WSGI deployment.
+
+    gunicorn game_ctrl.wsgi:application -c python:game_ctrl.gunicorn
+
+Workers share Prometheus metrics through PROMETHEUS_MULTIPROC_DIR (see
+game_ctrl.metrics). It is set here, before any worker imports
+prometheus_client, and emptied when the master starts so a restart does
+not report the previous run's totals.
+"""
+import os
+import shutil
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/game_ctrl_metrics')
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for serving game_ctrl.asgi with uvicorn workers.
+
+    gunicorn -c python:game_ctrl.gunicorn_asgi
+
+Each worker runs an event loop, so one process holds many concurrent
+requests to the async views (see game_ctrl.async_views) instead of one
+per sync worker. Django still runs each ORM call synchronously in a
+thread, so the gain is in overlapping cache, network and slow-client waits;
+benchmark_concurrency measures it against the WSGI deployment. For
+local development, ``uvicorn game_ctrl.asgi:application --reload``.
+Workers share metrics as under game_ctrl.gunicorn.
+"""
+import os
+
+from game_ctrl.gunicorn import child_exit, on_starting  # noqa: F401
+
+wsgi_app = 'game_ctrl.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '3'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
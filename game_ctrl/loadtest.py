@@ -0,0 +1,113 @@
+"""
+Throughput under concurrency for a running deployment.
+
+game_ctrl.benchmarks times views one request at a time in-process; this
+drives real servers over HTTP with many clients at once, which is where
+the WSGI (sync gunicorn workers) and ASGI (uvicorn workers) deployments
+differ. Each client is a thread holding one keep-alive connection and
+issuing GETs back to back, cycling through the paths, until the
+duration is up. Client threads share the GIL, so at very high request
+rates the client itself becomes the bottleneck; run it from another
+machine when measuring more than a few thousand requests a second.
+
+    python manage.py benchmark_concurrency \\
+        --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001
+"""
+import http.client
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from .benchmarks import percentile
+
+
+@dataclass
+class LoadResult:
+    target: str
+    duration: float
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.errors
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        timing = {
+            f'p{p}_ms': round(percentile(latencies, p), 3) if latencies else None
+            for p in (50, 95, 99)
+        }
+        return {
+            'requests': self.requests,
+            'rps': round(len(self.latencies) / self.duration, 1) if self.duration else 0.0,
+            'errors': self.errors,
+            **timing,
+        }
+
+
+def _connect(url, timeout):
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=timeout)
+
+
+def _client(url, paths, headers, deadline, timeout, offset, latencies, counts, lock):
+    """One client: GET the paths in turn on one connection until ``deadline``"""
+    prefix = urlsplit(url).path.rstrip('/')
+    connection = _connect(url, timeout)
+    local, errors, i = [], 0, offset
+    try:
+        while time.monotonic() < deadline:
+            path = prefix + paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = _connect(url, timeout)
+                continue
+            if response.status >= 400:
+                errors += 1
+            else:
+                local.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            counts.append(errors)
+
+
+def run_load(name, url, paths, concurrency=50, duration=10.0, headers=None, timeout=10.0):
+    """Load ``url`` with ``concurrency`` clients for ``duration`` seconds"""
+    latencies, counts, lock = [], [], threading.Lock()
+    headers = {'Connection': 'keep-alive', **(headers or {})}
+    started = time.monotonic()
+    deadline = started + duration
+    clients = [
+        threading.Thread(
+            target=_client,
+            args=(url, paths, headers, deadline, timeout, n, latencies, counts, lock),
+            daemon=True,
+        )
+        for n in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return LoadResult(name, time.monotonic() - started, latencies, sum(counts))
+
+
+def compare_throughput(results):
+    """Each target's requests per second relative to the first target's"""
+    base = results[0].summary()['rps'] if results else 0
+    return {
+        result.target: round(result.summary()['rps'] / base, 2) if base else None
+        for result in results
+    }
@@ -0,0 +1,281 @@
+"""
+Structured logging that request threads never wait on.
+
+Production logs go through BackgroundHandler, which only puts records
+on a bounded queue. A listener thread takes them off and writes them,
+as JSON lines from JsonFormatter, to stdout and to a per-process file
+that CompressedRotatingFileHandler rotates by size and by time. When the
+disk or stdout cannot keep up, for instance during a log storm in a
+sale, the queue fills and new records are dropped and counted in
+game_ctrl_log_records_dropped_total. The request never blocks.
+
+Two filters run on the request thread, before a record is queued:
+
+* RequestContextFilter adds the request id and the user's sanitised
+  identity, which is worked out once per request, on its first record,
+  so call sites no longer pass or sanitise usernames;
+* SamplingFilter keeps LOG_SAMPLE_RATES of a logger's records below
+  WARNING and stamps the rate on the kept ones. Warnings and errors are
+  always kept.
+"""
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import shutil
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import LazyObject, empty
+
+from .metrics import LOG_RECORDS_DROPPED
+
+UNSAFE_RE = re.compile(r'[^a-zA-Z0-9\-_.@+]')
+REQUEST_ID_RE = re.compile(r'^[a-zA-Z0-9\-_.]{1,64}$')
+# Attributes every LogRecord has; anything else came in through ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+CONTEXT_ATTRIBUTES = ('request_id', 'user_id', 'user', 'sample_rate')
+
+
+class _RequestContext:
+    __slots__ = ('request', 'request_id', 'identity')
+
+    def __init__(self, request):
+        self.request = request
+        header = request.headers.get('X-Request-ID', '')
+        self.request_id = header if REQUEST_ID_RE.match(header) else uuid.uuid4().hex
+        self.identity = None
+
+    def user_fields(self):
+        """The user's id and sanitised name, worked out on first use"""
+        if self.identity is None:
+            user = getattr(self.request, 'user', None)
+            # Not loaded yet; a log call must not be what queries for it
+            if user is None or (isinstance(user, LazyObject) and user._wrapped is empty):
+                return {}
+            if user.is_authenticated:
+                self.identity = {'user_id': user.pk, 'user': UNSAFE_RE.sub('', user.get_username())}
+            else:
+                self.identity = {'user_id': None, 'user': 'anonymous'}
+        return self.identity
+
+
+_request_context = ContextVar('game_ctrl_request_context', default=None)
+
+
+class RequestContextMiddleware:
+    """Give each request an id, for its log records and the X-Request-ID header"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        context = _RequestContext(request)
+        token = _request_context.set(context)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_context.reset(token)
+        response['X-Request-ID'] = context.request_id
+        return response
+
+    async def __acall__(self, request):
+        context = _RequestContext(request)
+        token = _request_context.set(context)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_context.reset(token)
+        response['X-Request-ID'] = context.request_id
+        return response
+
+
+class RequestContextFilter(logging.Filter):
+    """Add the current request's id and user to records logged while serving it"""
+
+    def filter(self, record):
+        context = _request_context.get()
+        if context is not None:
+            record.request_id = context.request_id
+            for name, value in context.user_fields().items():
+                setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of each logger's records below WARNING"""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = settings.LOG_SAMPLE_RATES if rates is None else rates
+        self._resolved = {}
+
+    def rate(self, name):
+        """The rate of the closest configured ancestor of logger ``name``"""
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rate, prefix = 1.0, name
+        while prefix:
+            if prefix in self.rates:
+                rate = self.rates[prefix]
+                break
+            prefix = prefix.rpartition('.')[0]
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the request context and ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        for name in CONTEXT_ATTRIBUTES:
+            if name in record.__dict__:
+                entry[name] = record.__dict__[name]
+        for name, value in record.__dict__.items():
+            if name not in RECORD_ATTRIBUTES and name not in entry:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class CompressedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotate at ``when`` or at ``max_bytes``, whichever comes first, and gzip old files.
+
+    ``{pid}`` in the filename is replaced by the process id. Each gunicorn
+    worker must have its own file, or one worker's rotation would move
+    the file out from under the others.
+    """
+
+    def __init__(self, filename, max_bytes=0, when='midnight', backup_count=14, encoding='utf-8'):
+        super().__init__(
+            filename.format(pid=os.getpid()), when=when, backupCount=backup_count,
+            encoding=encoding, delay=True,
+        )
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if not self.max_bytes:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() >= self.max_bytes
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        now = time.time()
+        if os.path.exists(self.baseFilename):
+            # Microseconds keep names unique and in order when size rotates fast
+            stamp = datetime.fromtimestamp(now).strftime('%Y%m%d-%H%M%S-%f')
+            target = f'{self.baseFilename}.{stamp}.gz'
+            with open(self.baseFilename, 'rb') as source, gzip.open(target, 'wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+            os.remove(self.baseFilename)
+        if self.backupCount:
+            for old in self.getFilesToDelete():
+                os.remove(old)
+        rollover_at = self.computeRollover(int(now))
+        while rollover_at <= now:
+            rollover_at += self.interval
+        self.rolloverAt = rollover_at
+
+    def getFilesToDelete(self):
+        directory, base = os.path.split(self.baseFilename)
+        rotated = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(base + '.') and name.endswith('.gz')
+        )
+        return [os.path.join(directory, name) for name in rotated[:-self.backupCount]]
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """Queue records for a listener thread that writes them to stdout and a file.
+
+    Records are rendered to their message on the request thread, so
+    arguments that change later are logged as they were. The formatter
+    given to this handler is used by the listener for every target.
+    """
+
+    def __init__(self, filename=None, stream=None, max_bytes=50 * 1024 * 1024,
+                 when='midnight', backup_count=14, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.targets = []
+        if stream is not None:
+            self.targets.append(logging.StreamHandler(stream))
+        if filename is not None:
+            self.targets.append(CompressedRotatingFileHandler(filename, max_bytes, when, backup_count))
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def close(self):
+        """Write out what is queued, then close the targets; safe to call twice"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            for target in self.targets:
+                target.close()
+        super().close()
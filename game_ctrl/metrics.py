@@ -0,0 +1,202 @@
+"""
+Prometheus metrics, served at /metrics.
+
+MetricsMiddleware records every request's latency and status code by
+view, and the number of SQL queries it made and the time they took.
+The catalog page, facet and cart badge caches count hits and misses,
+the cart views count mutations by action, and game_ctrl.ratelimit counts
+the requests it throttles.
+
+Gunicorn runs several worker processes, each with its own copy of these
+objects. With PROMETHEUS_MULTIPROC_DIR set (game_ctrl.gunicorn sets it),
+prometheus_client keeps every value in an mmap'd file per process and
+metrics_view sums the files of all workers, live and exited, so whichever
+worker answers the scrape reports for all of them. Without it (runserver,
+tests) values live in the process.
+
+Recording is cheap on purpose. Labelled children are created once and
+then found in a plain dict, skipping the lock labels() takes, and a
+value update is a float add into the mmap. Queries are counted by one
+execute wrapper per connection, into a per-request object reached
+through a context variable, so async views' queries are counted too.
+"""
+import hmac
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.cache import never_cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+# Requests that never reached a view: static files, 404s from the resolver
+UNRESOLVED = 'unresolved'
+
+REQUEST_LATENCY = Histogram(
+    'game_ctrl_request_duration_seconds', 'Time to respond, by view',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    'game_ctrl_responses', 'Responses by view and status code',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'game_ctrl_db_queries_per_request', 'SQL queries made by one request',
+    ['view'], buckets=QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    'game_ctrl_db_seconds_per_request', 'Time one request spent in SQL queries',
+    ['view'], buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'game_ctrl_cache_requests', 'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+CART_MUTATIONS = Counter(
+    'game_ctrl_cart_mutations', 'Cart changes by action',
+    ['action'],
+)
+LOG_RECORDS_DROPPED = Counter(
+    'game_ctrl_log_records_dropped', 'Log records dropped because the log queue was full',
+)
+THROTTLED = Counter(
+    'game_ctrl_requests_throttled', 'Requests refused by a rate limit, by policy and check',
+    ['policy', 'check'],
+)
+RATE_LIMIT_ERRORS = Counter(
+    'game_ctrl_rate_limit_errors', 'Requests let through because the rate limit backend failed',
+    ['policy'],
+)
+
+_children = {}
+
+
+def _child(metric, *labels):
+    """``metric.labels(*labels)``, remembered so later calls take no lock"""
+    try:
+        return _children[metric, labels]
+    except KeyError:
+        child = _children[metric, labels] = metric.labels(*labels)
+        return child
+
+
+def record_cache(cache_name, hit):
+    _child(CACHE_REQUESTS, cache_name, 'hit' if hit else 'miss').inc()
+
+
+def record_cart_mutation(action):
+    _child(CART_MUTATIONS, action).inc()
+
+
+class _QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_stats = ContextVar('game_ctrl_query_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class MetricsMiddleware:
+    """Record each request's latency, status and SQL use by view; put it first"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # For a connection opened before this module was imported
+        install_query_recorder(connection)
+        stats = _QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        install_query_recorder(connection)
+        stats = _QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @staticmethod
+    def record(request, response, seconds, stats):
+        match = request.resolver_match
+        view = match.view_name if match is not None else UNRESOLVED
+        # Arbitrary methods would add a label value each
+        method = request.method if request.method in METHODS else 'other'
+        _child(REQUEST_LATENCY, view, method).observe(seconds)
+        _child(RESPONSES, view, method, response.status_code).inc()
+        _child(DB_QUERIES, view).observe(stats.count)
+        _child(DB_TIME, view).observe(stats.seconds)
+
+
+def registry():
+    """Every worker's metrics in multiprocess mode, else this process's"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+@never_cache
+def metrics_view(request):
+    """The Prometheus scrape endpoint; needs ``Bearer METRICS_TOKEN``.
+
+    Without a token it is open only with DEBUG on, for runserver.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
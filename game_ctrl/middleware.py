@@ -1,5 +1,7 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import HttpResponseServerError, Http404
 from django.template.loader import render_to_string
+from whitenoise.middleware import WhiteNoiseMiddleware
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,4 +26,35 @@ class ErrorHandlingMiddleware:
 
         # Render custom error template
         template = render_to_string('500.html')
-        return HttpResponseServerError(template) 
\ No newline at end of file
+        return HttpResponseServerError(template)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively in an async middleware stack.
+
+    WhiteNoiseMiddleware is sync-only, so in an ASGI stack Django would
+    switch every request to a worker thread and back just to pass it
+    through. Static lookups are in memory, so only serving a file goes
+    to a thread; every other request stays on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
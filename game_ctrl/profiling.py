@@ -0,0 +1,398 @@
+"""
+Sampled request profiling, browsed at /admin/profiles/.
+
+With PROFILING_ENABLED set, ProfilingMiddleware profiles a request when
+it carries a valid signed ``X-Profile`` header (the admin page shows a
+current token) or, at PROFILING_SAMPLE_RATE, at random. A profiled
+request runs under cProfile, and its SQL is logged by an execute wrapper
+found through a context variable, so queries that async views make from
+sync_to_async threads are caught too. It is saved with its call
+statistics and each SQL statement with its time, as parametrised SQL,
+without the parameters. Profiles go
+to a ring buffer in PROFILING_STORE that keeps the newest PROFILING_KEEP:
+
+* FileProfileStore, files in PROFILING_DIR, local to one machine;
+* RedisProfileStore, at PROFILING_REDIS_URL, shared by every pod.
+
+A request that is not sampled only pays for a dict lookup and, with a
+sample rate, one random number, and each of its queries pays for one
+context variable read. When profiling is disabled, the middleware drops
+out of the stack and installs no wrapper.
+
+On Python 3.12, as deployed, cProfile sees every thread of the process.
+That covers the loop thread on which async_to_sync runs async views
+under WSGI. Under ASGI it also covers whatever other requests the worker
+serves at the same time. Older Pythons only profile the thread the
+middleware runs on.
+"""
+import cProfile
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+SIGNING_SALT = 'game_ctrl.profiling'
+# Functions kept per profile for the pages and diffs; downloads have all
+TOP_FUNCTIONS = 100
+# Statements kept per profile; the rest are only counted
+MAX_QUERIES = 1000
+PROFILE_ID = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{4}$')
+
+
+def profile_token():
+    """A value for the X-Profile header, valid for PROFILING_TOKEN_MAX_AGE"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def _valid_token(value):
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class _QueryLog:
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_log = ContextVar('game_ctrl_query_log', default=None)
+
+
+def _log_query(execute, sql, params, many, context):
+    log = _query_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        log.count += 1
+        log.seconds += elapsed
+        if len(log.queries) < MAX_QUERIES:
+            log.queries.append({'sql': sql, 'ms': round(elapsed * 1000, 3), 'many': many})
+
+
+def install_query_log(connection, **kwargs):
+    if _log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_log_query)
+
+
+def _where(filename):
+    """A source path shortened to the project or installed package"""
+    for root in (str(settings.BASE_DIR), *sorted(sys.path, key=len, reverse=True)):
+        if root and filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def _functions(stats):
+    """The TOP_FUNCTIONS entries with the most cumulative time"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            'function': f'{_where(filename)}:{line}({name})',
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows[:TOP_FUNCTIONS]
+    ]
+
+
+class ProfilingMiddleware:
+    """Profile sampled or signed requests into the profile store"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        connection_created.connect(install_query_log)
+        self.get_response = get_response
+        self.rate = settings.PROFILING_SAMPLE_RATE
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        if HEADER in request.META:
+            if _valid_token(request.META[HEADER]):
+                return 'header'
+        elif self.rate and random.random() < self.rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = self.sampled(request)
+        if trigger is None:
+            return self.get_response(request)
+        # For a connection opened before the middleware was loaded
+        install_query_log(connection)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            profiler, log = self.start(stack)
+            response = self.get_response(request)
+        if profiler is not None:
+            self.save(request, response, trigger, time.perf_counter() - started, profiler, log)
+        return response
+
+    async def __acall__(self, request):
+        trigger = self.sampled(request)
+        if trigger is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            profiler, log = self.start(stack)
+            response = await self.get_response(request)
+        if profiler is not None:
+            self.save(request, response, trigger, time.perf_counter() - started, profiler, log)
+        return response
+
+    @staticmethod
+    def start(stack):
+        """Start profiling and logging queries until ``stack`` closes"""
+        profiler, log = cProfile.Profile(), _QueryLog()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12 allows one cProfile at a time per process, and
+            # another request in this worker is being profiled already
+            return None, None
+        stack.callback(profiler.disable)
+        stack.callback(_query_log.reset, _query_log.set(log))
+        return profiler, log
+
+    @staticmethod
+    def save(request, response, trigger, seconds, profiler, log):
+        stats = pstats.Stats(profiler)
+        match = request.resolver_match
+        now = timezone.now()
+        profile = {
+            'id': f"{now.strftime('%Y%m%dT%H%M%S%f')}-{secrets.token_hex(2)}",
+            'recorded': now.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match is not None else '',
+            'status': response.status_code,
+            'trigger': trigger,
+            'duration_ms': round(seconds * 1000, 3),
+            'query_count': log.count,
+            'query_ms': round(log.seconds * 1000, 3),
+            'queries': log.queries,
+            'functions': _functions(stats),
+        }
+        try:
+            get_profile_store().save(profile, marshal.dumps(stats.stats))
+        except (OSError, redis.RedisError):
+            # Losing a profile must not fail the request
+            logger.exception('Could not save profile %s', profile['id'])
+
+
+class FileProfileStore:
+    """Profiles as files in a directory, pruned to the newest ``keep``"""
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = directory or settings.PROFILING_DIR
+        self.keep = settings.PROFILING_KEEP if keep is None else keep
+
+    def path(self, profile_id, suffix):
+        return os.path.join(self.directory, f'{profile_id}{suffix}')
+
+    def save(self, profile, stats):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(profile['id'], '.prof'), 'wb') as f:
+            f.write(stats)
+        # Written last, so list() never sees a profile without its stats
+        with open(self.path(profile['id'], '.json'), 'w') as f:
+            json.dump(profile, f)
+        for profile_id in self.ids()[self.keep:]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def ids(self):
+        """Profile ids, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+    def list(self):
+        return [profile for profile in map(self.get, self.ids()) if profile is not None]
+
+    def get(self, profile_id):
+        try:
+            with open(self.path(profile_id, '.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def stats(self, profile_id):
+        try:
+            with open(self.path(profile_id, '.prof'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class RedisProfileStore:
+    """Profiles as Redis hashes, indexed by a list trimmed to the newest ``keep``"""
+
+    def __init__(self, client=None, prefix='profile', keep=None):
+        self.client = client or redis.Redis.from_url(settings.PROFILING_REDIS_URL)
+        self.prefix = prefix
+        self.keep = settings.PROFILING_KEEP if keep is None else keep
+        self.index = f'{prefix}:ids'
+
+    def key(self, profile_id):
+        return f'{self.prefix}:{profile_id}'
+
+    def save(self, profile, stats):
+        pipe = self.client.pipeline()
+        pipe.hset(self.key(profile['id']), mapping={'profile': json.dumps(profile), 'stats': stats})
+        pipe.lpush(self.index, profile['id'])
+        pipe.lrange(self.index, self.keep, -1)
+        pipe.ltrim(self.index, 0, self.keep - 1)
+        evicted = pipe.execute()[2]
+        if evicted:
+            self.client.delete(*(self.key(profile_id.decode()) for profile_id in evicted))
+
+    def list(self):
+        ids = [profile_id.decode() for profile_id in self.client.lrange(self.index, 0, -1)]
+        pipe = self.client.pipeline(transaction=False)
+        for profile_id in ids:
+            pipe.hget(self.key(profile_id), 'profile')
+        return [json.loads(value) for value in pipe.execute() if value is not None]
+
+    def get(self, profile_id):
+        value = self.client.hget(self.key(profile_id), 'profile')
+        return json.loads(value) if value is not None else None
+
+    def stats(self, profile_id):
+        return self.client.hget(self.key(profile_id), 'stats')
+
+
+_stores = {}
+
+
+def get_profile_store():
+    """The configured profile store, created once per backend path"""
+    path = settings.PROFILING_STORE
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def diff_profiles(a, b):
+    """Functions and statements of two profiles, largest change first"""
+    def by(rows, key, value):
+        return {row[key]: row[value] for row in rows}
+
+    def counts(queries):
+        totals = {}
+        for query in queries:
+            totals[query['sql']] = totals.get(query['sql'], 0) + 1
+        return totals
+
+    before = by(a['functions'], 'function', 'cumulative_ms')
+    after = by(b['functions'], 'function', 'cumulative_ms')
+    functions = [
+        {'function': name, 'a': before.get(name), 'b': after.get(name),
+         'delta': round(after.get(name, 0) - before.get(name, 0), 3)}
+        for name in before.keys() | after.keys()
+    ]
+    before, after = counts(a['queries']), counts(b['queries'])
+    queries = [
+        {'sql': sql, 'a': before.get(sql, 0), 'b': after.get(sql, 0),
+         'delta': after.get(sql, 0) - before.get(sql, 0)}
+        for sql in before.keys() | after.keys()
+    ]
+    return {
+        'duration_ms': round(b['duration_ms'] - a['duration_ms'], 3),
+        'query_count': b['query_count'] - a['query_count'],
+        'query_ms': round(b['query_ms'] - a['query_ms'], 3),
+        'functions': sorted(functions, key=lambda row: abs(row['delta']), reverse=True),
+        'queries': sorted(
+            (row for row in queries if row['delta']), key=lambda row: abs(row['delta']), reverse=True,
+        ),
+    }
+
+
+def _profile_or_404(profile_id):
+    profile = get_profile_store().get(profile_id) if PROFILE_ID.match(profile_id or '') else None
+    if profile is None:
+        raise Http404('No such profile')
+    return profile
+
+
+def _context(request, title, **extra):
+    return {**admin.site.each_context(request), 'title': title, **extra}
+
+
+def profile_list(request):
+    return render(request, 'admin/profiles/list.html', _context(
+        request, 'Request profiles',
+        profiles=get_profile_store().list(),
+        token=profile_token(),
+        token_max_age=settings.PROFILING_TOKEN_MAX_AGE // 60,
+    ))
+
+
+def profile_detail(request, profile_id):
+    profile = _profile_or_404(profile_id)
+    return render(request, 'admin/profiles/detail.html', _context(
+        request, f"{profile['method']} {profile['path']}", profile=profile,
+    ))
+
+
+def profile_diff(request):
+    a, b = _profile_or_404(request.GET.get('a')), _profile_or_404(request.GET.get('b'))
+    return render(request, 'admin/profiles/diff.html', _context(
+        request, 'Profile diff', a=a, b=b, diff=diff_profiles(a, b),
+    ))
+
+
+def profile_download(request, profile_id):
+    """The full call statistics, for pstats or snakeviz"""
+    _profile_or_404(profile_id)
+    stats = get_profile_store().stats(profile_id)
+    if stats is None:
+        raise Http404('No such profile')
+    response = HttpResponse(stats, content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="{profile_id}.prof"'
+    return response
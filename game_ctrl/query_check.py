@@ -0,0 +1,240 @@
+"""
+N+1 and query budget checks for requests.
+
+Every data statement a checked request runs is reduced to a fingerprint,
+its shape with literals, placeholders and IN lists taken out. When the
+same shape runs QUERY_CHECK_REPEATS times or more, the request has an
+N+1. The report names the code or template line behind the repeats,
+usually a lazy relation such as ``{{ item.controller.name }}`` inside a
+loop. A view can also declare the most queries it may run:
+
+    @query_budget(6)
+    def category_detail(request, slug): ...
+
+QueryCheckMiddleware applies both checks to requests. QUERY_CHECK_MODE
+picks what happens when a request fails them:
+
+* 'raise' (tests): raise QueryCheckError, which the test client re-raises;
+* 'log' (staging): log a warning for a QUERY_CHECK_SAMPLE_RATE share of
+  requests;
+* 'off' (production): the middleware leaves the stack.
+
+Outside requests, check_queries() applies the same checks to a block,
+and the ``query_check`` pytest fixture hands it to tests.
+"""
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+import django.db
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+DATA_STATEMENT_RE = re.compile(r'^\s*(?:WITH|SELECT|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+VALUES_RE = re.compile(r'VALUES\s*\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+DJANGO_DB_DIR = os.path.dirname(django.db.__file__) + os.sep
+
+
+class QueryCheckError(Exception):
+    """A request or block ran an N+1 or went over its query budget"""
+
+    def __init__(self, report):
+        super().__init__(str(report))
+        self.report = report
+
+
+def fingerprint(sql):
+    """The shape of ``sql``: the same for every row of an N+1 loop"""
+    shape = STRING_RE.sub('?', sql)
+    shape = NUMBER_RE.sub('?', shape)
+    shape = PLACEHOLDER_RE.sub('?', shape)
+    shape = LIST_RE.sub('(...)', shape)
+    shape = VALUES_RE.sub('VALUES (...)', shape)
+    return SPACE_RE.sub(' ', shape).strip()
+
+
+def query_budget(limit):
+    """Declare the most queries a view may run, checked by QueryCheckMiddleware.
+
+    Apply it outermost, so the attribute sits on the function the URL
+    resolver returns.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _location():
+    """Where the current query comes from: project code, then the template line"""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    code = None
+    # Step over the other execute wrappers to where Django ran the query
+    frame = sys._getframe(2)
+    while frame is not None and not frame.f_code.co_filename.startswith(DJANGO_DB_DIR):
+        frame = frame.f_back
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                where = f'{origin.template_name}:{token.lineno}'
+                return f'{code}, from {where}' if code else where
+        filename = frame.f_code.co_filename
+        if (
+            code is None
+            and filename.startswith(base_dir)
+            and 'site-packages' not in filename
+        ):
+            code = f'{filename[len(base_dir):]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return code or 'unknown'
+
+
+@dataclass
+class QueryReport:
+    label: str
+    budget: int = None
+    count: int = 0
+    shapes: Counter = field(default_factory=Counter)
+    locations: dict = field(default_factory=dict)
+    # The report of an enclosing check, which sees these queries too
+    outer: 'QueryReport' = field(default=None, repr=False)
+
+    def record(self, shape, location):
+        self.count += 1
+        self.shapes[shape] += 1
+        self.locations.setdefault(shape, Counter())[location] += 1
+
+    def repeated(self):
+        """(shape, times run, location) for each N+1, worst first"""
+        threshold = settings.QUERY_CHECK_REPEATS
+        return [
+            (shape, times, self.locations[shape].most_common(1)[0][0])
+            for shape, times in self.shapes.most_common()
+            if times >= threshold
+        ]
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    @property
+    def failed(self):
+        return self.over_budget or bool(self.repeated())
+
+    def __str__(self):
+        lines = [f'{self.label}: {self.count} queries']
+        if self.over_budget:
+            lines[0] += f', over its budget of {self.budget}'
+        for shape, times, location in self.repeated():
+            lines.append(f'  N+1: {times}x at {location}: {shape}')
+        return '\n'.join(lines)
+
+
+_report = ContextVar('game_ctrl_query_report', default=None)
+
+
+def _check_query(execute, sql, params, many, context):
+    report = _report.get()
+    if report is not None and DATA_STATEMENT_RE.match(sql):
+        shape, location = fingerprint(sql), _location()
+        while report is not None:
+            report.record(shape, location)
+            report = report.outer
+    return execute(sql, params, many, context)
+
+
+def install_query_check(connection, **kwargs):
+    if _check_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_check_query)
+
+
+@contextmanager
+def check_queries(budget=None, label='block'):
+    """Raise QueryCheckError if the block runs an N+1 or more than ``budget`` queries"""
+    connection_created.connect(install_query_check)
+    for connection in connections.all(initialized_only=True):
+        install_query_check(connection)
+    report = QueryReport(label, budget, outer=_report.get())
+    token = _report.set(report)
+    try:
+        yield report
+    finally:
+        _report.reset(token)
+    if report.failed:
+        raise QueryCheckError(report)
+
+
+class QueryCheckMiddleware:
+    """Check each request for N+1s and its view's query budget"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.mode = settings.QUERY_CHECK_MODE
+        if self.mode not in ('raise', 'log'):
+            raise MiddlewareNotUsed
+        connection_created.connect(install_query_check)
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.mode == 'raise' or random.random() < settings.QUERY_CHECK_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        # For connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_check(connection)
+        report = QueryReport(request.path, outer=_report.get())
+        token = _report.set(report)
+        try:
+            response = self.get_response(request)
+        finally:
+            _report.reset(token)
+        self.check(request, report)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        report = QueryReport(request.path, outer=_report.get())
+        token = _report.set(report)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _report.reset(token)
+        self.check(request, report)
+        return response
+
+    def check(self, request, report):
+        match = request.resolver_match
+        if match is not None:
+            report.label = f'{request.method} {request.path} ({match.view_name})'
+            report.budget = getattr(match.func, 'query_budget', None)
+        if not report.failed:
+            return
+        if self.mode == 'raise':
+            raise QueryCheckError(report)
+        logger.warning('Query check failed for %s', report)
@@ -0,0 +1,80 @@
+"""
+Query plan inspection for the plan regression tests.
+
+Runs EXPLAIN on captured SELECT statements and reports full table scans
+and sorts that are not served by an index. Small lookup tables are
+allowed to be scanned, since an index never pays off on them.
+"""
+import json
+import re
+
+from django.db import connection
+
+# Tables that stay small whatever the size of the catalog. django_session
+# is only ever read by primary key but holds a single row under test, so
+# the planner is free to scan it there.
+SMALL_TABLES = frozenset({
+    'products_category',
+    'products_facetcount',
+    'django_content_type',
+    'django_session',
+})
+
+SQLITE_TABLE_RE = re.compile(r'^(?:SCAN|SEARCH) (\w+)')
+
+
+def explain(sql):
+    """Return the plan for ``sql``: JSON on PostgreSQL, detail lines on SQLite"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _postgres_problems(node, allowed):
+    problems = []
+    relations = set()
+    for child in node.get('Plans', []):
+        child_problems, child_relations = _postgres_problems(child, allowed)
+        problems.extend(child_problems)
+        relations |= child_relations
+    relation = node.get('Relation Name')
+    if relation:
+        relations.add(relation)
+    if node['Node Type'] == 'Seq Scan' and relation not in allowed:
+        problems.append(f'sequential scan on {relation}')
+    if node['Node Type'] in ('Sort', 'Incremental Sort') and relations - allowed:
+        problems.append(f"sort on {', '.join(sorted(relations))}")
+    return problems, relations
+
+
+def _sqlite_problems(lines, allowed):
+    problems = []
+    tables = set()
+    for line in lines:
+        match = SQLITE_TABLE_RE.match(line)
+        if not match:
+            continue
+        table = match.group(1)
+        tables.add(table)
+        if line.startswith('SCAN') and 'USING' not in line and 'VIRTUAL TABLE' not in line:
+            if table not in allowed:
+                problems.append(f'full scan on {table}')
+    if any('TEMP B-TREE FOR ORDER BY' in line for line in lines) and tables - allowed:
+        problems.append(f"sort on {', '.join(sorted(tables))}")
+    return problems
+
+
+def plan_problems(sql, allowed=SMALL_TABLES):
+    """List the scans and sorts in ``sql``'s plan that an index should avoid"""
+    plan = explain(sql)
+    if connection.vendor == 'postgresql':
+        return _postgres_problems(plan[0]['Plan'], allowed)[0]
+    return _sqlite_problems(plan, allowed)
+
+
+def is_select(sql):
+    return sql.lstrip().upper().startswith('SELECT')
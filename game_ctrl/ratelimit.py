@@ -0,0 +1,283 @@
+"""
+Token bucket rate limits, declared per URLconf.
+
+An app lists its policies next to its URL patterns and wraps them once:
+
+    RATE_LIMITS = {'add_to_cart': Policy('10/m', methods=['POST'])}
+    urlpatterns = limit_patterns(app_name, RATE_LIMITS, [...])
+
+A policy of '10/m' gives each client a bucket of 10 tokens, or ``burst``
+if set, refilled at 10 a minute; each request takes one. Clients are
+users when logged in and IP addresses otherwise; behind a proxy such as
+nginx, the address comes from the header named by RATELIMIT_IP_HEADER,
+which the proxy must overwrite on every request. A request that finds
+the bucket empty gets rate_limit_view's 429 with a Retry-After.
+
+The buckets live in RATELIMIT_BACKEND:
+
+* RedisTokenBuckets, shared by every worker and pod. A Lua script
+  refills and takes in one atomic step, timed by the Redis clock, so
+  pods with skewed clocks agree;
+* MemoryTokenBuckets, in the process, for development and tests.
+
+Each process also mirrors the buckets it has seen, and rejects a client
+whose mirrored bucket is empty without a round trip to Redis. The mirror
+is set to Redis's count after every call and refills at the same rate,
+but only Redis is taken from, so the mirror never holds fewer tokens
+than the shared bucket: an empty mirror means an empty bucket. If Redis
+cannot be reached, requests are let through and counted as errors; an
+outage of the rate limiter should not take the cart down with it.
+
+Throttled requests are counted in game_ctrl_requests_throttled_total by
+policy and by which check refused them, 'local' or 'shared'.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+
+import redis
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .async_views import resolve_user
+from .metrics import RATE_LIMIT_ERRORS, THROTTLED, _child
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# Buckets the local mirror remembers; the least recently used go first
+LOCAL_BUCKETS = 10000
+
+# KEYS[1] bucket; ARGV capacity, tokens per second, tokens to take.
+# Returns {allowed, tokens left, seconds until enough tokens}.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local allowed, wait = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', string.format('%.6f', now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+
+class RateLimited(Exception):
+    """Passed to rate_limit_view when a client's bucket is empty"""
+
+    def __init__(self, policy, retry_after):
+        super().__init__(f'{policy.name}: retry after {retry_after:.1f}s')
+        self.policy = policy
+        self.retry_after = retry_after
+
+
+@dataclass
+class Policy:
+    """A rate such as '10/m' for each client, on ``methods`` or all of them"""
+    rate: str
+    methods: tuple = None
+    burst: int = None
+    name: str = ''
+
+    def __post_init__(self):
+        count, _, period = self.rate.partition('/')
+        if not count.isdigit() or period not in PERIODS:
+            raise ImproperlyConfigured(f'Rate {self.rate!r} is not like "10/m"')
+        self.capacity = self.burst or int(count)
+        self.per_second = int(count) / PERIODS[period]
+        if self.methods is not None:
+            self.methods = frozenset(method.upper() for method in self.methods)
+
+    def applies(self, request):
+        return self.methods is None or request.method in self.methods
+
+
+def client_ip(request):
+    """The client's address: from RATELIMIT_IP_HEADER behind a trusted proxy"""
+    header = settings.RATELIMIT_IP_HEADER
+    if header:
+        address = request.META.get(header, '').strip()
+        if address:
+            return address
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    """The user if logged in, else the IP address"""
+    user = request.user
+    if user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+class RedisTokenBuckets:
+    """Buckets as Redis hashes, taken from atomically by TOKEN_BUCKET"""
+
+    def __init__(self, client=None, prefix='ratelimit'):
+        self.client = client or redis.Redis.from_url(
+            settings.RATELIMIT_REDIS_URL,
+            socket_timeout=settings.RATELIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.RATELIMIT_REDIS_TIMEOUT,
+        )
+        self.prefix = prefix
+        self.script = self.client.register_script(TOKEN_BUCKET)
+
+    def take(self, key, capacity, per_second):
+        """(allowed, tokens left, seconds to wait) for one token from ``key``"""
+        allowed, tokens, wait = self.script(
+            keys=[f'{self.prefix}:{key}'], args=[capacity, per_second, 1],
+        )
+        return bool(allowed), float(tokens), float(wait)
+
+
+class MemoryTokenBuckets:
+    """Buckets in this process only: per worker, so for development and tests"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, per_second):
+        now = time.monotonic()
+        with self.lock:
+            tokens, at = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - at) * per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+        return allowed, tokens, 0.0 if allowed else (1 - tokens) / per_second
+
+
+class LocalMirror:
+    """This process's view of the shared buckets, never emptier than they are"""
+
+    def __init__(self, size=LOCAL_BUCKETS):
+        self.size = size
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def wait(self, key, capacity, per_second):
+        """Seconds until the mirrored bucket has a token; 0 if unknown or has one"""
+        with self.lock:
+            state = self.buckets.get(key)
+        if state is None:
+            return 0.0
+        tokens, at = state
+        tokens = min(capacity, tokens + (time.monotonic() - at) * per_second)
+        return 0.0 if tokens >= 1 else (1 - tokens) / per_second
+
+    def update(self, key, tokens):
+        with self.lock:
+            self.buckets[key] = (tokens, time.monotonic())
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.size:
+                self.buckets.popitem(last=False)
+
+
+class Limiter:
+    """The local pre-check in front of the shared buckets"""
+
+    def __init__(self, buckets=None, mirror=None):
+        self.buckets = buckets or import_string(settings.RATELIMIT_BACKEND)()
+        self.mirror = mirror or LocalMirror()
+
+    def precheck(self, policy, key):
+        """Seconds to wait by the local mirror alone, without a round trip"""
+        wait = self.mirror.wait(key, policy.capacity, policy.per_second)
+        if wait:
+            _child(THROTTLED, policy.name, 'local').inc()
+        return wait
+
+    def take(self, policy, key):
+        """Seconds to wait by the shared bucket; 0 if the request may go ahead"""
+        try:
+            allowed, tokens, wait = self.buckets.take(key, policy.capacity, policy.per_second)
+        except redis.RedisError:
+            logger.warning('Rate limit %s not checked', policy.name, exc_info=True)
+            _child(RATE_LIMIT_ERRORS, policy.name).inc()
+            return 0.0
+        self.mirror.update(key, tokens)
+        if allowed:
+            return 0.0
+        _child(THROTTLED, policy.name, 'shared').inc()
+        return max(wait, 0.001)
+
+
+_limiters = {}
+
+
+def get_limiter():
+    """The limiter for the configured backend, created once per backend path"""
+    path = settings.RATELIMIT_BACKEND
+    if path not in _limiters:
+        _limiters[path] = Limiter()
+    return _limiters[path]
+
+
+def _refused(request, policy, wait):
+    view = import_string(settings.RATELIMIT_VIEW)
+    return view(request, RateLimited(policy, wait))
+
+
+def rate_limit(policy):
+    """Wrap a view, sync or async, in ``policy``"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _wrapped(request, *args, **kwargs):
+                # client_key() and async views read request.user
+                await resolve_user(request)
+                if settings.RATELIMIT_ENABLE and policy.applies(request):
+                    limiter, key = get_limiter(), f'{policy.name}:{client_key(request)}'
+                    wait = limiter.precheck(policy, key) or await sync_to_async(
+                        limiter.take, thread_sensitive=False,
+                    )(policy, key)
+                    if wait:
+                        return _refused(request, policy, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def _wrapped(request, *args, **kwargs):
+                if settings.RATELIMIT_ENABLE and policy.applies(request):
+                    limiter, key = get_limiter(), f'{policy.name}:{client_key(request)}'
+                    wait = limiter.precheck(policy, key) or limiter.take(policy, key)
+                    if wait:
+                        return _refused(request, policy, wait)
+                return view(request, *args, **kwargs)
+        _wrapped.rate_limit = policy
+        return _wrapped
+    return decorator
+
+
+def limit_patterns(namespace, policies, urlpatterns):
+    """Apply ``policies``, keyed by URL name, to the views of ``urlpatterns``"""
+    names = {pattern.name for pattern in urlpatterns}
+    unknown = set(policies) - names
+    if unknown:
+        raise ImproperlyConfigured(f'Rate limits for unknown URLs: {", ".join(sorted(unknown))}')
+    for pattern in urlpatterns:
+        policy = policies.get(pattern.name)
+        if policy is not None:
+            policy.name = f'{namespace}:{pattern.name}'
+            pattern.callback = rate_limit(policy)(pattern.callback)
+    return urlpatterns
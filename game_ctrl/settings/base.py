@@ -36,8 +36,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game_ctrl.log.RequestContextMiddleware',
+    'game_ctrl.metrics.MetricsMiddleware',
+    'game_ctrl.profiling.ProfilingMiddleware',
+    'game_ctrl.query_check.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'game_ctrl.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,12 +66,14 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart_badge',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'game_ctrl.wsgi.application'
+ASGI_APPLICATION = 'game_ctrl.asgi.application'
 
 # Default database
 DATABASES = {
@@ -136,3 +142,69 @@ LOGIN_REDIRECT_URL = '/'
 
 # Cart settings
 CART_SESSION_ID = 'cart'
+
+# Cart storage backend: cart.store.DatabaseCartStore, or
+# cart.store.RedisCartStore with the flush_carts worker running
+CART_STORE = os.getenv('CART_STORE', 'cart.store.DatabaseCartStore')
+CART_REDIS_URL = os.getenv('CART_REDIS_URL', 'redis://localhost:6379/2')
+# Idle carts leave Redis after this many seconds and reload from the database
+CART_REDIS_TTL = 60 * 60 * 24 * 7
+# Navbar cart badge cache (seconds); invalidated early by the cart views
+CART_BADGE_CACHE_TIMEOUT = 60 * 5
+
+# Anonymous catalog page cache (seconds); invalidated early by catalog edits
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 15
+
+# Controllers per page on category listings
+CATALOG_PAGE_SIZE = 24
+
+# Maximum results shown by the storefront search
+SEARCH_RESULTS_LIMIT = 50
+
+# Widths (px) of the resized variants generated for controller images
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 960, 1280)
+
+# Baseline written and checked by the benchmark_views command
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Request profiling (game_ctrl.profiling): requests carrying a signed
+# X-Profile header, plus this fraction of all requests, are profiled
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_STORE = os.getenv('PROFILING_STORE', 'game_ctrl.profiling.FileProfileStore')
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_REDIS_URL = os.getenv('PROFILING_REDIS_URL', 'redis://localhost:6379/3')
+# Profiles kept; older ones are dropped as new ones arrive
+PROFILING_KEEP = 200
+# Seconds an X-Profile token from the admin page stays valid
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# N+1 and query budget checks (game_ctrl.query_check): 'raise' in tests,
+# 'log' in staging for this share of requests, 'off' in production
+QUERY_CHECK_MODE = os.getenv('QUERY_CHECK_MODE', 'off')
+QUERY_CHECK_SAMPLE_RATE = float(os.getenv('QUERY_CHECK_SAMPLE_RATE', '0.1'))
+# Runs of one query shape within a request that count as an N+1
+QUERY_CHECK_REPEATS = 3
+
+# Share of each logger's records below WARNING that production logging
+# keeps (game_ctrl.log.SamplingFilter); loggers not listed keep them all
+LOG_SAMPLE_RATES = {
+    'game_ctrl.cart': 0.1,
+}
+
+# Token bucket rate limits (game_ctrl.ratelimit), declared in URLconfs.
+# RedisTokenBuckets shares the buckets between all workers and pods;
+# game_ctrl.ratelimit.MemoryTokenBuckets keeps them in each process
+RATELIMIT_ENABLE = os.getenv('RATELIMIT_ENABLE', 'True') == 'True'
+RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'game_ctrl.ratelimit.RedisTokenBuckets')
+RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL', 'redis://localhost:6379/4')
+# Seconds to wait on Redis before letting the request through unchecked
+RATELIMIT_REDIS_TIMEOUT = 0.1
+# META key of the header a trusted proxy puts the client address in,
+# such as 'HTTP_X_REAL_IP'; unset, visitors are keyed on REMOTE_ADDR
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER', '')
+# Renders the 429 for a refused request
+RATELIMIT_VIEW = 'game_ctrl.views.rate_limit_view'
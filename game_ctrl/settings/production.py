@@ -107,35 +107,57 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
         'LOCATION': os.getenv('REDIS_URL', 'redis://redis:6379/1'),
-        'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-        }
     }
 }
 
-# Logging Configuration
+# Profiles are shared by all pods so the admin sees every one of them
+PROFILING_STORE = os.getenv('PROFILING_STORE', 'game_ctrl.profiling.RedisProfileStore')
+PROFILING_REDIS_URL = os.getenv('PROFILING_REDIS_URL', 'redis://redis:6379/3')
+
+CART_REDIS_URL = os.getenv('CART_REDIS_URL', 'redis://redis:6379/2')
+
+RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL', 'redis://redis:6379/4')
+# nginx overwrites X-Real-IP with the address it was connected from
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER', 'HTTP_X_REAL_IP')
+
+# Prometheus scrapes /metrics with this bearer token; without one it is refused
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+if not METRICS_TOKEN:
+    raise RuntimeError("METRICS_TOKEN is missing!")
+
+# Logging Configuration: JSON lines written by a background thread, see
+# game_ctrl.log. Each worker process writes its own file.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {
+            '()': 'game_ctrl.log.RequestContextFilter',
+        },
+        'sampling': {
+            '()': 'game_ctrl.log.SamplingFilter',
+        },
+    },
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'game_ctrl.log.JsonFormatter',
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
-        },
-        'file': {
-            'class': 'logging.FileHandler',
-            'filename': '/var/log/django/game_ctrl.log',
-            'formatter': 'verbose',
+        'background': {
+            '()': 'game_ctrl.log.BackgroundHandler',
+            'stream': 'ext://sys.stdout',
+            'filename': '/var/log/django/game_ctrl.{pid}.log',
+            'max_bytes': 1024 * 1024 * 50,
+            'when': 'midnight',
+            'backup_count': 14,
+            'queue_size': 10000,
+            'formatter': 'json',
+            'filters': ['request_context', 'sampling'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['background'],
         'level': 'INFO',
     },
 }
@@ -170,8 +192,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game_ctrl.log.RequestContextMiddleware',
+    'game_ctrl.metrics.MetricsMiddleware',
+    'game_ctrl.profiling.ProfilingMiddleware',
+    'game_ctrl.query_check.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Make sure this is second
+    'game_ctrl.middleware.StaticFilesMiddleware',  # Make sure this is second
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -191,6 +217,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart_badge',
             ],
             'loaders': [
                 ('django.template.loaders.cached.Loader', [
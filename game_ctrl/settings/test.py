@@ -33,6 +33,7 @@ TEMPLATES = [{
             'django.template.context_processors.request',
             'django.contrib.auth.context_processors.auth',
             'django.contrib.messages.context_processors.messages',
+            'cart.context_processors.cart_badge',
         ],
         'debug': True,
     },
@@ -130,4 +131,8 @@ LOGOUT_REDIRECT_URL = '/'
 MIDDLEWARE = [
     middleware for middleware in MIDDLEWARE
     if middleware != 'django.middleware.csrf.CsrfViewMiddleware'
-] 
\ No newline at end of file
+] 
+# Fail any test request that runs an N+1 or goes over its view's budget
+QUERY_CHECK_MODE = 'raise'
+# Rate limit buckets in the process; each test starts with full ones
+RATELIMIT_BACKEND = 'game_ctrl.ratelimit.MemoryTokenBuckets'
@@ -0,0 +1,62 @@
+import json
+import pytest
+from game_ctrl.benchmarks import compare, percentile, report, run_benchmarks, save_baseline
+from products.synthetic import DatasetSpec, generate_dataset
+
+BASELINE = {'views': {'home': {
+    'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 3, 'memory_kb': 100.0,
+}}}
+
+
+class TestBenchmarkComparison:
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 99) == 99
+        assert percentile([5.0], 95) == 5.0
+
+    def test_within_tolerance(self):
+        """Test metrics inside their tolerance pass"""
+        current = {'home': {'p50_ms': 12.0, 'p95_ms': 26.0, 'p99_ms': 44.0, 'queries': 3, 'memory_kb': 120.0}}
+        assert compare(current, BASELINE).regressions == []
+
+    def test_regressions_reported(self):
+        """Test slower timings and extra queries are reported"""
+        current = {'home': {'p50_ms': 13.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 4, 'memory_kb': 90.0}}
+        regressions = compare(current, BASELINE).regressions
+        assert [(r.view, r.metric) for r in regressions] == [('home', 'p50_ms'), ('home', 'queries')]
+
+    def test_tolerance_override(self):
+        """Test tolerances can be loosened per metric"""
+        current = {'home': {'p50_ms': 13.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 4, 'memory_kb': 90.0}}
+        comparison = compare(current, BASELINE, {'p50_ms': 0.5, 'queries': 1})
+        assert comparison.regressions == []
+
+    def test_missing_views(self):
+        """Test views without a baseline are listed, not failed"""
+        comparison = compare({'cart_detail': BASELINE['views']['home']}, BASELINE)
+        assert comparison.missing == ['cart_detail']
+        assert comparison.regressions == []
+
+
+@pytest.mark.django_db
+class TestRunBenchmarks:
+    def test_runs_every_view(self, tmp_path):
+        """Test each view is measured and the baseline round-trips"""
+        generate_dataset(DatasetSpec(seed=3, categories=3, controllers=60, users=20, batch_size=20))
+
+        results = run_benchmarks(iterations=3, warmup=1)
+
+        assert set(results) == {
+            'home', 'category_detail', 'controller_detail',
+            'cart_detail', 'add_to_cart', 'update_cart',
+        }
+        for metrics in results.values():
+            assert metrics['p50_ms'] <= metrics['p95_ms'] <= metrics['p99_ms']
+            assert metrics['queries'] > 0
+            assert metrics['memory_kb'] > 0
+
+        path = tmp_path / 'baseline.json'
+        save_baseline(path, report(results))
+        assert compare(results, json.loads(path.read_text())).regressions == []
@@ -0,0 +1,64 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from game_ctrl.loadtest import LoadResult, compare_throughput, run_load
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 404 if self.path.endswith('/missing/') else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestLoadTest:
+    def test_run_load(self, server):
+        """Test every client issues requests and failures are counted, not timed"""
+        result = run_load('local', server, ['/', '/missing/'], concurrency=4, duration=0.3)
+        summary = result.summary()
+        assert summary['requests'] > 8
+        assert 0 < summary['errors'] < summary['requests']
+        assert summary['rps'] > 0
+        assert summary['p50_ms'] <= summary['p99_ms']
+
+    def test_compare_throughput(self):
+        """Test throughput is reported relative to the first target"""
+        results = [
+            LoadResult('wsgi', 2.0, [1.0] * 100),
+            LoadResult('asgi', 2.0, [1.0] * 250),
+        ]
+        assert compare_throughput(results) == {'wsgi': 1.0, 'asgi': 2.5}
+        assert LoadResult('down', 1.0, errors=3).summary()['p95_ms'] is None
+
+    def test_command(self, server):
+        """Test benchmark_concurrency loads each target and prints JSON"""
+        out = StringIO()
+        call_command(
+            'benchmark_concurrency', '--target', f'a={server}', '--target', f'b={server}',
+            paths=['/'], concurrency=2, duration=0.2, json=True, stdout=out,
+        )
+        results = json.loads(out.getvalue())
+        assert set(results) == {'a', 'b'}
+        assert results['a']['relative_rps'] == 1.0
+        assert results['b']['errors'] == 0
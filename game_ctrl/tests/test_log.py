@@ -0,0 +1,145 @@
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from products.models import Category, Controller
+from game_ctrl.log import (
+    BackgroundHandler, CompressedRotatingFileHandler, JsonFormatter,
+    RequestContextFilter, SamplingFilter,
+)
+
+
+class BlockedStream(io.StringIO):
+    """A stream whose writes wait until released, like a stalled disk"""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def write(self, text):
+        self.released.wait(5)
+        return super().write(text)
+
+
+@pytest.fixture
+def capture():
+    """Records of game_ctrl.cart as JSON, through the production handler"""
+    stream = io.StringIO()
+    handler = BackgroundHandler(stream=stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger('game_ctrl.cart')
+    logger.addHandler(handler)
+
+    def records():
+        handler.close()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+    yield records
+    logger.removeHandler(handler)
+    handler.close()
+
+
+@pytest.mark.django_db
+class TestRequestLogging:
+    def test_records_carry_request_and_user(self, capture, settings):
+        """Test cart logs name the request and the sanitised user without call sites passing them"""
+        settings.ALLOWED_HOSTS = ['testserver']
+        user = get_user_model().objects.create_user(username='shop<per>\n', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+        client = Client()
+        client.force_login(user)
+
+        response = client.post(
+            reverse('cart:add_to_cart'), {'controller_id': controller.pk, 'quantity': 2},
+            HTTP_REFERER='http://testserver/', HTTP_X_REQUEST_ID='req-123',
+        )
+
+        assert response['X-Request-ID'] == 'req-123'
+        [record] = capture()
+        assert record['message'] == f'Item added to cart: controller={controller.pk}, quantity=2'
+        assert (record['request_id'], record['user_id'], record['user']) == ('req-123', user.pk, 'shopper')
+        assert record['level'] == 'INFO'
+
+
+class TestLogPipeline:
+    def test_sampling(self):
+        """Test a logger's records below WARNING are sampled and warnings always kept"""
+        sampling = SamplingFilter({'game_ctrl.cart': 0.25, 'game_ctrl': 0.0})
+
+        def record(name, level):
+            return logging.makeLogRecord({'name': name, 'levelno': level})
+
+        with patch('game_ctrl.log.random.random', return_value=0.2):
+            kept = record('game_ctrl.cart.views', logging.INFO)
+            assert sampling.filter(kept) and kept.sample_rate == 0.25
+        with patch('game_ctrl.log.random.random', return_value=0.3):
+            assert not sampling.filter(record('game_ctrl.cart', logging.INFO))
+        assert not sampling.filter(record('game_ctrl.metrics', logging.INFO))
+        assert sampling.filter(record('game_ctrl.metrics', logging.WARNING))
+        assert sampling.filter(record('django.request', logging.INFO))
+
+    def test_json_records(self):
+        """Test records keep their arguments as logged, extra fields and tracebacks"""
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream=stream)
+        handler.setFormatter(JsonFormatter())
+        logger = logging.Logger('game_ctrl.test')
+        logger.addHandler(handler)
+        lines = [1]
+        logger.info('lines=%s', lines, extra={'order': 7})
+        lines.append(2)
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            logger.exception('failed')
+        handler.close()
+
+        first, second = (json.loads(line) for line in stream.getvalue().splitlines())
+        assert (first['message'], first['order']) == ('lines=[1]', 7)
+        assert second['exception'].endswith('ValueError: bad')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test a stalled writer makes new records drop rather than wait"""
+        stream = BlockedStream()
+        handler = BackgroundHandler(stream=stream, queue_size=1)
+        logger = logging.Logger('game_ctrl.test')
+        logger.addHandler(handler)
+        before = REGISTRY.get_sample_value('game_ctrl_log_records_dropped_total') or 0
+
+        for n in range(5):
+            logger.warning('record %s', n)
+
+        assert REGISTRY.get_sample_value('game_ctrl_log_records_dropped_total') - before >= 3
+        stream.released.set()
+        handler.close()
+        assert 'record 0' in stream.getvalue()
+
+    def test_rotation(self, tmp_path):
+        """Test the file rotates by size into gzip files, keeping the newest"""
+        handler = CompressedRotatingFileHandler(
+            str(tmp_path / 'app.{pid}.log'), max_bytes=200, backup_count=2,
+        )
+        logger = logging.Logger('game_ctrl.test')
+        logger.addHandler(handler)
+        for n in range(40):
+            logger.warning('record %s %s', n, 'x' * 50)
+        handler.close()
+
+        current = f'app.{os.getpid()}.log'
+        rotated = sorted(name for name in os.listdir(tmp_path) if name != current)
+        assert len(rotated) == 2
+        assert all(name.startswith(current + '.') and name.endswith('.gz') for name in rotated)
+        with gzip.open(tmp_path / rotated[-1], 'rt') as f:
+            assert 'record' in f.read()
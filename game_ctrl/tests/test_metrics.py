@@ -0,0 +1,126 @@
+import subprocess
+import sys
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from products.models import Category, Controller
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'metrics-tests',
+    }
+}
+
+WORKER = """
+from game_ctrl.metrics import record_cart_mutation
+for _ in range({n}):
+    record_cart_mutation('add')
+"""
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CACHES = LOCMEM_CACHES
+        settings.ALLOWED_HOSTS = ['testserver']
+        cache.clear()
+        self.client = Client()
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+        yield
+        cache.clear()
+
+    def test_requests_are_recorded_by_view(self):
+        """Test latency, status and SQL use are recorded under the view's name"""
+        view = 'products:controller_detail'
+        before = (
+            sample('game_ctrl_request_duration_seconds_count', view=view, method='GET'),
+            sample('game_ctrl_responses_total', view=view, method='GET', status='200'),
+            sample('game_ctrl_db_queries_per_request_sum', view=view),
+        )
+        self.client.get(reverse(view, kwargs={'id': self.controller.pk}))
+        self.client.get('/no-such-page/')
+
+        after = (
+            sample('game_ctrl_request_duration_seconds_count', view=view, method='GET'),
+            sample('game_ctrl_responses_total', view=view, method='GET', status='200'),
+            sample('game_ctrl_db_queries_per_request_sum', view=view),
+        )
+        assert after[0] - before[0] == 1
+        assert after[1] - before[1] == 1
+        assert after[2] - before[2] >= 1
+        assert sample('game_ctrl_responses_total', view='unresolved', method='GET', status='404') >= 1
+
+    def test_cache_hits_and_misses(self):
+        """Test the catalog page cache counts a miss, then a hit"""
+        url = reverse('products:controller_detail', kwargs={'id': self.controller.pk})
+        hits = sample('game_ctrl_cache_requests_total', cache='catalog_page', result='hit')
+        misses = sample('game_ctrl_cache_requests_total', cache='catalog_page', result='miss')
+        self.client.get(url)
+        self.client.get(url)
+        assert sample('game_ctrl_cache_requests_total', cache='catalog_page', result='miss') - misses == 1
+        assert sample('game_ctrl_cache_requests_total', cache='catalog_page', result='hit') - hits == 1
+
+    def test_cart_mutations(self):
+        """Test cart views and the login merge count their mutations"""
+        user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        adds = sample('game_ctrl_cart_mutations_total', action='add')
+        merges = sample('game_ctrl_cart_mutations_total', action='merge')
+        self.client.post(
+            reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 1},
+            HTTP_REFERER='http://testserver/',
+        )
+        self.client.force_login(user)
+        assert sample('game_ctrl_cart_mutations_total', action='add') - adds == 1
+        assert sample('game_ctrl_cart_mutations_total', action='merge') - merges == 1
+
+    def test_metrics_endpoint(self, settings):
+        """Test /metrics serves the exposition format, behind the token unless DEBUG"""
+        settings.DEBUG = False
+        assert self.client.get('/metrics').status_code == 403
+
+        settings.DEBUG = True
+        response = self.client.get('/metrics')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        assert b'game_ctrl_request_duration_seconds_bucket' in response.content
+
+        settings.METRICS_TOKEN = 'secret'
+        assert self.client.get('/metrics').status_code == 403
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize('token', ['', 'secret'])
+    def test_production_requires_token(self, token):
+        """Test production settings refuse to load without METRICS_TOKEN"""
+        env = {'DJANGO_SECRET_KEY': 'x', 'METRICS_TOKEN': token, 'PATH': ''}
+        result = subprocess.run(
+            [sys.executable, '-c', 'import game_ctrl.settings.production'],
+            env=env, capture_output=True, text=True,
+        )
+        assert (result.returncode == 0) == bool(token)
+        assert ('METRICS_TOKEN is missing' in result.stderr) != bool(token)
+
+    def test_workers_are_aggregated(self, settings, tmp_path, monkeypatch):
+        """Test the scrape sums the values every worker process wrote"""
+        env = {'PROMETHEUS_MULTIPROC_DIR': str(tmp_path), 'PATH': ''}
+        for n in (2, 3):
+            subprocess.run([sys.executable, '-c', WORKER.format(n=n)], env=env, check=True)
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+        settings.METRICS_TOKEN = 'secret'
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+        assert b'game_ctrl_cart_mutations_total{action="add"} 5.0' in response.content
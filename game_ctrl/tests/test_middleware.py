@@ -1,6 +1,10 @@
-from django.test import RequestFactory, SimpleTestCase
+import os
+import shutil
+import tempfile
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.test import RequestFactory, SimpleTestCase, override_settings
 from django.http import HttpResponse
-from game_ctrl.middleware import ErrorHandlingMiddleware
+from game_ctrl.middleware import ErrorHandlingMiddleware, StaticFilesMiddleware
 from unittest.mock import patch
 
 class TestErrorHandlingMiddleware(SimpleTestCase):
@@ -38,4 +42,39 @@ class TestErrorHandlingMiddleware(SimpleTestCase):
         
         assert "500" in content
         assert "Server Error" in content
-        assert "Something went wrong" in content 
\ No newline at end of file
+        assert "Something went wrong" in content 
+
+class TestStaticFilesMiddleware(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with open(os.path.join(root, 'site.css'), 'w') as f:
+            f.write('body {}')
+        settings_override = override_settings(
+            STATIC_ROOT=root, WHITENOISE_AUTOREFRESH=False, WHITENOISE_USE_FINDERS=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_async_stack(self):
+        """Test the middleware runs natively in an async stack"""
+        async def get_response(request):
+            return HttpResponse('page')
+
+        middleware = StaticFilesMiddleware(get_response)
+        assert iscoroutinefunction(middleware)
+        response = async_to_sync(middleware)(self.factory.get('/'))
+        assert response.content == b'page'
+        response = async_to_sync(middleware)(self.factory.get('/static/site.css'))
+        assert b''.join(response.streaming_content) == b'body {}'
+        response.file_to_stream.close()
+
+    def test_sync_stack(self):
+        """Test the middleware still works in a sync stack"""
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse('page'))
+        assert not iscoroutinefunction(middleware)
+        assert middleware(self.factory.get('/')).content == b'page'
+        response = middleware(self.factory.get('/static/site.css'))
+        assert response.status_code == 200
+        response.file_to_stream.close()
@@ -0,0 +1,115 @@
+import marshal
+import pytest
+from asgiref.sync import async_to_sync
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from products.models import Category, Controller
+from game_ctrl import profiling
+from game_ctrl.profiling import FileProfileStore, ProfilingMiddleware, diff_profiles, profile_token
+
+FILE_STORE = 'game_ctrl.profiling.FileProfileStore'
+
+
+def profile(profile_id, functions, queries, duration_ms=10.0):
+    return {
+        'id': profile_id, 'method': 'GET', 'path': '/', 'duration_ms': duration_ms,
+        'query_count': len(queries), 'query_ms': 1.0,
+        'functions': [{'function': name, 'cumulative_ms': ms} for name, ms in functions.items()],
+        'queries': [{'sql': sql, 'ms': 0.5} for sql in queries],
+    }
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path, monkeypatch):
+        settings.PROFILING_ENABLED = True
+        settings.PROFILING_SAMPLE_RATE = 0
+        settings.PROFILING_STORE = FILE_STORE
+        settings.ALLOWED_HOSTS = ['testserver']
+        self.store = FileProfileStore(directory=str(tmp_path), keep=3)
+        monkeypatch.setitem(profiling._stores, FILE_STORE, self.store)
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+        self.url = reverse('products:controller_detail', kwargs={'id': self.controller.pk})
+
+    def test_disabled_middleware_is_dropped(self, settings):
+        """Test the middleware leaves the stack when profiling is off"""
+        settings.PROFILING_ENABLED = False
+        with pytest.raises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_signed_header_profiles_request(self):
+        """Test a signed header records the call profile and every SQL statement"""
+        Client().get(self.url)
+        Client().get(self.url, HTTP_X_PROFILE='forged')
+        assert self.store.list() == []
+
+        Client().get(self.url, HTTP_X_PROFILE=profile_token())
+
+        [saved] = self.store.list()
+        assert (saved['view'], saved['status'], saved['trigger']) == ('products:controller_detail', 200, 'header')
+        assert saved['query_count'] == len(saved['queries']) >= 1
+        assert any('products_controller' in query['sql'] for query in saved['queries'])
+        assert marshal.loads(self.store.stats(saved['id']))
+
+        Client().get(reverse('products:category_detail', args=['test-category']), HTTP_X_PROFILE=profile_token())
+        assert any('category_detail' in row['function'] for row in self.store.list()[0]['functions'])
+
+    def test_sample_rate(self, settings):
+        """Test every request is profiled at a sample rate of 1"""
+        settings.PROFILING_SAMPLE_RATE = 1.0
+        client = Client()
+        client.get(self.url)
+        client.get(self.url)
+        assert [saved['trigger'] for saved in self.store.list()] == ['sample', 'sample']
+
+    def test_async_request(self):
+        """Test requests through the ASGI handler are profiled too"""
+        async_to_sync(AsyncClient().get)(self.url, headers={'x-profile': profile_token()})
+        [saved] = self.store.list()
+        assert saved['status'] == 200
+        assert saved['query_count'] >= 1
+
+    def test_store_keeps_newest(self):
+        """Test the store drops the oldest profiles beyond its size"""
+        ids = [f'20260101T0000000000{n:02d}-abcd' for n in range(5)]
+        for profile_id in ids:
+            self.store.save(profile(profile_id, {}, []), b'stats')
+        assert [saved['id'] for saved in self.store.list()] == ids[:-4:-1]
+        assert self.store.stats(ids[0]) is None
+
+    def test_diff(self):
+        """Test the diff ranks functions and statements by how much they changed"""
+        a = profile('a', {'view': 10.0, 'render': 5.0}, ['SELECT 1'])
+        b = profile('b', {'view': 30.0, 'query': 1.0}, ['SELECT 1', 'SELECT 2', 'SELECT 2'], duration_ms=25.0)
+        diff = diff_profiles(a, b)
+        assert diff['duration_ms'] == 15.0
+        assert diff['query_count'] == 2
+        assert [row['function'] for row in diff['functions']] == ['view', 'render', 'query']
+        assert diff['queries'] == [{'sql': 'SELECT 2', 'a': 0, 'b': 2, 'delta': 2}]
+
+    def test_admin_pages(self):
+        """Test staff can browse, diff and download profiles; others cannot"""
+        Client().get(self.url, HTTP_X_PROFILE=profile_token())
+        Client().get('/', HTTP_X_PROFILE=profile_token())
+        first, second = (saved['id'] for saved in self.store.list())
+
+        client = Client()
+        assert client.get(reverse('profile_list')).status_code == 302
+        staff = get_user_model().objects.create_user(username='staff', password='testpass123', is_staff=True)
+        client.force_login(staff)
+
+        response = client.get(reverse('profile_list'))
+        assert response.status_code == 200
+        assert self.url.encode() in response.content
+        assert client.get(reverse('profile_detail', args=[first])).status_code == 200
+        assert client.get(reverse('profile_diff'), {'a': first, 'b': second}).status_code == 200
+        response = client.get(reverse('profile_download', args=[first]))
+        assert response['Content-Disposition'] == f'attachment; filename="{first}.prof"'
+        assert client.get(reverse('profile_detail', args=['..'])).status_code == 404
@@ -0,0 +1,93 @@
+import logging
+import pytest
+from asgiref.sync import async_to_sync
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.template.loader import render_to_string
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from products.models import Category, Controller
+from products.views import category_detail, controller_detail
+from cart.models import Cart, CartItem
+from game_ctrl.query_check import QueryCheckError, fingerprint
+
+
+@pytest.mark.django_db
+class TestQueryCheck:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.ALLOWED_HOSTS = ['testserver']
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controllers = [
+            Controller.objects.create(name=f'Pad {i}', description='Test', category=category, price=Decimal('50.00'))
+            for i in range(4)
+        ]
+        cart = Cart.objects.create(user=self.user)
+        for controller in self.controllers:
+            CartItem.objects.create(cart=cart, controller=controller, quantity=1, unit_price=controller.price)
+
+    def test_fingerprint(self):
+        """Test queries differing only in values share a shape"""
+        assert fingerprint('SELECT * FROM t WHERE id = 1 AND name = \'a\'') == fingerprint(
+            'SELECT  *  FROM t WHERE id = 42 AND name = \'b\'\n'
+        )
+        assert fingerprint('SELECT * FROM t WHERE id IN (%s, %s)') == 'SELECT * FROM t WHERE id IN (...)'
+        assert fingerprint('SELECT * FROM t WHERE id = %s') != fingerprint('SELECT * FROM u WHERE id = %s')
+
+    def test_n_plus_one_in_code(self, query_check):
+        """Test a lazy relation read in a loop is flagged at the line that reads it"""
+        with pytest.raises(QueryCheckError) as error:
+            with query_check():
+                names = [item.controller.name for item in CartItem.objects.all()]
+        assert len(names) == 4
+        [(shape, times, location)] = error.value.report.repeated()
+        assert times == 4
+        assert '"products_controller"' in shape
+        assert location.startswith('game_ctrl/tests/test_query_check.py:')
+
+        with query_check(budget=2) as report:
+            names = [item.controller.name for item in CartItem.objects.select_related('controller')]
+        assert report.count == 1
+
+    def test_n_plus_one_in_template(self, query_check):
+        """Test a lazy relation read by a template names the template line"""
+        with pytest.raises(QueryCheckError) as error:
+            with query_check():
+                render_to_string('cart/detail.html', {'cart_items': CartItem.objects.all()})
+        [(shape, times, location)] = error.value.report.repeated()
+        assert location == 'cart/detail.html:8'
+
+    def test_budget(self, query_check):
+        """Test a block over its budget fails even without repeats"""
+        with pytest.raises(QueryCheckError, match='over its budget of 1'):
+            with query_check(budget=1):
+                Cart.objects.count()
+                CartItem.objects.count()
+
+    def test_middleware_raises(self, query_check, monkeypatch):
+        """Test requests over their view's budget raise in tests, sync or async"""
+        client = Client()
+        url = reverse('products:category_detail', args=['test-category'])
+        with query_check() as report:
+            client.get(url)
+        assert 0 < report.count <= category_detail.query_budget
+
+        monkeypatch.setattr(category_detail, 'query_budget', 0)
+        with pytest.raises(QueryCheckError, match='products:category_detail'):
+            client.get(url)
+        monkeypatch.setattr(controller_detail, 'query_budget', 0)
+        with pytest.raises(QueryCheckError, match='products:controller_detail'):
+            async_to_sync(AsyncClient().get)(
+                reverse('products:controller_detail', kwargs={'id': self.controllers[0].pk}),
+            )
+
+    def test_middleware_logs(self, settings, monkeypatch, caplog):
+        """Test the log mode reports failures without failing the request"""
+        settings.QUERY_CHECK_MODE = 'log'
+        settings.QUERY_CHECK_SAMPLE_RATE = 1.0
+        monkeypatch.setattr(category_detail, 'query_budget', 0)
+        with caplog.at_level(logging.WARNING, logger='game_ctrl.query_check'):
+            response = Client().get(reverse('products:category_detail', args=['test-category']))
+        assert response.status_code == 200
+        assert 'over its budget of 0' in caplog.text
@@ -0,0 +1,171 @@
+import os
+import time
+import fakeredis
+import pytest
+import redis
+from decimal import Decimal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client
+from django.urls import path, reverse
+from prometheus_client import REGISTRY
+from products.models import Category, Controller
+from game_ctrl import ratelimit
+from game_ctrl.ratelimit import Limiter, MemoryTokenBuckets, Policy, RedisTokenBuckets, limit_patterns
+
+MEMORY_BACKEND = 'game_ctrl.ratelimit.MemoryTokenBuckets'
+
+
+class FailingBuckets:
+    def take(self, key, capacity, per_second):
+        raise redis.ConnectionError('Redis is down')
+
+
+def throttled(policy, check):
+    return REGISTRY.get_sample_value(
+        'game_ctrl_requests_throttled_total', {'policy': policy, 'check': check},
+    ) or 0
+
+
+@pytest.fixture
+def redis_client():
+    """A real Redis when RATELIMIT_TEST_REDIS_URL is set, otherwise fakeredis, which runs Lua too"""
+    url = os.environ.get('RATELIMIT_TEST_REDIS_URL')
+    client = redis.Redis.from_url(url) if url else fakeredis.FakeRedis()
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture(params=['redis', 'memory'])
+def buckets(request):
+    """Buckets through the TOKEN_BUCKET script, and in memory"""
+    if request.param == 'memory':
+        return MemoryTokenBuckets()
+    return RedisTokenBuckets(client=request.getfixturevalue('redis_client'), prefix='test-ratelimit')
+
+
+@pytest.fixture
+def limiter(buckets, settings, monkeypatch):
+    """A limiter over ``buckets`` that the views use too"""
+    instance = Limiter(buckets=buckets)
+    settings.RATELIMIT_BACKEND = MEMORY_BACKEND
+    monkeypatch.setitem(ratelimit._limiters, MEMORY_BACKEND, instance)
+    return instance
+
+
+@pytest.mark.django_db
+class TestRateLimit:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.ALLOWED_HOSTS = ['testserver']
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        self.controller = Controller.objects.create(
+            name='Test Controller', description='Test', category=category, price=Decimal('50.00'),
+        )
+        self.client = Client()
+
+    def add(self):
+        return self.client.post(
+            reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'quantity': 1},
+            HTTP_REFERER='http://testserver/',
+        )
+
+    def test_over_limit_gets_429(self, limiter):
+        """Test a client past its policy gets a 429 with Retry-After, and others do not"""
+        assert all(self.add().status_code == 302 for _ in range(10))
+
+        response = self.add()
+        assert response.status_code == 429
+        assert 1 <= int(response['Retry-After']) <= 6
+
+        user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(user)
+        assert self.add().status_code == 302
+        assert self.client.get(reverse('cart:cart_detail')).status_code == 200
+
+    def test_local_precheck_skips_backend(self, limiter):
+        """Test once the shared bucket is empty, the local mirror refuses without asking it"""
+        for _ in range(10):
+            self.add()
+        before_local = throttled('cart:add_to_cart', 'local')
+        before_shared = throttled('cart:add_to_cart', 'shared')
+
+        with patch.object(limiter.buckets, 'take', wraps=limiter.buckets.take) as take:
+            assert self.add().status_code == 429
+            assert self.add().status_code == 429
+        take.assert_not_called()
+        assert throttled('cart:add_to_cart', 'local') - before_local == 2
+        assert throttled('cart:add_to_cart', 'shared') == before_shared
+
+    def test_mirror_never_refuses_what_backend_allows(self, buckets):
+        """Test the mirror follows the shared bucket, which other processes also take from"""
+        policy = Policy('3/m', name='test')
+        ours, theirs = Limiter(buckets=buckets), Limiter(buckets=buckets)
+
+        assert ours.take(policy, 'client') == 0
+        assert theirs.take(policy, 'client') == 0
+        assert theirs.take(policy, 'client') == 0
+        # Our mirror still has a token; the shared bucket refuses
+        assert ours.precheck(policy, 'client') == 0
+        assert ours.take(policy, 'client') > 0
+        assert ours.precheck(policy, 'client') > 0
+
+    def test_redis_script(self, redis_client):
+        """Test the script takes, refuses with the wait, refills and expires idle buckets"""
+        buckets = RedisTokenBuckets(client=redis_client, prefix='test-ratelimit')
+
+        allowed, tokens, wait = buckets.take('client', 2, 20.0)
+        assert (allowed, wait) == (True, 0.0) and tokens == pytest.approx(1.0, abs=0.1)
+        buckets.take('client', 2, 20.0)
+        allowed, tokens, wait = buckets.take('client', 2, 20.0)
+        assert not allowed and 0 < wait <= 0.05
+        assert 0 < redis_client.ttl('test-ratelimit:client') <= 2
+
+        time.sleep(0.1)
+        allowed, tokens, wait = buckets.take('client', 2, 20.0)
+        assert allowed and tokens == pytest.approx(0.0, abs=1.0)
+
+    def test_visitors_behind_proxy(self, limiter, settings):
+        """Test visitors behind one proxy get a bucket each, by the proxy's header"""
+        settings.RATELIMIT_IP_HEADER = 'HTTP_X_REAL_IP'
+        url = reverse('cart:add_to_cart')
+        data = {'controller_id': self.controller.pk, 'quantity': 1}
+
+        def add(client, address):
+            return client.post(
+                url, data, HTTP_REFERER='http://testserver/', REMOTE_ADDR='10.0.0.2', HTTP_X_REAL_IP=address,
+            )
+
+        first, second = Client(), Client()
+        assert all(add(first, '203.0.113.7').status_code == 302 for _ in range(10))
+        assert add(first, '203.0.113.7').status_code == 429
+        assert add(second, '198.51.100.4').status_code == 302
+
+    def test_backend_errors_let_requests_through(self, settings, monkeypatch):
+        """Test requests pass, and are counted, when the buckets cannot be reached"""
+        monkeypatch.setitem(ratelimit._limiters, MEMORY_BACKEND, Limiter(buckets=FailingBuckets()))
+        before = REGISTRY.get_sample_value(
+            'game_ctrl_rate_limit_errors_total', {'policy': 'cart:add_to_cart'},
+        ) or 0
+
+        assert all(self.add().status_code == 302 for _ in range(12))
+        assert REGISTRY.get_sample_value(
+            'game_ctrl_rate_limit_errors_total', {'policy': 'cart:add_to_cart'},
+        ) - before == 12
+
+    def test_policies(self, limiter, settings):
+        """Test policies apply to their methods only, can be disabled, and must name real URLs"""
+        for _ in range(30):
+            self.client.get(reverse('cart:cart_detail'))
+        assert self.client.get(reverse('cart:cart_detail')).status_code == 429
+        assert self.add().status_code == 302
+
+        settings.RATELIMIT_ENABLE = False
+        assert self.client.get(reverse('cart:cart_detail')).status_code == 200
+
+        with pytest.raises(ImproperlyConfigured):
+            limit_patterns('cart', {'checkout': Policy('5/m')}, [path('', lambda request: None, name='home')])
+        with pytest.raises(ImproperlyConfigured):
+            Policy('5 per minute')
@@ -8,16 +8,30 @@ from django.shortcuts import render
 
 from products.views import home
 from .health_checks import health_check
+from .metrics import metrics_view
+from .profiling import profile_detail, profile_diff, profile_download, profile_list
 
 def test_video(request):
     return render(request, 'marketing/test_video.html')
 
 urlpatterns = [
+    # Request profiles, ahead of the admin's own catch-all patterns
+    path('admin/profiles/', admin.site.admin_view(profile_list), name='profile_list'),
+    path('admin/profiles/diff/', admin.site.admin_view(profile_diff), name='profile_diff'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(profile_detail), name='profile_detail'),
+    path(
+        'admin/profiles/<str:profile_id>/download/',
+        admin.site.admin_view(profile_download), name='profile_download',
+    ),
+
     # Admin
     path('admin/', admin.site.urls),
     
     # Health Check
     path('health/', health_check, name='health_check'),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
     
     # Main URLs
     path('', home, name='home'),
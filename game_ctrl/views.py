@@ -1,10 +1,14 @@
-from django.http import HttpResponseToo
-from django.core.cache import cache
-from django.conf import settings
+import math
+
+from django.http import HttpResponse
+
 
 def rate_limit_view(request, exception):
     """View to handle rate limited requests"""
-    return HttpResponseTooMany(
+    response = HttpResponse(
         "Too many requests. Please try again later.",
-        content_type="text/plain"
-    ) 
\ No newline at end of file
+        content_type="text/plain",
+        status=429,
+    )
+    response['Retry-After'] = str(max(1, math.ceil(exception.retry_after)))
+    return response
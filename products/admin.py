@@ -3,6 +3,7 @@ from django.db.models import Count, Sum
 from django.utils import timezone
 from datetime import timedelta
 from .models import Category, Controller
+from .search import filter_controllers
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -39,4 +40,11 @@ class ControllerAdmin(admin.ModelAdmin):
     list_editable = ['price', 'is_featured']
     search_fields = ['name', 'description']
     date_hierarchy = 'created_at'
-    ordering = ['-created_at'] 
\ No newline at end of file
+    ordering = ['-created_at']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over search_fields
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return filter_controllers(queryset, search_term), False 
\ No newline at end of file
@@ -0,0 +1,120 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+
+from game_ctrl.async_views import resolve_user
+from game_ctrl.metrics import record_cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """Return the current catalog version, initialising it if missing"""
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, None) or 1
+
+
+async def aget_catalog_version():
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, 1, None) or 1
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page by moving to a new version"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key was evicted or never set; start a fresh version
+        cache.add(CATALOG_VERSION_KEY, 1, None)
+        try:
+            return cache.incr(CATALOG_VERSION_KEY)
+        except ValueError:
+            return None
+
+
+def catalog_page_key(request, version):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'catalog:page:v{version}:{url}'
+
+
+def is_cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+    )
+
+
+def is_cacheable_response(request, response):
+    # Pages that hand out a CSRF token are per-visitor and must not be shared
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _visitor_response(request, response):
+    """Make sure the visitor has a CSRF cookie for the forms on a shared page.
+
+    Called after the page is cached, so the cookie CsrfViewMiddleware then
+    sets goes out with this response only.
+    """
+    get_token(request)
+    return response
+
+
+def _rendered(response):
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
+
+
+def cache_catalog_page(view_func):
+    """Cache the rendered page for anonymous visitors.
+
+    Keys include the catalog version, so saving or deleting a Category or
+    Controller (see products.signals) retires every cached page at once.
+    Wraps async views with an async wrapper, so a hit never leaves the
+    event loop. Cached pages carry no CSRF token; visitors get the CSRF
+    cookie instead, and base.html copies it into the forms.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _async_wrapped_view(request, *args, **kwargs):
+            await resolve_user(request)
+            if not is_cacheable_request(request):
+                return await view_func(request, *args, **kwargs)
+
+            key = catalog_page_key(request, await aget_catalog_version())
+            response = await cache.aget(key)
+            record_cache('catalog_page', response is not None)
+            if response is not None:
+                return _visitor_response(request, response)
+
+            response = await view_func(request, *args, **kwargs)
+            if is_cacheable_response(request, response):
+                await cache.aset(key, _rendered(response), settings.CATALOG_PAGE_CACHE_TIMEOUT)
+            return _visitor_response(request, response)
+
+        return _async_wrapped_view
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        key = catalog_page_key(request, get_catalog_version())
+        response = cache.get(key)
+        record_cache('catalog_page', response is not None)
+        if response is not None:
+            return _visitor_response(request, response)
+
+        response = view_func(request, *args, **kwargs)
+        if is_cacheable_response(request, response):
+            cache.set(key, _rendered(response), settings.CATALOG_PAGE_CACHE_TIMEOUT)
+        return _visitor_response(request, response)
+
+    return _wrapped_view
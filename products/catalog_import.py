@@ -0,0 +1,233 @@
+"""
+Bulk catalog import from supplier feeds.
+
+Feeds are CSV (with a header row) or JSON Lines, one controller per
+record, keyed by ``sku``:
+
+    sku, name, description, price, category, [category_slug],
+    [is_featured], [image]
+
+Records are read lazily and written in batches: categories and controllers
+are upserted with ``bulk_create(update_conflicts=True)``, so re-running a
+feed updates rows in place. Bulk writes skip model signals, so price
+changes are queued for cart.repricing here, and the caller rebuilds facet
+counts and retires cached pages once the import finishes.
+"""
+import csv
+import json
+import os
+import posixpath
+import urllib.request
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.text import slugify
+
+from cart.models import PriceChange
+
+from .images import delete_derivatives, generate_derivatives, image_storage
+from .models import Category, Controller
+
+FEED_FORMATS = ('csv', 'jsonl')
+CONTROLLER_UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'is_featured', 'updated_at']
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+IMAGE_FETCH_TIMEOUT = 30
+# Larger images fail their row rather than being read into memory
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+# Controller.price is DECIMAL(10, 2)
+MAX_PRICE = Decimal('99999999.99')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def feed_format(path):
+    """Guess the feed format from its file extension"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_feed(stream, fmt, skip=0):
+    """Yield raw records from an open text stream, one at a time.
+
+    CSV rows come back as dicts and JSON Lines as unparsed strings, so a
+    malformed line is reported by clean_record rather than ending the
+    import. The first ``skip`` records are passed over.
+    """
+    if fmt == 'csv':
+        records = csv.DictReader(stream)
+    else:
+        records = (line for line in stream if line.strip())
+    return islice(records, skip, None)
+
+
+def clean_record(record):
+    """Validate one raw record, returning a dict of typed values"""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError:
+            raise InvalidRecord("invalid JSON")
+    if not isinstance(record, dict):
+        raise InvalidRecord("expected an object")
+
+    def text(key, required=True):
+        value = record.get(key)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise InvalidRecord(f"missing {key}")
+        return value
+
+    try:
+        price = Decimal(text('price'))
+    except InvalidOperation:
+        raise InvalidRecord(f"invalid price {record.get('price')!r}")
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        raise InvalidRecord(f"invalid price {record.get('price')!r}")
+    category = text('category')
+    category_slug = text('category_slug', required=False) or slugify(category)
+    if not category_slug:
+        raise InvalidRecord(f"cannot slugify category {category!r}")
+    featured = record.get('is_featured')
+    return {
+        'sku': text('sku')[:64],
+        'name': text('name')[:200],
+        'description': text('description', required=False),
+        'price': price.quantize(Decimal('0.01')),
+        'category': category[:200],
+        'category_slug': category_slug[:200],
+        'is_featured': featured is True or str(featured).strip().lower() in TRUE_VALUES,
+        'image': text('image', required=False),
+    }
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert_categories(records, known):
+    """Make sure every category in ``records`` exists.
+
+    ``known`` maps slug to id and is filled in as categories are seen, so
+    each category is written once per import.
+    """
+    missing = {}
+    for record in records:
+        if record['category_slug'] not in known:
+            missing[record['category_slug']] = record['category']
+    if not missing:
+        return
+    Category.objects.bulk_create(
+        [Category(slug=slug, name=name) for slug, name in missing.items()],
+        update_conflicts=True,
+        unique_fields=['slug'],
+        update_fields=['name'],
+    )
+    known.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+
+
+def upsert_controllers(records, categories):
+    """Insert or update one batch of controllers, keyed by sku.
+
+    Returns {sku: (pk, image name, image widths)} for the batch.
+    """
+    # Later records win; PostgreSQL refuses to upsert one row twice
+    rows = {
+        record['sku']: Controller(
+            sku=record['sku'],
+            name=record['name'],
+            description=record['description'],
+            price=record['price'],
+            category_id=categories[record['category_slug']],
+            is_featured=record['is_featured'],
+        )
+        for record in records
+    }
+    Controller.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=CONTROLLER_UPDATE_FIELDS,
+    )
+    return {
+        sku: (pk, image, widths)
+        for sku, pk, image, widths in Controller.objects.filter(sku__in=list(rows))
+        .values_list('sku', 'pk', 'image', 'image_widths')
+    }
+
+
+def record_price_changes(before, records, rows):
+    """Queue a PriceChange for each existing controller the batch repriced"""
+    # Later records win, as in upsert_controllers
+    prices = {record['sku']: record['price'] for record in records}
+    PriceChange.objects.bulk_create([
+        PriceChange(controller_id=rows[sku][0], old_price=old_price, new_price=prices[sku])
+        for sku, old_price in before.items()
+        if prices[sku] != old_price
+    ])
+
+
+def import_batch(records, categories):
+    with transaction.atomic():
+        upsert_categories(records, categories)
+        before = dict(
+            Controller.objects.filter(sku__in={record['sku'] for record in records})
+            .values_list('sku', 'price')
+        )
+        rows = upsert_controllers(records, categories)
+        # Upserts send no signals; carts keep their prices until repriced
+        record_price_changes(before, records, rows)
+        return rows
+
+
+def _read_limited(f, source):
+    data = f.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ValueError(f'Image {source!r} is larger than {MAX_IMAGE_BYTES} bytes')
+    return data
+
+
+def fetch_image(source, image_root):
+    """Read at most MAX_IMAGE_BYTES from an http(s) URL or a path under ``image_root``"""
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source, timeout=IMAGE_FETCH_TIMEOUT) as response:
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+                raise ValueError(f'Image {source!r} is larger than {MAX_IMAGE_BYTES} bytes')
+            return _read_limited(response, source)
+    # Feeds are untrusted: a source must not reach outside image_root
+    if os.path.isabs(source) or '..' in source.replace('\\', '/').split('/'):
+        raise ValueError(f'Image path {source!r} is not under the image root')
+    root = os.path.realpath(image_root)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f'Image path {source!r} is not under the image root')
+    with open(path, 'rb') as f:
+        return _read_limited(f, source)
+
+
+def attach_image(pk, source, image_root, previous=None):
+    """Store one controller's image and its derivatives.
+
+    Runs on a worker thread, touching only storage; returns
+    (pk, stored name, derivative widths) for the caller to save.
+    """
+    storage = image_storage()
+    data = fetch_image(source, image_root)
+    filename = posixpath.basename(source.split('?', 1)[0]) or f'{pk}.jpg'
+    upload_to = Controller._meta.get_field('image').upload_to
+    name = storage.save(posixpath.join(upload_to, filename), ContentFile(data))
+    if previous and previous[0]:
+        delete_derivatives(previous[0], previous[1], storage)
+    try:
+        widths = generate_derivatives(name, storage)
+    except OSError:
+        widths = []
+    return pk, name, widths
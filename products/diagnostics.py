@@ -0,0 +1,30 @@
+from functools import lru_cache
+import os
+
+from django.template.loader import get_template
+
+HOMEPAGE_TEMPLATE = 'home.html'
+
+
+@lru_cache(maxsize=None)
+def get_template_diagnostics(template_name=HOMEPAGE_TEMPLATE):
+    """Describe where a template is loaded from.
+
+    Resolved once per process on first use, so the file is never read on
+    the request path of the page itself.
+    """
+    template = get_template(template_name)
+    origin = template.origin
+    info = {
+        'template_name': template_name,
+        'template_path': origin.name,
+        'loader': f'{type(origin.loader).__module__}.{type(origin.loader).__name__}',
+        'template_exists': os.path.exists(origin.name),
+    }
+    if info['template_exists']:
+        stat = os.stat(origin.name)
+        with open(origin.name) as f:
+            info['template_content'] = f.read(100)  # First 100 chars
+        info['size'] = stat.st_size
+        info['modified'] = stat.st_mtime
+    return info
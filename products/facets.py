@@ -0,0 +1,225 @@
+"""
+Facet counts for catalog filtering.
+
+Counts live in FacetCount, one row per (category, price band, featured)
+cell. Signal handlers move a controller between cells as it is saved or
+deleted, so listing pages read a handful of small rows instead of
+grouping the controller table. Counts for any combination of filters are
+sums over those cells.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+
+from game_ctrl.metrics import record_cache
+from .cache import get_catalog_version
+from .models import Controller, FacetCount
+
+# (slug, label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = (
+    ('under-50', 'Under $50', None, Decimal('50')),
+    ('50-100', '$50–$100', Decimal('50'), Decimal('100')),
+    ('100-200', '$100–$200', Decimal('100'), Decimal('200')),
+    ('200-plus', '$200+', Decimal('200'), None),
+)
+PRICE_BAND_LABELS = {slug: label for slug, label, low, high in PRICE_BANDS}
+
+
+def price_band(price):
+    """Return the slug of the band ``price`` falls into"""
+    price = Decimal(price)
+    for slug, label, low, high in PRICE_BANDS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return slug
+    return PRICE_BANDS[-1][0]
+
+
+def price_band_q(slug):
+    """Return a filter selecting controllers in band ``slug``"""
+    for band, label, low, high in PRICE_BANDS:
+        if band == slug:
+            q = Q()
+            if low is not None:
+                q &= Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lt=high)
+            return q
+    raise ValueError(f"Unknown price band: {slug}")
+
+
+def price_band_case():
+    """SQL expression bucketing price into band slugs, for bulk histograms"""
+    whens = []
+    for slug, label, low, high in PRICE_BANDS[:-1]:
+        whens.append(When(price__lt=high, then=Value(slug)))
+    return Case(*whens, default=Value(PRICE_BANDS[-1][0]), output_field=CharField())
+
+
+def facet_cell(controller):
+    return (controller.category_id, price_band(controller.price), bool(controller.is_featured))
+
+
+def adjust_cell(cell, delta):
+    """Add ``delta`` to the count of one cell, creating it if needed"""
+    category_id, band, is_featured = cell
+    cells = FacetCount.objects.filter(
+        category_id=category_id, price_band=band, is_featured=is_featured
+    )
+    if cells.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(
+                category_id=category_id, price_band=band,
+                is_featured=is_featured, count=max(delta, 0),
+            )
+    except IntegrityError:
+        # Another writer created the cell first
+        cells.update(count=F('count') + delta)
+
+
+def rebuild_facet_counts():
+    """Recompute every cell with a single grouped query"""
+    rows = (
+        Controller.objects
+        .order_by()
+        .annotate(band=price_band_case())
+        .values('category_id', 'band', 'is_featured')
+        .annotate(n=Count('id'))
+    )
+    cells = [
+        FacetCount(
+            category_id=row['category_id'], price_band=row['band'],
+            is_featured=row['is_featured'], count=row['n'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(cells)
+    return len(cells)
+
+
+def load_facet_cube():
+    """Return [(category_id, band, is_featured, count), ...] for the catalog.
+
+    Cached per catalog version, so any catalog edit invalidates it.
+    """
+    key = f'catalog:facets:v{get_catalog_version()}'
+    hit = True
+
+    def build():
+        nonlocal hit
+        hit = False
+        return list(
+            FacetCount.objects.filter(count__gt=0)
+            .values_list('category_id', 'price_band', 'is_featured', 'count')
+        )
+
+    cube = cache.get_or_set(key, build, settings.CATALOG_PAGE_CACHE_TIMEOUT)
+    record_cache('facet_cube', hit)
+    return cube
+
+
+def search_facet_cube(queryset):
+    """Bucket an arbitrary controller queryset into cells in one query"""
+    rows = (
+        queryset
+        .order_by()
+        .annotate(band=price_band_case())
+        .values_list('category_id', 'band', 'is_featured')
+        .annotate(n=Count('id'))
+    )
+    return list(rows)
+
+
+def parse_filters(params):
+    """Read facet selections from a QueryDict, ignoring invalid values"""
+    filters = {}
+    category = params.get('category')
+    if category:
+        filters['category'] = category
+    band = params.get('price')
+    if band in PRICE_BAND_LABELS:
+        filters['price'] = band
+    featured = params.get('featured')
+    if featured in ('1', '0'):
+        filters['featured'] = featured == '1'
+    return filters
+
+
+def apply_filters(queryset, filters):
+    """Apply parsed facet selections to a controller queryset"""
+    if 'category' in filters:
+        queryset = queryset.filter(category__slug=filters['category'])
+    if 'price' in filters:
+        queryset = queryset.filter(price_band_q(filters['price']))
+    if 'featured' in filters:
+        queryset = queryset.filter(is_featured=filters['featured'])
+    return queryset
+
+
+def facet_counts(cube, category_id=None, band=None, featured=None):
+    """Count each facet value, holding the other facets' selections fixed.
+
+    Returns {'category': {id: n}, 'price': {slug: n}, 'featured': {bool: n}}.
+    """
+    counts = {'category': {}, 'price': {}, 'featured': {}}
+    for cell_category, cell_band, cell_featured, n in cube:
+        in_category = category_id is None or cell_category == category_id
+        in_band = band is None or cell_band == band
+        in_featured = featured is None or cell_featured == featured
+        if in_band and in_featured:
+            counts['category'][cell_category] = counts['category'].get(cell_category, 0) + n
+        if in_category and in_featured:
+            counts['price'][cell_band] = counts['price'].get(cell_band, 0) + n
+        if in_category and in_band:
+            counts['featured'][cell_featured] = counts['featured'].get(cell_featured, 0) + n
+    return counts
+
+
+def toggle_url(params, name, value):
+    """Link that selects ``value`` for facet ``name``, or clears it if selected"""
+    query = params.copy()
+    query.pop('cursor', None)
+    if query.get(name) == value:
+        query.pop(name)
+    else:
+        query[name] = value
+    return f'?{query.urlencode()}'
+
+
+def facet_option(params, name, value, label, count):
+    return {
+        'label': label,
+        'count': count,
+        'selected': params.get(name) == value,
+        'url': toggle_url(params, name, value),
+    }
+
+
+def facet_groups(params, counts, categories=None):
+    """Build the facet sidebar: [{'label', 'options': [...]}, ...]
+
+    ``categories`` maps category id to Category; omit it to leave out the
+    category facet (e.g. on a category's own page).
+    """
+    groups = []
+    if categories is not None:
+        groups.append({'label': 'Category', 'options': [
+            facet_option(params, 'category', category.slug, category.name, counts['category'][pk])
+            for pk, category in categories.items()
+            if counts['category'].get(pk)
+        ]})
+    groups.append({'label': 'Price', 'options': [
+        facet_option(params, 'price', slug, label, counts['price'].get(slug, 0))
+        for slug, label, low, high in PRICE_BANDS
+    ]})
+    groups.append({'label': 'Availability', 'options': [
+        facet_option(params, 'featured', value, label, counts['featured'].get(flag, 0))
+        for flag, value, label in ((True, '1', 'Featured'), (False, '0', 'Standard'))
+    ]})
+    return groups
@@ -0,0 +1,88 @@
+"""
+Responsive image derivatives for Controller.image.
+
+Each upload is resized to the widths in IMAGE_DERIVATIVE_WIDTHS, in WebP
+and JPEG, and the results are stored next to the original through the
+image field's storage (``controllers/pad.jpg`` gets
+``controllers/pad-320w.webp``, ``controllers/pad-320w.jpg``, ...). Widths
+wider than the original are skipped; an image narrower than all of them
+gets one pair at its own width. The widths that were actually generated
+are recorded on Controller.image_widths, so templates can build
+``srcset`` without touching storage, and an empty list means the image
+is still waiting for the build_image_derivatives worker.
+"""
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Controller
+
+# (extension, Pillow format, MIME type, save options)
+DERIVATIVE_FORMATS = (
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def derivative_name(name, width, extension):
+    """Storage name of the ``width``-pixel ``extension`` variant of ``name``"""
+    root, _ = posixpath.splitext(name)
+    return f'{root}-{width}w.{extension}'
+
+
+def derivative_names(name, widths):
+    return [
+        derivative_name(name, width, extension)
+        for width in widths
+        for extension, *_ in DERIVATIVE_FORMATS
+    ]
+
+
+def _encode(image, image_format, options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(name, storage, widths=None):
+    """Write every derivative of the stored image ``name``.
+
+    Returns the sorted list of widths generated, never empty. Existing
+    derivatives are replaced, so storages that rename on collision keep
+    the expected names.
+    """
+    widths = sorted(widths or settings.IMAGE_DERIVATIVE_WIDTHS)
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    widths = [width for width in widths if width < image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for extension, image_format, content_type, options in DERIVATIVE_FORMATS:
+            target = derivative_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, _encode(resized, image_format, options))
+    return widths
+
+
+def delete_derivatives(name, widths, storage):
+    for target in derivative_names(name, widths):
+        storage.delete(target)
+
+
+def image_storage():
+    return Controller._meta.get_field('image').storage
+
+
+def srcset(image, widths, extension):
+    """``srcset`` value listing the ``extension`` variants of a FieldFile"""
+    return ', '.join(
+        f'{image.storage.url(derivative_name(image.name, width, extension))} {width}w'
+        for width in widths
+    )
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from game_ctrl.loadtest import compare_throughput, run_load
+
+DEFAULT_PATHS = ['/', '/products/controller/1/', '/cart/']
+
+
+def target(value):
+    name, _, url = value.partition('=')
+    if not name or not url.startswith(('http://', 'https://')):
+        raise ValueError(value)
+    return name, url
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of running deployments under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', type=target, action='append', required=True,
+                            metavar='NAME=URL',
+                            help='A deployment to load, e.g. wsgi=http://127.0.0.1:8000; '
+                                 'the first is the one the others are compared with')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help=f'Paths to request in turn (default: {" ".join(DEFAULT_PATHS)})')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Clients, each with its own keep-alive connection')
+        parser.add_argument('--duration', type=float, default=20.0,
+                            help='Seconds to load each target for')
+        parser.add_argument('--cookie',
+                            help='Cookie header to send, e.g. sessionid=... for logged-in pages')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError('--concurrency and --duration must be positive')
+        headers = {'Cookie': options['cookie']} if options['cookie'] else {}
+        paths = options['paths'] or DEFAULT_PATHS
+
+        results = []
+        for name, url in options['target']:
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'Loading {name} at {url} with {options["concurrency"]} clients...')
+            results.append(run_load(
+                name, url, paths, options['concurrency'], options['duration'], headers,
+            ))
+        relative = compare_throughput(results)
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                result.target: {**result.summary(), 'relative_rps': relative[result.target]}
+                for result in results
+            }, indent=2))
+            return
+        columns = ('requests', 'rps', 'errors', 'p50_ms', 'p95_ms', 'p99_ms')
+        self.stdout.write(f"{'target':<12}" + ''.join(f'{column:>12}' for column in columns) + f"{'vs first':>12}")
+        for result in results:
+            summary = result.summary()
+            self.stdout.write(
+                f'{result.target:<12}'
+                + ''.join(f'{"-" if summary[c] is None else summary[c]:>12}' for c in columns)
+                + f'{"-" if relative[result.target] is None else relative[result.target]:>12}'
+            )
+        if any(result.errors for result in results):
+            self.stdout.write(self.style.WARNING('Some requests failed; check the targets are seeded and healthy'))
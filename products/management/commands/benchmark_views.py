@@ -0,0 +1,87 @@
+import os
+from dataclasses import asdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from game_ctrl.benchmarks import (
+    DEFAULT_TOLERANCES, METRICS, compare, load_baseline, report,
+    run_benchmarks, save_baseline,
+)
+from products.facets import rebuild_facet_counts
+from products.models import Controller
+from products.synthetic import SKU_PREFIX, DatasetSpec, generate_dataset
+
+
+def tolerance(value):
+    metric, _, amount = value.partition('=')
+    if metric not in DEFAULT_TOLERANCES or not amount:
+        raise ValueError(value)
+    return metric, float(amount)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the storefront views on a seeded test database'
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--views', nargs='+', help='Only benchmark these views')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--controllers', type=int, default=20_000)
+        parser.add_argument('--users', type=int, default=2_000)
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE)
+        parser.add_argument('--save', action='store_true',
+                            help='Write the results as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=tolerance, action='append', default=[],
+                            metavar='METRIC=VALUE',
+                            help=f'Override a tolerance, e.g. p95_ms=0.5 (metrics: {", ".join(METRICS)})')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the seeded test database between runs')
+
+    def handle(self, *args, **options):
+        spec = DatasetSpec(seed=options['seed'], controllers=options['controllers'], users=options['users'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False,
+        )
+        try:
+            if Controller.objects.filter(sku__startswith=SKU_PREFIX).count() != spec.controllers:
+                self.stdout.write(f'Seeding {spec.controllers} controllers and {spec.users} users...')
+                generate_dataset(spec)
+                rebuild_facet_counts()
+            results = run_benchmarks(options['iterations'], options['warmup'], options['views'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.print_results(results)
+        document = report(results, meta={
+            'dataset': asdict(spec),
+            'iterations': options['iterations'],
+        })
+        path = options['baseline']
+        if options['save']:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            save_baseline(path, document)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {path}'))
+            return
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(f'No baseline at {path}; run with --save to create one'))
+            return
+
+        comparison = compare(results, load_baseline(path), dict(options['tolerance']))
+        for view in comparison.missing:
+            self.stdout.write(self.style.WARNING(f'{view} is not in the baseline'))
+        if comparison.regressions:
+            for regression in comparison.regressions:
+                self.stderr.write(str(regression))
+            raise CommandError(f'{len(comparison.regressions)} metrics regressed past tolerance')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def print_results(self, results):
+        self.stdout.write(f"{'view':<20}" + ''.join(f'{metric:>12}' for metric in METRICS))
+        for view, metrics in results.items():
+            self.stdout.write(f'{view:<20}' + ''.join(f'{metrics[metric]:>12g}' for metric in METRICS))
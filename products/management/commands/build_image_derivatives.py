@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.cache import bump_catalog_version
+from products.images import generate_derivatives, image_storage
+from products.models import Controller
+
+
+def _build(item):
+    """Worker entry point: (pk, name) -> (pk, name, widths or None, error)"""
+    pk, name = item
+    try:
+        return pk, name, generate_derivatives(name, image_storage()), None
+    except OSError as exc:
+        return pk, name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate responsive image derivatives for controller images. Saving a '
+        'new image queues it here; run with --watch as a worker to keep up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes (0 resizes in this process)',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild every image, not just those without derivatives',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep building newly saved images until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait with --watch when no images are waiting')
+
+    def handle(self, *args, **options):
+        # (pk, name) of images that could not be read, not retried by --watch
+        self.failed = set()
+        if not options['watch']:
+            self.build(options, rebuild=options['all'])
+            return
+        try:
+            while True:
+                if not self.build(options, rebuild=False):
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def build(self, options, rebuild):
+        """Build one round of images; returns how many were attempted"""
+        controllers = Controller.objects.exclude(image='').exclude(image__isnull=True)
+        if not rebuild:
+            controllers = controllers.filter(image_widths=[])
+        items = [
+            item for item in controllers.order_by('pk').values_list('pk', 'image')
+            if item not in self.failed
+        ]
+        if not items:
+            if not options['watch']:
+                self.stdout.write('No images to process')
+            return 0
+
+        if options['workers'] > 0:
+            # Spawned rather than forked, so workers never inherit (and on
+            # exit close) this process's database connections
+            pool = ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+            with pool:
+                chunksize = max(1, len(items) // (options['workers'] * 4))
+                results = list(pool.map(_build, items, chunksize=chunksize))
+        else:
+            results = [_build(item) for item in items]
+
+        built = [(pk, name, widths) for pk, name, widths, error in results if error is None]
+        saved = 0
+        for start in range(0, len(built), options['batch_size']):
+            with transaction.atomic():
+                for pk, name, widths in built[start:start + options['batch_size']]:
+                    # Skip controllers whose image was replaced while resizing
+                    saved += Controller.objects.filter(pk=pk, image=name).update(image_widths=widths)
+        for pk, name, widths, error in results:
+            if error is not None:
+                self.failed.add((pk, name))
+                self.stdout.write(self.style.WARNING(f'Skipped {name}: {error}'))
+        if saved:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Built derivatives for {saved} of {len(results)} images'
+        ))
+        return len(results)
@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from products.cache import bump_catalog_version
+from products.facets import rebuild_facet_counts
+from products.synthetic import DatasetSpec, clear_dataset, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, production-sized synthetic dataset'
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--categories', type=int, default=defaults.categories)
+        parser.add_argument('--controllers', type=int, default=defaults.controllers)
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--cart-ratio', type=float, default=defaults.cart_ratio,
+                            help='Fraction of users with a cart')
+        parser.add_argument('--mean-items', type=float, default=defaults.mean_items,
+                            help='Average lines per cart')
+        parser.add_argument('--skew', type=float, default=defaults.skew,
+                            help='Zipf exponent of controller popularity in carts')
+        parser.add_argument('--batch-size', type=int, default=defaults.batch_size)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on PostgreSQL')
+        parser.add_argument('--clear', action='store_true',
+                            help='Remove a previously generated dataset first')
+        parser.add_argument('--allow-production', action='store_true',
+                            help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['allow_production']:
+            raise CommandError(
+                'DEBUG is off: this may be a production database. '
+                'Pass --allow-production to generate the dataset anyway.'
+            )
+        spec = DatasetSpec(
+            seed=options['seed'],
+            categories=options['categories'],
+            controllers=options['controllers'],
+            users=options['users'],
+            cart_ratio=options['cart_ratio'],
+            mean_items=options['mean_items'],
+            skew=options['skew'],
+            batch_size=options['batch_size'],
+            use_copy=not options['no_copy'],
+        )
+        if spec.batch_size < 1 or spec.skew <= 0 or not 0 <= spec.cart_ratio <= 1:
+            raise CommandError('Invalid --batch-size, --skew or --cart-ratio')
+
+        started = time.monotonic()
+        if options['clear']:
+            clear_dataset()
+            self.stdout.write(f'Cleared previous dataset in {time.monotonic() - started:.1f}s')
+
+        def progress(table, rows):
+            if options['verbosity'] >= 2:
+                rate = rows / max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'{rows} {table} ({rate:.0f}/s)')
+
+        totals = generate_dataset(spec, progress)
+        rebuild_facet_counts()
+        bump_catalog_version()
+        summary = ', '.join(f'{count} {table}' for table, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {summary} in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from products.cache import bump_catalog_version
+from products.catalog_import import (
+    FEED_FORMATS, InvalidRecord, attach_image, batched, clean_record,
+    feed_format, import_batch, read_feed,
+)
+from products.facets import rebuild_facet_counts
+from products.models import Controller
+
+# Invalid records and failed images reported individually before falling back to a count
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSON Lines supplier feed into the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file (.csv or .jsonl)')
+        parser.add_argument('--format', choices=FEED_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--image-workers', type=int, default=8,
+                            help='Threads fetching and resizing images')
+        parser.add_argument('--image-root', default='.',
+                            help='Directory relative image paths are read from')
+        parser.add_argument('--refresh-images', action='store_true',
+                            help='Re-fetch images for controllers that already have one')
+        parser.add_argument('--checkpoint', help='Defaults to PATH.checkpoint')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the records a previous run completed')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or feed_format(path)
+        self.checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        self.source = os.path.abspath(path)
+        self.verbosity = options['verbosity']
+        self.image_root = options['image_root']
+        self.refresh_images = options['refresh_images']
+        if options['batch_size'] < 1 or options['image_workers'] < 1:
+            raise CommandError('--batch-size and --image-workers must be positive')
+        start = self.read_checkpoint() if options['resume'] else 0
+        if start:
+            self.stdout.write(f'Resuming after record {start}')
+
+        self.position = start
+        self.imported = self.invalid = self.images = self.image_errors = 0
+        categories = {}
+        started = time.monotonic()
+        pending = None
+        try:
+            with open(path, newline='', encoding='utf-8') as stream, \
+                    ThreadPoolExecutor(options['image_workers']) as pool:
+                for batch in batched(read_feed(stream, fmt, skip=start), options['batch_size']):
+                    records = self.clean(batch)
+                    rows = import_batch(records, categories) if records else {}
+                    self.imported += len(rows)
+                    futures = self.queue_images(pool, records, rows)
+                    # Images for this batch resize while the next one is written
+                    if pending:
+                        self.finish(*pending)
+                    pending = (self.position, futures)
+                    self.report(started, verbosity=2)
+                if pending:
+                    self.finish(*pending)
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(f'Import stopped at record {self.position}: {exc}. '
+                               'Fix the problem and re-run with --resume.')
+
+        rebuild_facet_counts()
+        bump_catalog_version()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.report(started, verbosity=1, done=True)
+
+    def clean(self, batch):
+        records = []
+        for raw in batch:
+            self.position += 1
+            try:
+                records.append(clean_record(raw))
+            except InvalidRecord as exc:
+                self.invalid += 1
+                if self.invalid <= MAX_REPORTED_ERRORS:
+                    self.stdout.write(self.style.WARNING(f'Record {self.position}: {exc}'))
+        return records
+
+    def queue_images(self, pool, records, rows):
+        sources = {record['sku']: record['image'] for record in records if record['image']}
+        futures = []
+        for sku, source in sources.items():
+            pk, image, widths = rows[sku]
+            if image and not self.refresh_images:
+                continue
+            futures.append(pool.submit(attach_image, pk, source, self.image_root, (image, widths)))
+        return futures
+
+    def finish(self, position, futures):
+        """Save a batch's images, then move the checkpoint past it"""
+        wait(futures)
+        attached = []
+        for future in futures:
+            try:
+                pk, name, widths = future.result()
+            except (OSError, ValueError) as exc:
+                self.image_errors += 1
+                if self.image_errors <= MAX_REPORTED_ERRORS:
+                    self.stdout.write(self.style.WARNING(f'Image failed: {exc}'))
+                continue
+            attached.append(Controller(pk=pk, image=name, image_widths=widths))
+        Controller.objects.bulk_update(attached, ['image', 'image_widths'])
+        self.images += len(attached)
+        self.write_checkpoint(position)
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if state.get('source') != self.source:
+            raise CommandError(f'{self.checkpoint} belongs to {state.get("source")}')
+        return state['records']
+
+    def write_checkpoint(self, position):
+        # Write then rename, so a crash never leaves a truncated checkpoint
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'source': self.source, 'records': position}, f)
+        os.replace(temporary, self.checkpoint)
+
+    def report(self, started, verbosity, done=False):
+        if self.verbosity < verbosity:
+            return
+        elapsed = max(time.monotonic() - started, 1e-9)
+        message = (
+            f'{self.position} records read, {self.imported} controllers upserted, '
+            f'{self.images} images attached ({self.imported / elapsed:.0f} controllers/s)'
+        )
+        if done:
+            if self.invalid or self.image_errors:
+                message += f'; {self.invalid} invalid records, {self.image_errors} failed images'
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(message)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.cache import bump_catalog_version
+from products.facets import rebuild_facet_counts
+
+class Command(BaseCommand):
+    help = 'Recompute catalog facet counts from the controller table'
+
+    def handle(self, *args, **options):
+        cells = rebuild_facet_counts()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {cells} facet cells'))
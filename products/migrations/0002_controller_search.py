@@ -0,0 +1,102 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:08
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_INSTALL = [
+    """
+    CREATE FUNCTION products_controller_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_controller_search_update
+    BEFORE INSERT OR UPDATE ON products_controller
+    FOR EACH ROW EXECUTE FUNCTION products_controller_search_update()
+    """,
+    "UPDATE products_controller SET name = name",
+    """
+    CREATE INDEX products_controller_search_gin
+    ON products_controller USING gin (search_vector)
+    """,
+]
+
+POSTGRES_REMOVE = [
+    "DROP INDEX IF EXISTS products_controller_search_gin",
+    "DROP TRIGGER IF EXISTS products_controller_search_update ON products_controller",
+    "DROP FUNCTION IF EXISTS products_controller_search_update()",
+]
+
+# External-content FTS5 table kept in step with products_controller by triggers
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE products_controller_fts USING fts5(
+        name, description,
+        content='products_controller', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER products_controller_fts_insert AFTER INSERT ON products_controller BEGIN
+        INSERT INTO products_controller_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_controller_fts_delete AFTER DELETE ON products_controller BEGIN
+        INSERT INTO products_controller_fts(products_controller_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_controller_fts_update AFTER UPDATE OF name, description ON products_controller BEGIN
+        INSERT INTO products_controller_fts(products_controller_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_controller_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO products_controller_fts(products_controller_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVE = [
+    "DROP TRIGGER IF EXISTS products_controller_fts_update",
+    "DROP TRIGGER IF EXISTS products_controller_fts_delete",
+    "DROP TRIGGER IF EXISTS products_controller_fts_insert",
+    "DROP TABLE IF EXISTS products_controller_fts",
+]
+
+
+def run_for_vendor(postgres_sql, sqlite_sql):
+    def run(apps, schema_editor):
+        statements = {
+            'postgresql': postgres_sql,
+            'sqlite': sqlite_sql,
+        }.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='controller',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_INSTALL, SQLITE_INSTALL),
+            run_for_vendor(POSTGRES_REMOVE, SQLITE_REMOVE),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:10
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, Value, When
+
+# The price bands as of this migration; products.facets may change later
+PRICE_BAND_EDGES = (
+    ('under-50', Decimal('50')),
+    ('50-100', Decimal('100')),
+    ('100-200', Decimal('200')),
+)
+TOP_PRICE_BAND = '200-plus'
+
+
+def build_facet_counts(apps, schema_editor):
+    price_band_case = Case(
+        *[When(price__lt=high, then=Value(slug)) for slug, high in PRICE_BAND_EDGES],
+        default=Value(TOP_PRICE_BAND), output_field=CharField(),
+    )
+    Controller = apps.get_model('products', 'Controller')
+    FacetCount = apps.get_model('products', 'FacetCount')
+    rows = (
+        Controller.objects
+        .order_by()
+        .annotate(band=price_band_case)
+        .values('category_id', 'band', 'is_featured')
+        .annotate(n=Count('id'))
+    )
+    FacetCount.objects.bulk_create([
+        FacetCount(
+            category_id=row['category_id'], price_band=row['band'],
+            is_featured=row['is_featured'], count=row['n'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_controller_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.CharField(max_length=20)),
+                ('is_featured', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='products.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'price_band', 'is_featured'), name='products_facetcount_cell')],
+            },
+        ),
+        migrations.RunPython(build_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='controller',
+            index=models.Index(fields=['-created_at', '-id'], name='controller_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='controller',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='controller_category_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='controller',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['-created_at', '-id'], name='controller_featured_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:16
+
+import importlib
+
+from django.db import migrations, models
+
+search = importlib.import_module('products.migrations.0002_controller_search')
+
+# SQLite rebuilds products_controller to add the column, which drops the
+# search triggers; put them back and resync the index
+SQLITE_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS products_controller_fts_update",
+    "DROP TRIGGER IF EXISTS products_controller_fts_delete",
+    "DROP TRIGGER IF EXISTS products_controller_fts_insert",
+    *search.SQLITE_INSTALL[1:],
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            search.run_for_vendor([], SQLITE_TRIGGERS),
+        ),
+        migrations.AddField(
+            model_name='controller',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(
+            search.run_for_vendor([], SQLITE_TRIGGERS),
+            migrations.RunPython.noop,
+        ),
+    ]
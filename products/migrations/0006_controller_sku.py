@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:20
+
+import importlib
+
+from django.db import migrations, models
+
+image_widths = importlib.import_module('products.migrations.0005_controller_image_widths')
+reinstall_search_triggers = image_widths.search.run_for_vendor([], image_widths.SQLITE_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_controller_image_widths'),
+    ]
+
+    operations = [
+        # The unique column makes SQLite rebuild the table; see 0005
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_triggers),
+        migrations.AddField(
+            model_name='controller',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
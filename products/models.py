@@ -1,5 +1,6 @@
 from django.db import models
 from django.urls import reverse
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.utils.text import slugify
 
@@ -19,17 +20,34 @@ class Category(models.Model):
         return reverse('products:category_detail', args=[self.slug])
 
 class Controller(models.Model):
+    # Supplier identifier; the upsert key for catalog imports
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='controllers/', blank=True, null=True)
+    # Widths of the resized variants stored next to the image; see products.images
+    image_widths = models.JSONField(default=list, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='controllers')
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger; see products.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Newest-first listings and their keyset pagination
+            models.Index(fields=['-created_at', '-id'], name='controller_newest_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='controller_category_newest_idx'),
+            # Homepage featured row; only a small slice of the catalog is featured
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='controller_featured_idx',
+                condition=models.Q(is_featured=True),
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -38,4 +56,27 @@ class Controller(models.Model):
         return reverse('products:controller_detail', args=[str(self.id)])
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs) 
+        super().save(*args, **kwargs)
+
+class FacetCount(models.Model):
+    """Number of controllers in one (category, price band, featured) cell.
+
+    Kept current incrementally by products.facets; rebuild in bulk with
+    the rebuild_facets management command.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='facet_counts')
+    price_band = models.CharField(max_length=20)
+    is_featured = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'price_band', 'is_featured'],
+                name='products_facetcount_cell',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}/{self.price_band}/{self.is_featured}: {self.count}"
+
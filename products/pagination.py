@@ -0,0 +1,64 @@
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'products.pagination.cursor'
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing ordered by (-created_at, -id)"""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(obj):
+    return signing.dumps([obj.created_at.isoformat(), obj.pk], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor timestamp')
+    return created_at, pk
+
+
+def paginate_keyset(queryset, cursor=None, page_size=24):
+    """Return the page of ``queryset`` that follows ``cursor``.
+
+    Seeks past the cursor row instead of using OFFSET, so every page costs
+    the same however deep into the listing it is.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return KeysetPage(rows, next_cursor)
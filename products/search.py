@@ -0,0 +1,111 @@
+"""
+Full-text search over Controller name and description.
+
+PostgreSQL keeps a weighted ``search_vector`` column current with a
+trigger and indexes it with GIN. SQLite (used by the test settings) uses
+an external-content FTS5 table maintained by triggers instead. Both are
+installed by migration 0002_controller_search.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Controller
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_controller_fts'
+
+# Unlikely markers wrapped around matches by the database, swapped for
+# <mark> tags only after the surrounding text has been escaped
+HIGHLIGHT_START = '⟦'
+HIGHLIGHT_STOP = '⟧'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def render_highlight(text):
+    """Escape a highlighted fragment and mark up the matched terms"""
+    if not text:
+        return ''
+    text = escape(text)
+    text = text.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    return mark_safe(text)
+
+
+def fts5_query(query):
+    """Turn free text into an FTS5 query that matches every term as a prefix"""
+    terms = TERM_RE.findall(query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def pg_search_query(query):
+    return SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def match_controllers(queryset, query):
+    """Restrict ``queryset`` to controllers matching ``query``, unordered"""
+    if connection.vendor == 'postgresql':
+        return queryset.filter(search_vector=pg_search_query(query))
+
+    match = fts5_query(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    )
+
+
+def filter_controllers(queryset, query):
+    """Restrict ``queryset`` to controllers matching ``query``, best match first"""
+    queryset = match_controllers(queryset, query)
+    if connection.vendor == 'postgresql':
+        rank = SearchRank(F('search_vector'), pg_search_query(query))
+    else:
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = products_controller.id',
+            [fts5_query(query)],
+        )
+    return queryset.annotate(rank=rank).order_by('-rank', '-created_at')
+
+
+def search_controllers(query, queryset=None, limit=50):
+    """Return ranked controllers matching ``query`` with a highlighted excerpt.
+
+    Each result carries ``rank`` and ``headline`` attributes; ``headline``
+    is safe HTML with matches wrapped in ``<mark>``.
+    """
+    if queryset is None:
+        queryset = Controller.objects.all()
+    query = (query or '').strip()
+    if not query:
+        return []
+
+    results = filter_controllers(queryset, query)
+    if connection.vendor == 'postgresql':
+        results = results.annotate(headline=SearchHeadline(
+            'description',
+            pg_search_query(query),
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=30,
+            min_words=15,
+        ))
+    else:
+        results = results.annotate(headline=RawSQL(
+            f"SELECT snippet({FTS_TABLE}, 1, %s, %s, '...', 30) FROM {FTS_TABLE} "
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = products_controller.id',
+            [HIGHLIGHT_START, HIGHLIGHT_STOP, fts5_query(query)],
+        ))
+
+    results = list(results.defer('description', 'search_vector')[:limit])
+    for controller in results:
+        controller.headline = render_highlight(controller.headline)
+    return results
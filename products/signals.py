@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .facets import adjust_cell, facet_cell, price_band
+from .images import delete_derivatives, image_storage
+from .models import Category, Controller
+
+
+def _loaded_image(instance):
+    # Read the raw value so a deferred image column is not fetched
+    image = instance.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Controller)
+def remember_image(sender, instance, **kwargs):
+    """Note the image a controller was loaded with"""
+    instance._image_before = _loaded_image(instance)
+
+
+@receiver(pre_save, sender=Controller)
+def detect_image_change(sender, instance, raw=False, **kwargs):
+    """Flag saves that replace or clear the image"""
+    instance._image_changed = False
+    if raw or 'image' not in instance.__dict__:
+        return
+    before = None if instance._state.adding else instance._image_before
+    if (instance.image.name or None) != (before or None):
+        instance._image_changed = True
+        instance._image_previous = (before, instance.image_widths if before else [])
+        instance.image_widths = []
+
+
+@receiver(post_save, sender=Controller)
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Drop the replaced image's derivatives once the transaction commits.
+
+    The new image is left with no image_widths, which queues it for the
+    build_image_derivatives worker; the save does no resizing itself.
+    """
+    if raw or not instance._image_changed:
+        return
+    previous_name, previous_widths = instance._image_previous
+    instance._image_before = instance.image.name
+    instance._image_changed = False
+    if previous_name and previous_widths:
+        transaction.on_commit(lambda: delete_derivatives(previous_name, previous_widths, image_storage()))
+
+
+@receiver(post_delete, sender=Controller)
+def delete_image_derivatives(sender, instance, **kwargs):
+    """Remove a deleted controller's derivatives once the transaction commits"""
+    name, widths = _loaded_image(instance), instance.__dict__.get('image_widths')
+    if name and widths:
+        transaction.on_commit(lambda: delete_derivatives(name, widths, image_storage()))
+
+
+@receiver(pre_save, sender=Controller)
+def remember_facet_cell(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Note which facet cell a controller occupied before this save"""
+    instance._facet_cell_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not {'category', 'category_id', 'price', 'is_featured'} & set(update_fields):
+        return
+    before = (
+        Controller.objects.filter(pk=instance.pk)
+        .values_list('category_id', 'price', 'is_featured')
+        .first()
+    )
+    if before is not None:
+        category_id, price, is_featured = before
+        instance._facet_cell_before = (category_id, price_band(price), is_featured)
+
+
+@receiver(post_save, sender=Controller)
+def move_facet_cell(sender, instance, created, raw=False, **kwargs):
+    """Move a saved controller into its current facet cell"""
+    if raw:
+        return
+    after = facet_cell(instance)
+    if created:
+        adjust_cell(after, 1)
+        return
+    before = getattr(instance, '_facet_cell_before', None)
+    if before is not None and before != after:
+        adjust_cell(before, -1)
+        adjust_cell(after, 1)
+
+
+@receiver(pre_delete, sender=Controller)
+def release_facet_cell(sender, instance, **kwargs):
+    """Remove a controller from its facet cell as it is deleted"""
+    adjust_cell(facet_cell(instance), -1)
+
+
+# Registered after the facet handlers so counts are current before any
+# cached page or facet cube is retired
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Controller)
+@receiver(post_delete, sender=Controller)
+def invalidate_catalog_pages(sender, **kwargs):
+    """Retire cached catalog pages whenever the catalog changes"""
+    bump_catalog_version()
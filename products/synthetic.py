@@ -0,0 +1,313 @@
+"""
+Deterministic synthetic catalog, users and carts for performance work.
+
+Everything is derived from a seed: each table draws from its own random
+stream, so the controllers generated for seed 7 are the same whether 10
+or 10,000 users are generated alongside them. Rows are produced lazily
+and written in batches; on PostgreSQL the two large tables (controllers
+and cart items) are loaded with COPY, elsewhere with bulk_create.
+
+Cart popularity follows a Zipf-like power law: a few controllers appear
+in most carts and the long tail in almost none, as on a real storefront.
+Generated rows are tagged (``SYN-`` SKUs, ``synth-`` usernames) so they
+can be removed again with clear_dataset(). Generated users have unusable
+passwords; benchmarks log them in with force_login().
+"""
+import csv
+import hashlib
+import io
+import json
+import math
+import random
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem, PriceChange
+from cart.summary import refresh_summaries
+from .models import Category, Controller
+
+SKU_PREFIX = 'SYN-'
+USERNAME_PREFIX = 'synth-'
+CATEGORY_SLUG_PREFIX = 'synth-'
+MAX_CART_LINES = 50
+
+ADJECTIVES = (
+    'Pro', 'Elite', 'Classic', 'Wireless', 'Tournament', 'Retro', 'Compact',
+    'Precision', 'Modular', 'Hall-Effect', 'Silent', 'Turbo', 'Ergonomic',
+)
+NOUNS = (
+    'Gamepad', 'Arcade Stick', 'Fight Pad', 'Racing Wheel', 'Flight Stick',
+    'Hitbox', 'Joystick', 'Controller', 'Pedal Set', 'Throttle',
+)
+FEATURES = (
+    'Sanwa buttons', 'hall-effect sticks', 'RGB lighting', 'swappable gates',
+    'low-latency wireless', 'braided cable', 'remappable back paddles',
+    'force feedback', 'tournament lock', 'aluminium case', 'trigger stops',
+)
+PLATFORMS = ('PC', 'PlayStation', 'Xbox', 'Switch', 'Retro', 'Mobile', 'Arcade')
+
+
+@dataclass
+class DatasetSpec:
+    seed: int = 0
+    categories: int = 50
+    controllers: int = 100_000
+    users: int = 10_000
+    cart_ratio: float = 0.3
+    mean_items: float = 3.0
+    featured_ratio: float = 0.02
+    skew: float = 1.1
+    batch_size: int = 5000
+    use_copy: bool = True
+
+
+def stream(spec, name):
+    """Random stream for one table, independent of the others"""
+    return random.Random(f'{spec.seed}:{name}')
+
+
+def zipf_rank(rng, n, skew):
+    """Draw a 0-based rank in [0, n) with P(rank k) roughly ~ 1 / (k + 1) ** skew.
+
+    Inverts the CDF of the continuous power law, so no per-item weight
+    table is needed for catalogs of millions of rows.
+    """
+    u = rng.random()
+    if skew == 1:
+        rank = n ** u
+    else:
+        a = 1 - skew
+        rank = ((n ** a - 1) * u + 1) ** (1 / a)
+    return min(int(rank) - 1, n - 1)
+
+
+def popularity_order(n, seed):
+    """Map popularity rank to catalog position, spreading hits across the catalog"""
+    if n <= 1:
+        return lambda rank: rank
+    step = random.Random(f'{seed}:popularity').randrange(1, n)
+    while math.gcd(step, n) != 1:
+        step += 1
+    return lambda rank: (rank * step) % n
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def category_rows(spec):
+    rng = stream(spec, 'categories')
+    for i in range(spec.categories):
+        platform = PLATFORMS[i % len(PLATFORMS)]
+        noun = rng.choice(NOUNS)
+        yield {
+            'name': f'{platform} {noun}s {i + 1}',
+            'slug': f'{CATEGORY_SLUG_PREFIX}{i + 1:05d}',
+        }
+
+
+def controller_rows(spec, category_ids):
+    """Yield controller column values; category sizes are skewed too"""
+    rng = stream(spec, 'controllers')
+    for i in range(spec.controllers):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}'
+        features = rng.sample(FEATURES, 3)
+        price = Decimal(min(max(rng.lognormvariate(4.3, 0.6), 9.99), 2999.99)).quantize(Decimal('0.01'))
+        yield {
+            'sku': f'{SKU_PREFIX}{i + 1:08d}',
+            'name': name,
+            'description': (
+                f'{name} for {rng.choice(PLATFORMS)} with {features[0]}, '
+                f'{features[1]} and {features[2]}. ' * rng.randint(1, 4)
+            ).strip(),
+            'price': price,
+            'category_id': category_ids[zipf_rank(rng, len(category_ids), 0.8)],
+            'is_featured': rng.random() < spec.featured_ratio,
+        }
+
+
+def user_rows(spec, password_hash):
+    for i in range(spec.users):
+        username = f'{USERNAME_PREFIX}{i + 1:07d}'
+        yield User(username=username, email=f'{username}@example.com', password=password_hash)
+
+
+def cart_lines(rng, spec, controller_ids, order):
+    """Distinct (controller_id, quantity) pairs for one cart"""
+    count = 1 + int(rng.expovariate(1 / max(spec.mean_items - 1, 0.01)))
+    count = min(count, MAX_CART_LINES, len(controller_ids))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(controller_ids[order(zipf_rank(rng, len(controller_ids), spec.skew))])
+    for controller_id in sorted(chosen):
+        yield controller_id, rng.choices((1, 2, 3, 4), weights=(80, 13, 5, 2))[0]
+
+
+def copy_rows(table, columns, rows):
+    """Load rows into ``table`` with PostgreSQL COPY"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def can_copy(spec):
+    return spec.use_copy and connection.vendor == 'postgresql'
+
+
+def insert_controllers(spec, category_ids, now):
+    columns = ('sku', 'name', 'description', 'price', 'category_id', 'is_featured',
+               'image', 'image_widths', 'created_at', 'updated_at')
+    for batch in batched(controller_rows(spec, category_ids), spec.batch_size):
+        if can_copy(spec):
+            copy_rows(Controller._meta.db_table, columns, (
+                (row['sku'], row['name'], row['description'], row['price'], row['category_id'],
+                 row['is_featured'], '', '[]', now.isoformat(), now.isoformat())
+                for row in batch
+            ))
+        else:
+            Controller.objects.bulk_create([Controller(**row) for row in batch])
+        yield len(batch)
+
+
+def insert_carts(spec, controller_ids):
+    """Create users in batches, then carts and cart items for some of them"""
+    # One unusable password for every user: no generated account can log in
+    password_hash = make_password(None)
+    rng = stream(spec, 'carts')
+    order = popularity_order(len(controller_ids), spec.seed)
+    now = timezone.now()
+    columns = ('cart_id', 'controller_id', 'quantity', 'unit_price', 'created_at', 'updated_at')
+    for users in batched(user_rows(spec, password_hash), spec.batch_size):
+        users = User.objects.bulk_create(users)
+        carts = Cart.objects.bulk_create([
+            Cart(user_id=user.pk) for user in users if rng.random() < spec.cart_ratio
+        ])
+        items = [
+            (cart.pk, controller_id, quantity)
+            for cart in carts
+            for controller_id, quantity in cart_lines(rng, spec, controller_ids, order)
+        ] if controller_ids else []
+        # Lines snapshot their controller's price, as when a shopper adds them
+        prices = dict(
+            Controller.objects.filter(pk__in={controller_id for _, controller_id, _ in items})
+            .values_list('pk', 'price')
+        ) if items else {}
+        if can_copy(spec):
+            copy_rows(CartItem._meta.db_table, columns, (
+                (*item, prices[item[1]], now.isoformat(), now.isoformat()) for item in items
+            ))
+        else:
+            CartItem.objects.bulk_create([
+                CartItem(cart_id=cart_id, controller_id=controller_id, quantity=quantity,
+                         unit_price=prices[controller_id])
+                for cart_id, controller_id, quantity in items
+            ])
+        refresh_summaries(Cart.objects.filter(pk__in=[cart.pk for cart in carts]))
+        yield len(users), len(carts), len(items)
+
+
+def generated_controller_ids():
+    """Ids of generated controllers in generation order, as a compact array"""
+    ids = array('q')
+    ids.extend(
+        Controller.objects.filter(sku__startswith=SKU_PREFIX)
+        .order_by('sku').values_list('id', flat=True).iterator(chunk_size=10_000)
+    )
+    return ids
+
+
+def clear_dataset():
+    """Delete everything a previous generate_dataset run created.
+
+    Facet counts are left stale; rebuild them afterwards.
+    """
+    with transaction.atomic():
+        # Real carts holding generated controllers need re-totalling afterwards
+        affected = list(
+            Cart.objects.filter(items__controller__sku__startswith=SKU_PREFIX)
+            .exclude(user__username__startswith=USERNAME_PREFIX)
+            .values_list('pk', flat=True).distinct()
+        )
+        PriceChange.objects.filter(controller__sku__startswith=SKU_PREFIX).delete()
+        # Plain SQL: deleting millions of rows through the ORM would load
+        # each one to run its signal handlers
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {CartItem._meta.db_table} WHERE cart_id IN "
+                f"(SELECT c.id FROM {Cart._meta.db_table} c JOIN {User._meta.db_table} u "
+                f"ON u.id = c.user_id WHERE u.username LIKE %s) "
+                f"OR controller_id IN (SELECT id FROM {Controller._meta.db_table} WHERE sku LIKE %s)",
+                [f'{USERNAME_PREFIX}%', f'{SKU_PREFIX}%'],
+            )
+            cursor.execute(
+                f"DELETE FROM {Controller._meta.db_table} WHERE sku LIKE %s",
+                [f'{SKU_PREFIX}%'],
+            )
+        Cart.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Category.objects.filter(slug__startswith=CATEGORY_SLUG_PREFIX).delete()
+        refresh_summaries(Cart.objects.filter(pk__in=affected))
+
+
+def generate_dataset(spec, progress=None):
+    """Generate the dataset described by ``spec``.
+
+    ``progress`` is called with (table, rows written so far) after each
+    batch. Returns the number of rows written per table.
+    """
+    progress = progress or (lambda table, rows: None)
+    totals = dict.fromkeys(('categories', 'controllers', 'users', 'carts', 'cart items'), 0)
+    now = timezone.now()
+
+    categories = Category.objects.bulk_create([Category(**row) for row in category_rows(spec)])
+    totals['categories'] = len(categories)
+    category_ids = [category.pk for category in categories]
+
+    if category_ids:
+        for written in insert_controllers(spec, category_ids, now):
+            totals['controllers'] += written
+            progress('controllers', totals['controllers'])
+
+    controller_ids = generated_controller_ids()
+    for users, carts, items in insert_carts(spec, controller_ids):
+        totals['users'] += users
+        totals['carts'] += carts
+        totals['cart items'] += items
+        progress('users', totals['users'])
+    return totals
+
+
+def dataset_fingerprint():
+    """Stable digest of the generated rows, for checking determinism"""
+    digest = hashlib.sha256()
+    rows = (
+        Controller.objects.filter(sku__startswith=SKU_PREFIX).order_by('sku')
+        .values_list('sku', 'name', 'price', 'category__slug', 'is_featured')
+    )
+    for row in rows.iterator(chunk_size=10_000):
+        digest.update(json.dumps(row, default=str).encode())
+    items = (
+        CartItem.objects.filter(cart__user__username__startswith=USERNAME_PREFIX)
+        .order_by('cart__user__username', 'controller__sku')
+        .values_list('cart__user__username', 'controller__sku', 'quantity')
+    )
+    for row in items.iterator(chunk_size=10_000):
+        digest.update(json.dumps(row).encode())
+    return digest.hexdigest()
@@ -0,0 +1,19 @@
+from django import template
+
+from products.images import srcset
+
+register = template.Library()
+
+@register.inclusion_tag('products/includes/responsive_image.html')
+def responsive_image(controller, sizes='100vw', css_class='', loading='lazy'):
+    """Render a controller's image with srcset/sizes over its derivatives"""
+    image, widths = controller.image, controller.image_widths
+    return {
+        'src': image.url,
+        'alt': controller.name,
+        'webp_srcset': srcset(image, widths, 'webp'),
+        'jpeg_srcset': srcset(image, widths, 'jpg'),
+        'sizes': sizes,
+        'css_class': css_class,
+        'loading': loading,
+    }
@@ -0,0 +1,130 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+from products.cache import CATALOG_VERSION_KEY, bump_catalog_version, get_catalog_version
+from products.models import Category, Controller
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-page-cache-tests',
+    }
+}
+
+
+@pytest.mark.django_db
+class TestCatalogPageCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CACHES = LOCMEM_CACHES
+        cache.clear()
+        self.client = Client()
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category'
+        )
+        self.controller = Controller.objects.create(
+            name='Test Controller',
+            description='Test description',
+            category=self.category,
+            price=Decimal('199.99'),
+            is_featured=True
+        )
+        yield
+        cache.clear()
+
+    def test_version_bumps(self):
+        """Test bumping the catalog version moves to a new number"""
+        version = get_catalog_version()
+        assert bump_catalog_version() == version + 1
+        assert get_catalog_version() == version + 1
+
+    def test_bump_recovers_from_evicted_version(self):
+        """Test bumping works when the version key has been evicted"""
+        cache.delete(CATALOG_VERSION_KEY)
+        assert bump_catalog_version() == 2
+
+    def test_anonymous_hit_is_served_from_cache(self, django_assert_num_queries):
+        """Test a repeated anonymous page view runs no queries"""
+        url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+        first = self.client.get(url)
+        assert first.status_code == 200
+
+        with django_assert_num_queries(0):
+            second = self.client.get(url)
+        assert second.status_code == 200
+        assert second.content == first.content
+
+    def test_controller_detail_is_cached(self, django_assert_num_queries):
+        """Test the controller page is shareable between anonymous visitors"""
+        url = reverse('products:controller_detail', kwargs={'id': self.controller.id})
+        self.client.get(url)
+        with django_assert_num_queries(0):
+            response = self.client.get(url)
+        assert b'Test Controller' in response.content
+
+    def test_controller_save_invalidates(self):
+        """Test saving a controller retires cached pages"""
+        url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+        self.client.get(url)
+
+        self.controller.name = 'Renamed Controller'
+        self.controller.save()
+
+        response = self.client.get(url)
+        assert b'Renamed Controller' in response.content
+
+    def test_controller_delete_invalidates(self):
+        """Test deleting a controller retires cached pages"""
+        url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+        self.client.get(url)
+
+        self.controller.delete()
+
+        response = self.client.get(url)
+        assert b'Test Controller' not in response.content
+
+    def test_category_save_invalidates(self):
+        """Test saving a category retires cached pages"""
+        version = get_catalog_version()
+        self.category.name = 'Renamed Category'
+        self.category.save()
+        assert get_catalog_version() == version + 1
+
+    def test_authenticated_requests_bypass_cache(self):
+        """Test logged-in users always get a freshly rendered page"""
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('products:controller_detail', kwargs={'id': self.controller.id})
+
+        self.client.get(url)
+        Controller.objects.filter(pk=self.controller.pk).update(name='Updated Quietly')
+
+        response = self.client.get(url)
+        assert b'Updated Quietly' in response.content
+
+    def test_visitors_get_add_form_and_csrf_cookie(self, settings):
+        """Test visitors see the add form on cached pages and get a CSRF cookie for it"""
+        settings.MIDDLEWARE = [*settings.MIDDLEWARE, 'django.middleware.csrf.CsrfViewMiddleware']
+        client = Client(enforce_csrf_checks=True)
+        home = reverse('products:home')
+
+        first = client.get(home)
+        assert reverse('cart:add_to_cart').encode() in first.content
+        assert b'data-csrf-cookie' in first.content
+        token = first.cookies['csrftoken'].value
+
+        Controller.objects.filter(pk=self.controller.pk).update(name='Updated Quietly')
+        second = Client(enforce_csrf_checks=True).get(home)
+        assert b'Updated Quietly' not in second.content
+        assert second.cookies['csrftoken'].value != token
+
+        response = client.post(
+            reverse('cart:add_to_cart'), {'controller_id': self.controller.pk, 'csrfmiddlewaretoken': token},
+            HTTP_REFERER='http://testserver/',
+        )
+        assert response.status_code == 302
+        assert client.session['cart'] == [self.controller.pk, 1]
@@ -0,0 +1,51 @@
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from unittest.mock import patch
+from products.diagnostics import get_template_diagnostics
+
+
+@pytest.mark.django_db
+class TestHomepageDiagnostics:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = Client()
+        get_template_diagnostics.cache_clear()
+
+    def test_home_does_no_file_io(self, capsys):
+        """Test the homepage neither reads template files nor prints"""
+        self.client.get(reverse('products:home'))  # warm the template cache
+        capsys.readouterr()
+
+        with patch('builtins.open', side_effect=AssertionError('file read')):
+            response = self.client.get(reverse('products:home'))
+
+        assert response.status_code == 200
+        assert 'debug_info' not in response.context
+        assert capsys.readouterr().out == ''
+
+    def test_diagnostics_requires_staff(self):
+        """Test anonymous users are sent to the admin login"""
+        response = self.client.get(reverse('products:home_diagnostics'))
+        assert response.status_code == 302
+
+    def test_diagnostics_reports_template(self):
+        """Test staff can see which template the homepage uses"""
+        User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.login(username='staff', password='testpass123')
+
+        response = self.client.get(reverse('products:home_diagnostics'))
+
+        assert response.status_code == 200
+        info = response.json()['debug_info']
+        assert info['template_path'].endswith('home.html')
+        assert info['template_exists'] is True
+        assert info['template_content']
+
+    def test_diagnostics_captured_once(self):
+        """Test template metadata is resolved only on the first call"""
+        get_template_diagnostics()
+        with patch('products.diagnostics.get_template') as mock_get_template:
+            get_template_diagnostics()
+        mock_get_template.assert_not_called()
@@ -0,0 +1,127 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from products.facets import facet_counts, price_band, rebuild_facet_counts
+from products.models import Category, Controller, FacetCount
+
+
+def stored_cells():
+    return sorted(
+        FacetCount.objects.filter(count__gt=0)
+        .values_list('category_id', 'price_band', 'is_featured', 'count')
+    )
+
+
+class TestPriceBands:
+    def test_band_boundaries(self):
+        """Test lower bounds are inclusive and upper bounds exclusive"""
+        assert price_band(Decimal('49.99')) == 'under-50'
+        assert price_band(Decimal('50.00')) == '50-100'
+        assert price_band(Decimal('199.99')) == '100-200'
+        assert price_band(Decimal('200.00')) == '200-plus'
+
+    def test_counts_hold_other_facets_fixed(self):
+        """Test each facet is counted under the other facets' selections"""
+        cube = [
+            (1, 'under-50', True, 2),
+            (1, '50-100', False, 3),
+            (2, 'under-50', False, 5),
+        ]
+        counts = facet_counts(cube, category_id=1, band='under-50')
+        assert counts['category'] == {1: 2, 2: 5}
+        assert counts['price'] == {'under-50': 2, '50-100': 3}
+        assert counts['featured'] == {True: 2}
+
+
+@pytest.mark.django_db
+class TestFacetCounts:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = Client()
+        self.xbox = Category.objects.create(name='Xbox', slug='xbox')
+        self.retro = Category.objects.create(name='Retro', slug='retro')
+        self.pad = Controller.objects.create(
+            name='Budget Pad', description='Cheap arcade pad.',
+            category=self.xbox, price=Decimal('29.99'),
+        )
+        self.elite = Controller.objects.create(
+            name='Elite Pad', description='Premium arcade pad.',
+            category=self.xbox, price=Decimal('179.99'), is_featured=True,
+        )
+        self.stick = Controller.objects.create(
+            name='Retro Stick', description='Classic arcade stick.',
+            category=self.retro, price=Decimal('89.99'),
+        )
+
+    def assert_counts_match_rebuild(self):
+        incremental = stored_cells()
+        rebuild_facet_counts()
+        assert incremental == stored_cells()
+
+    def test_counts_follow_creates(self):
+        """Test new controllers are counted"""
+        assert stored_cells() == sorted([
+            (self.xbox.id, 'under-50', False, 1),
+            (self.xbox.id, '100-200', True, 1),
+            (self.retro.id, '50-100', False, 1),
+        ])
+
+    def test_counts_follow_updates(self):
+        """Test changing price, category or featured moves the controller"""
+        self.pad.price = Decimal('59.99')
+        self.pad.save()
+        self.stick.category = self.xbox
+        self.stick.is_featured = True
+        self.stick.save()
+        self.elite.name = 'Elite Pad 2'
+        self.elite.save()
+        self.assert_counts_match_rebuild()
+
+    def test_counts_follow_deletes(self):
+        """Test deleted controllers and categories are no longer counted"""
+        self.pad.delete()
+        self.assert_counts_match_rebuild()
+        self.retro.delete()
+        self.assert_counts_match_rebuild()
+
+    def test_rebuild_command(self):
+        """Test the rebuild command repairs drifted counts"""
+        FacetCount.objects.update(count=99)
+        out = StringIO()
+        call_command('rebuild_facets', stdout=out)
+        assert 'Rebuilt 3 facet cells' in out.getvalue()
+        assert sum(FacetCount.objects.values_list('count', flat=True)) == 3
+
+    def test_category_view_facets(self):
+        """Test the category page filters by price and shows counts"""
+        url = reverse('products:category_detail', kwargs={'slug': self.xbox.slug})
+        response = self.client.get(url, {'price': 'under-50'})
+
+        assert response.status_code == 200
+        assert list(response.context['controllers']) == [self.pad]
+        price, featured = response.context['facet_groups']
+        assert {o['label']: o['count'] for o in price['options']} == {
+            'Under $50': 1, '$50–$100': 0, '$100–$200': 1, '$200+': 0,
+        }
+        assert [o['selected'] for o in price['options']] == [True, False, False, False]
+        assert {o['label']: o['count'] for o in featured['options']} == {
+            'Featured': 0, 'Standard': 1,
+        }
+
+    def test_category_view_featured_filter(self):
+        """Test the featured facet narrows the listing"""
+        url = reverse('products:category_detail', kwargs={'slug': self.xbox.slug})
+        response = self.client.get(url, {'featured': '1'})
+        assert list(response.context['controllers']) == [self.elite]
+
+    def test_search_view_facets(self):
+        """Test search results can be narrowed by category with live counts"""
+        response = self.client.get(reverse('products:search'), {'q': 'arcade', 'category': 'retro'})
+
+        assert response.status_code == 200
+        assert list(response.context['results']) == [self.stick]
+        category = response.context['facet_groups'][0]
+        assert {o['label']: o['count'] for o in category['options']} == {'Xbox': 2, 'Retro': 1}
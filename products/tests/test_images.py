@@ -0,0 +1,163 @@
+import pytest
+from decimal import Decimal
+from io import BytesIO, StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from PIL import Image
+from products.images import derivative_name, generate_derivatives, image_storage
+from products.models import Category, Controller
+
+
+def make_upload(name='pad.jpg', size=(1000, 500)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@pytest.mark.django_db
+class TestImageDerivatives:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1280)
+        self.storage = image_storage()
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category'
+        )
+
+    def create_controller(self, **kwargs):
+        return Controller.objects.create(
+            name='Test Controller',
+            description='Test Description',
+            category=self.category,
+            price=Decimal('99.99'),
+            **kwargs
+        )
+
+    def test_derivative_name(self):
+        """Test derivatives are named after the original, in its directory"""
+        assert derivative_name('controllers/pad.jpg', 320, 'webp') == 'controllers/pad-320w.webp'
+
+    def test_generate_skips_upscaling(self):
+        """Test only widths narrower than the original are generated"""
+        name = self.storage.save('controllers/pad.jpg', make_upload())
+        assert generate_derivatives(name, self.storage) == [320, 640]
+        with self.storage.open(derivative_name(name, 640, 'webp')) as f:
+            image = Image.open(f)
+            assert image.format == 'WEBP'
+            assert image.size == (640, 320)
+        assert self.storage.exists(derivative_name(name, 320, 'jpg'))
+        assert not self.storage.exists(derivative_name(name, 1280, 'jpg'))
+
+    def build(self):
+        out = StringIO()
+        call_command('build_image_derivatives', workers=0, stdout=out)
+        return out.getvalue()
+
+    def test_queued_on_save(self, django_capture_on_commit_callbacks):
+        """Test saving an upload leaves resizing to the worker command"""
+        with django_capture_on_commit_callbacks(execute=True):
+            controller = self.create_controller(image=make_upload())
+        controller.refresh_from_db()
+        assert controller.image_widths == []
+        assert not self.storage.exists(derivative_name(controller.image.name, 320, 'webp'))
+
+        self.build()
+        controller.refresh_from_db()
+        assert controller.image_widths == [320, 640]
+        assert self.storage.exists(derivative_name(controller.image.name, 320, 'webp'))
+
+    def test_replaced_image_drops_old_derivatives(self, django_capture_on_commit_callbacks):
+        """Test replacing an image removes the previous derivatives"""
+        controller = self.create_controller(image=make_upload())
+        self.build()
+        controller.refresh_from_db()
+        old_name = controller.image.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            controller.image = make_upload('stick.jpg', size=(400, 400))
+            controller.save()
+        assert not self.storage.exists(derivative_name(old_name, 320, 'webp'))
+        self.build()
+        controller.refresh_from_db()
+        assert controller.image_widths == [320]
+
+    def test_unrelated_save_keeps_derivatives(self, django_capture_on_commit_callbacks):
+        """Test saves that do not touch the image leave it alone"""
+        controller = self.create_controller(image=make_upload())
+        self.build()
+        controller = Controller.objects.get(pk=controller.pk)
+        with django_capture_on_commit_callbacks() as callbacks:
+            controller.price = Decimal('89.99')
+            controller.save()
+        assert callbacks == []
+        controller.refresh_from_db()
+        assert controller.image_widths == [320, 640]
+
+    def test_template_tag_srcset(self):
+        """Test the tag renders WebP and JPEG srcsets with sizes"""
+        controller = self.create_controller(image=make_upload())
+        self.build()
+        controller.refresh_from_db()
+        rendered = Template(
+            '{% load product_tags %}'
+            '{% responsive_image controller sizes="50vw" css_class="img-fluid" %}'
+        ).render(Context({'controller': controller}))
+
+        root = controller.image.url.rsplit('.', 1)[0]
+        assert f'srcset="{root}-320w.webp 320w, {root}-640w.webp 640w"' in rendered
+        assert f'srcset="{root}-320w.jpg 320w, {root}-640w.jpg 640w"' in rendered
+        assert f'src="{controller.image.url}"' in rendered
+        assert 'sizes="50vw"' in rendered
+
+    def test_template_tag_without_derivatives(self):
+        """Test images without derivatives fall back to the original only"""
+        controller = self.create_controller(image='controllers/legacy.jpg')
+        rendered = Template(
+            '{% load product_tags %}{% responsive_image controller %}'
+        ).render(Context({'controller': controller}))
+        assert 'srcset' not in rendered
+        assert 'src="/media/controllers/legacy.jpg"' in rendered
+
+    def test_backfill_command(self):
+        """Test the command builds derivatives for existing images"""
+        name = self.storage.save('controllers/pad.jpg', make_upload())
+        controller = self.create_controller()
+        Controller.objects.filter(pk=controller.pk).update(image=name)
+        missing = self.create_controller()
+        Controller.objects.filter(pk=missing.pk).update(image='controllers/missing.jpg')
+
+        self.build()
+
+        controller.refresh_from_db()
+        missing.refresh_from_db()
+        assert controller.image_widths == [320, 640]
+        assert missing.image_widths == []
+        assert self.storage.exists(derivative_name(name, 640, 'jpg'))
+
+    def test_small_images_are_built_once(self):
+        """Test an image narrower than every width is recorded at its own width"""
+        controller = self.create_controller(image=make_upload(size=(200, 100)))
+        self.build()
+        controller.refresh_from_db()
+        assert controller.image_widths == [200]
+        assert self.storage.exists(derivative_name(controller.image.name, 200, 'webp'))
+        assert 'No images to process' in self.build()
+
+    def test_build_skips_replaced_images(self, monkeypatch):
+        """Test widths are not saved over an image replaced while it was resized"""
+        from products.management.commands import build_image_derivatives
+        controller = self.create_controller(image=make_upload())
+        build = build_image_derivatives._build
+
+        def replaced_meanwhile(item):
+            result = build(item)
+            Controller.objects.filter(pk=controller.pk).update(image='controllers/newer.jpg')
+            return result
+        monkeypatch.setattr(build_image_derivatives, '_build', replaced_meanwhile)
+
+        assert 'for 0 of 1 images' in self.build()
+        controller.refresh_from_db()
+        assert (controller.image.name, controller.image_widths) == ('controllers/newer.jpg', [])
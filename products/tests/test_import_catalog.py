@@ -0,0 +1,196 @@
+import json
+import pytest
+from decimal import Decimal
+from io import BytesIO, StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from PIL import Image
+from cart.models import PriceChange
+from products import catalog_import
+from products.catalog_import import InvalidRecord, clean_record, fetch_image
+from products.images import derivative_name, image_storage
+from products.models import Category, Controller, FacetCount
+
+CSV_FEED = """sku,name,description,price,category,is_featured,image
+PAD-1,Wireless Pad,Light pad,59.99,Gamepads,yes,
+STICK-1,Arcade Stick,Sanwa parts,199.99,Arcade Sticks,no,
+WHEEL-1,Racing Wheel,Force feedback,299.99,Wheels,0,
+"""
+
+
+class TestCleanRecord:
+    def test_clean_record(self):
+        """Test feed values are typed and categories slugified"""
+        record = clean_record({
+            'sku': ' PAD-1 ', 'name': 'Pad', 'price': '59.9',
+            'category': 'Arcade Sticks', 'is_featured': 'TRUE',
+        })
+        assert record['sku'] == 'PAD-1'
+        assert record['price'] == Decimal('59.90')
+        assert record['category_slug'] == 'arcade-sticks'
+        assert record['is_featured'] is True
+        assert record['description'] == ''
+
+    def test_clean_record_rejects(self):
+        """Test invalid records raise InvalidRecord"""
+        with pytest.raises(InvalidRecord):
+            clean_record({'sku': 'X', 'name': 'Pad', 'price': 'free', 'category': 'Pads'})
+        with pytest.raises(InvalidRecord):
+            clean_record({'name': 'Pad', 'price': '1', 'category': 'Pads'})
+        with pytest.raises(InvalidRecord):
+            clean_record('{not json')
+
+
+@pytest.mark.django_db
+class TestImportCatalog:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.tmp_path = tmp_path
+
+    def write_feed(self, name, content):
+        path = self.tmp_path / name
+        path.write_text(content)
+        return str(path)
+
+    def run_import(self, path, **options):
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        """Test a CSV feed creates categories, controllers and facet counts"""
+        output = self.run_import(self.write_feed('feed.csv', CSV_FEED), batch_size=2)
+
+        assert Category.objects.count() == 3
+        pad = Controller.objects.get(sku='PAD-1')
+        assert pad.category.slug == 'gamepads'
+        assert pad.price == Decimal('59.99')
+        assert pad.is_featured
+        assert sum(FacetCount.objects.values_list('count', flat=True)) == 3
+        assert '3 controllers upserted' in output
+        assert 'controllers/s' in output
+
+    def test_reimport_updates_in_place(self):
+        """Test re-running a feed updates rows instead of duplicating them"""
+        path = self.write_feed('feed.csv', CSV_FEED)
+        self.run_import(path)
+        created_at = Controller.objects.get(sku='PAD-1').created_at
+
+        self.run_import(self.write_feed('feed.csv', CSV_FEED.replace('59.99', '49.99')))
+
+        assert Controller.objects.count() == 3
+        pad = Controller.objects.get(sku='PAD-1')
+        assert pad.price == Decimal('49.99')
+        assert pad.created_at == created_at
+        # Only the repriced controller is queued for cart repricing
+        assert list(PriceChange.objects.values_list('controller__sku', 'old_price', 'new_price')) == [
+            ('PAD-1', Decimal('59.99'), Decimal('49.99')),
+        ]
+
+    def test_import_jsonl_skips_invalid(self):
+        """Test JSON Lines feeds report bad records and import the rest"""
+        lines = [
+            json.dumps({'sku': 'PAD-1', 'name': 'Pad', 'price': 10, 'category': 'Pads'}),
+            '{broken',
+            json.dumps({'sku': 'PAD-2', 'name': 'Pad 2', 'price': -1, 'category': 'Pads'}),
+            json.dumps({'sku': 'PAD-1', 'name': 'Pad (revised)', 'price': 12, 'category': 'Pads'}),
+        ]
+        output = self.run_import(self.write_feed('feed.jsonl', '\n'.join(lines)))
+
+        assert list(Controller.objects.values_list('sku', 'name')) == [('PAD-1', 'Pad (revised)')]
+        assert 'Record 2: invalid JSON' in output
+        assert '2 invalid records' in output
+
+    def test_resume_from_checkpoint(self):
+        """Test --resume skips records a previous run completed"""
+        path = self.write_feed('feed.csv', CSV_FEED)
+        with open(f'{path}.checkpoint', 'w') as f:
+            json.dump({'source': path, 'records': 2}, f)
+
+        self.run_import(path, resume=True)
+
+        assert list(Controller.objects.values_list('sku', flat=True)) == ['WHEEL-1']
+        assert not (self.tmp_path / 'feed.csv.checkpoint').exists()
+
+    def test_checkpoint_survives_failure(self):
+        """Test a failed run leaves a checkpoint at a finished batch"""
+        rows = ''.join(f'SKU-{i},Pad {i},Pad,10.00,Pads,0,\n' for i in range(400))
+        path = self.write_feed('feed.csv', CSV_FEED + rows)
+        with open(path, 'ab') as f:
+            f.write(b'\xff\xfe,broken\n')
+
+        with pytest.raises(CommandError):
+            self.run_import(path, batch_size=100)
+
+        with open(f'{path}.checkpoint') as f:
+            records = json.load(f)['records']
+        assert records and records % 100 == 0
+        assert Controller.objects.count() >= records
+
+        self.write_feed('feed.csv', CSV_FEED + rows)
+        self.run_import(path, batch_size=100, resume=True)
+        assert Controller.objects.count() == 403
+
+    def test_attach_images(self, settings):
+        """Test images are stored with derivatives by the worker pool"""
+        settings.MEDIA_ROOT = self.tmp_path / 'media'
+        settings.IMAGE_DERIVATIVE_WIDTHS = (320,)
+        images = self.tmp_path / 'images'
+        images.mkdir()
+        Image.new('RGB', (800, 600)).save(images / 'pad.jpg')
+        feed = CSV_FEED.replace('Light pad,59.99,Gamepads,yes,', 'Light pad,59.99,Gamepads,yes,pad.jpg')
+        feed = feed.replace('Sanwa parts,199.99,Arcade Sticks,no,', 'Sanwa parts,199.99,Arcade Sticks,no,missing.jpg')
+
+        output = self.run_import(
+            self.write_feed('feed.csv', feed), image_root=str(images), image_workers=2
+        )
+
+        pad = Controller.objects.get(sku='PAD-1')
+        assert pad.image.name == 'controllers/pad.jpg'
+        assert pad.image_widths == [320]
+        assert image_storage().exists(derivative_name(pad.image.name, 320, 'webp'))
+        assert not Controller.objects.get(sku='STICK-1').image
+        assert '1 failed images' in output
+
+    def test_image_paths_stay_under_root(self, settings):
+        """Test feed image paths outside the image root fail instead of being stored"""
+        settings.MEDIA_ROOT = self.tmp_path / 'media'
+        images = self.tmp_path / 'images'
+        images.mkdir()
+        secret = self.tmp_path / 'secret.jpg'
+        Image.new('RGB', (10, 10)).save(secret)
+        (images / 'link.jpg').symlink_to(secret)
+        feed = CSV_FEED.replace('Light pad,59.99,Gamepads,yes,', 'Light pad,59.99,Gamepads,yes,../secret.jpg')
+        feed = feed.replace('Sanwa parts,199.99,Arcade Sticks,no,', f'Sanwa parts,199.99,Arcade Sticks,no,{secret}')
+        feed = feed.replace('Force feedback,299.99,Wheels,0,', 'Force feedback,299.99,Wheels,0,link.jpg')
+
+        output = self.run_import(self.write_feed('feed.csv', feed), image_root=str(images))
+
+        assert not Controller.objects.exclude(image='').exists()
+        assert not (self.tmp_path / 'media').exists()
+        assert '3 failed images' in output
+
+    def test_oversized_images_fail(self, settings, monkeypatch):
+        """Test images over MAX_IMAGE_BYTES fail their row instead of being stored"""
+        settings.MEDIA_ROOT = self.tmp_path / 'media'
+        monkeypatch.setattr(catalog_import, 'MAX_IMAGE_BYTES', 100)
+        images = self.tmp_path / 'images'
+        images.mkdir()
+        Image.new('RGB', (800, 600)).save(images / 'pad.jpg')
+        feed = CSV_FEED.replace('Light pad,59.99,Gamepads,yes,', 'Light pad,59.99,Gamepads,yes,pad.jpg')
+
+        output = self.run_import(self.write_feed('feed.csv', feed), image_root=str(images))
+
+        assert not Controller.objects.get(sku='PAD-1').image
+        assert '1 failed images' in output
+
+    @pytest.mark.parametrize('length', ['101', None])
+    def test_oversized_downloads_fail(self, monkeypatch, length):
+        """Test downloads are refused by Content-Length, or cut off without one"""
+        monkeypatch.setattr(catalog_import, 'MAX_IMAGE_BYTES', 100)
+        response = BytesIO(b'x' * 1000)
+        response.headers = {'Content-Length': length} if length else {}
+        monkeypatch.setattr(catalog_import.urllib.request, 'urlopen', lambda *args, **kwargs: response)
+
+        with pytest.raises(ValueError, match='larger than 100 bytes'):
+            fetch_image('https://example.com/pad.jpg', str(self.tmp_path))
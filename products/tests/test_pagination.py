@@ -0,0 +1,90 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from products.models import Category, Controller
+from products.pagination import InvalidCursor, decode_cursor, paginate_keyset
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CATALOG_PAGE_SIZE = 4
+        self.client = Client()
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category'
+        )
+        now = timezone.now()
+        self.controllers = []
+        for i in range(10):
+            controller = Controller.objects.create(
+                name=f'Controller {i}',
+                description='Long description ' * 50,
+                category=self.category,
+                price=Decimal('99.99'),
+            )
+            self.controllers.append(controller)
+        # Give two rows the same timestamp so the id tie-breaker is exercised
+        for i, controller in enumerate(self.controllers):
+            created_at = now - timedelta(minutes=i // 2)
+            Controller.objects.filter(pk=controller.pk).update(created_at=created_at)
+        self.expected = list(
+            Controller.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+
+    def test_pages_cover_listing_once(self):
+        """Test following cursors visits every controller exactly once"""
+        seen = []
+        cursor = None
+        while True:
+            page = paginate_keyset(Controller.objects.all(), cursor, page_size=4)
+            seen.extend(c.id for c in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        assert seen == self.expected
+
+    def test_cursor_is_opaque(self):
+        """Test tampered cursors are rejected"""
+        page = paginate_keyset(Controller.objects.all(), page_size=4)
+        with pytest.raises(InvalidCursor):
+            decode_cursor(page.next_cursor + 'x')
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_category_view_paginates(self):
+        """Test the category page shows one page and links to the next"""
+        response = self.client.get(self.url)
+
+        assert response.status_code == 200
+        controllers = response.context['controllers']
+        assert [c.id for c in controllers] == self.expected[:4]
+        page = response.context['page']
+        assert page.has_next
+        assert b'Next page' in response.content
+
+        response = self.client.get(self.url, {'cursor': page.next_cursor})
+        assert [c.id for c in response.context['controllers']] == self.expected[4:8]
+
+    def test_category_view_invalid_cursor(self):
+        """Test an invalid cursor returns 404"""
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        assert response.status_code == 404
+
+    def test_category_view_query_count(self, django_assert_num_queries):
+        """Test the page costs category, listing and facet count queries"""
+        with django_assert_num_queries(3):
+            response = self.client.get(self.url)
+        assert response.status_code == 200
+
+    def test_category_view_defers_description(self):
+        """Test listing rows skip the full description column"""
+        response = self.client.get(self.url)
+        controller = response.context['controllers'][0]
+        assert 'description' in controller.get_deferred_fields()
+        assert len(controller.summary) <= 200
@@ -0,0 +1,77 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from game_ctrl.query_plans import is_select, plan_problems
+from products.models import Category, Controller
+
+SEED_CATEGORIES = 5
+SEED_CONTROLLERS = 5000
+
+
+@pytest.mark.django_db
+class TestCatalogQueryPlans:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CATALOG_PAGE_SIZE = 24
+        self.client = Client()
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {i}', slug=f'category-{i}')
+            for i in range(SEED_CATEGORIES)
+        ])
+        Controller.objects.bulk_create([
+            Controller(
+                name=f'Controller {i}',
+                description='Seeded controller',
+                price=Decimal(10 + i % 300),
+                category=categories[i % SEED_CATEGORIES],
+                is_featured=i % 20 == 0,
+            )
+            for i in range(SEED_CONTROLLERS)
+        ], batch_size=1000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.category = categories[0]
+        self.controller = Controller.objects.filter(category=self.category).first()
+
+    def assert_indexed(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        assert response.status_code == 200
+        selects = [q['sql'] for q in queries.captured_queries if is_select(q['sql'])]
+        assert selects
+        problems = {sql: plan_problems(sql) for sql in selects}
+        assert not {sql: p for sql, p in problems.items() if p}
+        return response
+
+    def test_home(self):
+        """Test the homepage featured row reads the featured index"""
+        self.assert_indexed(reverse('products:home'))
+
+    def test_category_first_page(self):
+        """Test the first category page reads the category index in order"""
+        self.assert_indexed(reverse('products:category_detail', kwargs={'slug': self.category.slug}))
+
+    def test_category_next_page(self):
+        """Test following a cursor keeps to the index"""
+        url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+        page = self.client.get(url).context['page']
+        self.assert_indexed(url, {'cursor': page.next_cursor})
+
+    def test_category_filtered(self):
+        """Test facet filters keep to the index"""
+        url = reverse('products:category_detail', kwargs={'slug': self.category.slug})
+        self.assert_indexed(url, {'price': '50-100', 'featured': '0'})
+
+    def test_controller_detail(self):
+        """Test the controller page is a primary key lookup"""
+        self.assert_indexed(reverse('products:controller_detail', kwargs={'id': self.controller.id}))
+
+    def test_detects_unindexed_order(self):
+        """Test the checker flags a sort the indexes cannot serve"""
+        with CaptureQueriesContext(connection) as queries:
+            list(Controller.objects.order_by('description')[:10])
+        assert plan_problems(queries.captured_queries[0]['sql'])
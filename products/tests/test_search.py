@@ -0,0 +1,98 @@
+import pytest
+from decimal import Decimal
+from django.contrib.admin.sites import AdminSite
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from products.admin import ControllerAdmin
+from products.models import Category, Controller
+from products.search import fts5_query, render_highlight, search_controllers
+
+
+class TestSearchHelpers:
+    def test_fts5_query_strips_syntax(self):
+        """Test user input cannot inject FTS5 operators"""
+        assert fts5_query('arcade "stick" OR(') == '"arcade"* "stick"* "OR"*'
+        assert fts5_query('!!!') == ''
+
+    def test_render_highlight_escapes(self):
+        """Test highlighted text is escaped before adding mark tags"""
+        rendered = render_highlight('<b>⟦arcade⟧</b>')
+        assert rendered == '&lt;b&gt;<mark>arcade</mark>&lt;/b&gt;'
+
+
+@pytest.mark.django_db
+class TestControllerSearch:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = Client()
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category'
+        )
+        self.arcade = Controller.objects.create(
+            name='Arcade Stick Pro',
+            description='Tournament arcade stick with Sanwa buttons.',
+            category=self.category,
+            price=Decimal('199.99'),
+        )
+        self.gamepad = Controller.objects.create(
+            name='Wireless Gamepad',
+            description='Lightweight pad that also works with arcade games.',
+            category=self.category,
+            price=Decimal('59.99'),
+        )
+        self.other = Controller.objects.create(
+            name='Racing Wheel',
+            description='Force feedback wheel.',
+            category=self.category,
+            price=Decimal('299.99'),
+        )
+
+    def test_search_ranks_name_matches_first(self):
+        """Test controllers are ranked and non-matches excluded"""
+        results = search_controllers('arcade')
+        assert [c.id for c in results] == [self.arcade.id, self.gamepad.id]
+
+    def test_search_highlights_matches(self):
+        """Test results carry a highlighted excerpt"""
+        results = search_controllers('sanwa')
+        assert results == [self.arcade]
+        assert '<mark>Sanwa</mark>' in results[0].headline
+
+    def test_search_index_follows_saves(self):
+        """Test edits and deletes are reflected in search results"""
+        self.other.description = 'Arcade racing wheel.'
+        self.other.save()
+        assert self.other in search_controllers('arcade')
+
+        self.arcade.delete()
+        assert self.arcade.id not in [c.id for c in search_controllers('arcade')]
+
+    def test_empty_query(self):
+        """Test blank queries return nothing"""
+        assert search_controllers('   ') == []
+
+    def test_search_view(self):
+        """Test the storefront search page"""
+        response = self.client.get(reverse('products:search'), {'q': 'wireless'})
+
+        assert response.status_code == 200
+        assert list(response.context['results']) == [self.gamepad]
+        assert b'Wireless Gamepad' in response.content
+
+    def test_search_view_no_results(self):
+        """Test the search page reports when nothing matches"""
+        response = self.client.get(reverse('products:search'), {'q': 'joystick'})
+
+        assert response.status_code == 200
+        assert b'No controllers match' in response.content
+
+    def test_admin_uses_search_index(self):
+        """Test the admin changelist search goes through the same index"""
+        admin = ControllerAdmin(Controller, AdminSite())
+        request = RequestFactory().get('/admin/products/controller/')
+        queryset, may_have_duplicates = admin.get_search_results(
+            request, Controller.objects.all(), 'sanwa'
+        )
+        assert list(queryset) == [self.arcade]
+        assert may_have_duplicates is False
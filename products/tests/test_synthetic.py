@@ -0,0 +1,87 @@
+import pytest
+import random
+from collections import Counter
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from cart.models import Cart, CartItem
+from products.models import Category, Controller, FacetCount
+from products.synthetic import (
+    DatasetSpec, clear_dataset, dataset_fingerprint, generate_dataset, zipf_rank,
+)
+
+
+class TestZipfRank:
+    def test_ranks_in_range_and_skewed(self):
+        """Test ranks stay in range and favour the head of the catalog"""
+        rng = random.Random(1)
+        ranks = Counter(zipf_rank(rng, 1000, 1.1) for _ in range(20000))
+        assert min(ranks) >= 0 and max(ranks) < 1000
+        assert ranks[0] > 20 * ranks.get(500, 1)
+
+
+@pytest.mark.django_db
+class TestGenerateDataset:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.spec = DatasetSpec(seed=7, categories=5, controllers=300, users=120, batch_size=50)
+
+    def test_generates_requested_sizes(self):
+        """Test every table is filled to the requested size"""
+        totals = generate_dataset(self.spec)
+
+        assert totals['categories'] == Category.objects.count() == 5
+        assert totals['controllers'] == Controller.objects.count() == 300
+        assert totals['carts'] == Cart.objects.count() > 0
+        assert totals['cart items'] == CartItem.objects.count() >= totals['carts']
+        user = User.objects.get(username='synth-0000001')
+        assert not user.has_usable_password()
+        assert not authenticate(username='synth-0000001', password='synthetic')
+
+    def test_is_deterministic(self):
+        """Test the same seed reproduces the same rows"""
+        generate_dataset(self.spec)
+        first = dataset_fingerprint()
+        clear_dataset()
+        assert not Controller.objects.exists()
+
+        generate_dataset(self.spec)
+        assert dataset_fingerprint() == first
+
+        clear_dataset()
+        generate_dataset(DatasetSpec(seed=8, categories=5, controllers=300, users=120))
+        assert dataset_fingerprint() != first
+
+    def test_bulk_create_matches_copy(self):
+        """Test COPY and bulk_create load identical data"""
+        generate_dataset(self.spec)
+        first = dataset_fingerprint()
+        clear_dataset()
+        self.spec.use_copy = False
+        generate_dataset(self.spec)
+        assert dataset_fingerprint() == first
+
+    def test_cart_popularity_is_skewed(self):
+        """Test a few controllers dominate cart items and no cart repeats one"""
+        generate_dataset(self.spec)
+        counts = Counter(CartItem.objects.values_list('controller_id', flat=True))
+        assert counts.most_common(1)[0][1] >= 5 * (sum(counts.values()) / 300)
+        lines = CartItem.objects.values_list('cart_id', 'controller_id')
+        assert len(set(lines)) == len(lines)
+
+    def test_command(self):
+        """Test the command generates data and rebuilds facet counts"""
+        options = {'seed': 1, 'categories': 3, 'controllers': 50, 'users': 10}
+        call_command('generate_dataset', allow_production=True, **options)
+        call_command('generate_dataset', allow_production=True, clear=True, **options)
+
+        assert Controller.objects.count() == 50
+        assert sum(FacetCount.objects.values_list('count', flat=True)) == 50
+
+    def test_command_refuses_without_debug(self, settings):
+        """Test the command refuses to run with DEBUG off unless allowed"""
+        settings.DEBUG = False
+        with pytest.raises(CommandError, match='--allow-production'):
+            call_command('generate_dataset', seed=1, categories=3, controllers=50, users=10)
+
+        assert not Controller.objects.exists()
@@ -7,4 +7,6 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     path('controller/<int:id>/', views.controller_detail, name='controller_detail'),
+    path('search/', views.search, name='search'),
+    path('diagnostics/home/', views.home_diagnostics, name='home_diagnostics'),
 ] 
\ No newline at end of file
@@ -1,59 +1,122 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models.functions import Substr
+from cart.context_processors import acart_badge
+from game_ctrl.query_check import query_budget
 from .models import Category, Controller
-from cart.models import Cart
-from django.template.loader import get_template
+from .cache import cache_catalog_page
+from .diagnostics import HOMEPAGE_TEMPLATE, get_template_diagnostics
+from .pagination import InvalidCursor, paginate_keyset
+from .facets import (
+    apply_filters, facet_counts, facet_groups, load_facet_cube,
+    parse_filters, search_facet_cube,
+)
+from .search import match_controllers, search_controllers
 import logging
 
 logger = logging.getLogger(__name__)
 
-def home(request):
+# Columns rendered by products/includes/product_card.html
+CARD_FIELDS = ('id', 'name', 'price', 'image', 'image_widths', 'created_at')
+CARD_SUMMARY_LENGTH = 200
+FEATURED_LIMIT = 6
+
+@query_budget(6)
+@cache_catalog_page
+async def home(request):
     """Homepage view with featured controllers"""
-    template = get_template('home.html')
-    logger.info(f"Using template from: {template.origin.name}")
-    
-    # Add debug info to context
+    # cache_catalog_page has resolved request.user
     context = {
-        'debug_info': {
-            'template_path': template.origin.name,
-            'template_exists': template.origin.exists,
-            'template_content': open(template.origin.name).read()[:100]  # First 100 chars
-        }
+        'featured_controllers': [
+            controller async for controller in Controller.objects.filter(is_featured=True)[:FEATURED_LIMIT]
+        ],
+        'categories': [category async for category in Category.objects.all()],
+        **await acart_badge(request),
     }
-    
-    # Add your existing context
-    context.update({
-        'featured_controllers': Controller.objects.filter(is_featured=True),
-        'categories': Category.objects.all(),
-    })
-    
-    # Print debug info to console
-    print("DEBUG: Template Info:", context['debug_info'])
-    
-    # Add cart to context if user is authenticated
-    if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user)
-            context['cart'] = cart
-        except Cart.DoesNotExist:
-            pass
-            
     return render(request, 'home.html', context)
 
+@staff_member_required
+def home_diagnostics(request):
+    """Internal endpoint describing the template the homepage renders"""
+    return JsonResponse({'debug_info': get_template_diagnostics(HOMEPAGE_TEMPLATE)})
+
+@query_budget(8)
+@cache_catalog_page
 def category_detail(request, slug):
     """Category detail view"""
     category = get_object_or_404(Category, slug=slug)
-    controllers = Controller.objects.filter(category=category).order_by('-created_at')
+    filters = parse_filters(request.GET)
+    filters.pop('category', None)
+    controllers = (
+        apply_filters(Controller.objects.filter(category=category), filters)
+        .only(*CARD_FIELDS)
+        .annotate(summary=Substr('description', 1, CARD_SUMMARY_LENGTH))
+    )
+    try:
+        page = paginate_keyset(
+            controllers,
+            cursor=request.GET.get('cursor'),
+            page_size=settings.CATALOG_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        raise Http404("Invalid page")
+
+    counts = facet_counts(
+        load_facet_cube(),
+        category_id=category.id,
+        band=filters.get('price'),
+        featured=filters.get('featured'),
+    )
 
     return render(request, 'products/category_detail.html', {
         'category': category,
-        'controllers': controllers,
+        'controllers': page.object_list,
+        'page': page,
+        'facet_groups': facet_groups(request.GET, counts),
     })
 
-def controller_detail(request, id):
+@query_budget(5)
+@cache_catalog_page
+async def controller_detail(request, id):
     """Controller detail view"""
-    controller = get_object_or_404(Controller, id=id)
+    controller = await aget_object_or_404(Controller, id=id)
 
     return render(request, 'products/controller_detail.html', {
         'controller': controller,
+        **await acart_badge(request),
     })
 
+@query_budget(8)
+@cache_catalog_page
+def search(request):
+    """Full-text search over controller names and descriptions"""
+    query = request.GET.get('q', '').strip()[:200]
+    if not query:
+        return render(request, 'products/search.html', {'query': query, 'results': []})
+
+    filters = parse_filters(request.GET)
+    results = search_controllers(
+        query,
+        queryset=apply_filters(Controller.objects.all(), filters),
+        limit=settings.SEARCH_RESULTS_LIMIT,
+    )
+
+    # Facet counts cover every match, whatever the current selections
+    categories = Category.objects.in_bulk()
+    selected_category = next(
+        (pk for pk, c in categories.items() if c.slug == filters.get('category')), None
+    )
+    counts = facet_counts(
+        search_facet_cube(match_controllers(Controller.objects.all(), query)),
+        category_id=selected_category,
+        band=filters.get('price'),
+        featured=filters.get('featured'),
+    )
+
+    return render(request, 'products/search.html', {
+        'query': query,
+        'results': results,
+        'facet_groups': facet_groups(request.GET, counts, categories),
+    })
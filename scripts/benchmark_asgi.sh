@@ -0,0 +1,32 @@
+#!/bin/bash
+# Compare the WSGI and ASGI deployments under concurrent load.
+#
+# Starts gunicorn with sync workers on :8000 and with uvicorn workers on
+# :8001 against the same database, loads both with benchmark_concurrency,
+# then stops them. Seed the database first (manage.py generate_dataset).
+#
+#   scripts/benchmark_asgi.sh [--concurrency 200 --duration 30 ...]
+set -euo pipefail
+cd "$(dirname "$0")/.."
+
+WORKERS=${WEB_CONCURRENCY:-3}
+
+gunicorn game_ctrl.wsgi:application --bind 127.0.0.1:8000 --workers "$WORKERS" \
+    --access-logfile /dev/null &
+WSGI_PID=$!
+GUNICORN_BIND=127.0.0.1:8001 GUNICORN_ACCESS_LOG=/dev/null WEB_CONCURRENCY=$WORKERS \
+    gunicorn -c python:game_ctrl.gunicorn_asgi &
+ASGI_PID=$!
+trap 'kill $WSGI_PID $ASGI_PID 2>/dev/null' EXIT
+
+for port in 8000 8001; do
+    for _ in $(seq 30); do
+        curl -sf "http://127.0.0.1:$port/health/" >/dev/null && break
+        sleep 1
+    done
+done
+
+python manage.py benchmark_concurrency \
+    --target wsgi=http://127.0.0.1:8000 \
+    --target asgi=http://127.0.0.1:8001 \
+    "$@"
@@ -0,0 +1,104 @@
+"""
+Compare the per-request cost of the homepage view with and without the
+template debug capture it used to run on every request. Runs against a
+throwaway test database, created and destroyed around the benchmark.
+
+    python scripts/benchmark_home.py [iterations]
+"""
+import os
+import sys
+import timeit
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'game_ctrl.settings.test')
+
+import django  # noqa: E402
+import logging  # noqa: E402
+
+django.setup()
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.template.loader import get_template  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+from products.models import Category, Controller  # noqa: E402
+from products.views import home  # noqa: E402
+
+logger = logging.getLogger('products.views')
+
+
+def legacy_debug_capture():
+    """The work the homepage used to do before rendering"""
+    template = get_template('home.html')
+    logger.info(f"Using template from: {template.origin.name}")
+    debug_info = {
+        'template_path': template.origin.name,
+        # Origin has no ``exists`` attribute; the old view raised here
+        'template_exists': os.path.exists(template.origin.name),
+        'template_content': open(template.origin.name).read()[:100],
+    }
+    print("DEBUG: Template Info:", debug_info)
+
+
+def main(iterations=200):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        run(iterations)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def run(iterations):
+    category = Category.objects.create(name='Bench', slug='bench')
+    for i in range(6):
+        Controller.objects.create(
+            name=f'Controller {i}',
+            description='Benchmark controller',
+            price=Decimal('99.99'),
+            category=category,
+            is_featured=True,
+        )
+
+    view = async_to_sync(home.__wrapped__)  # bypass the anonymous page cache
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+
+    def before():
+        legacy_debug_capture()
+        view(request)
+
+    def after():
+        view(request)
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        # Keep the log formatting cost but send the output nowhere
+        streams = [
+            (handler, handler.setStream(devnull))
+            for handler in logging.getLogger().handlers
+            if isinstance(handler, logging.StreamHandler)
+        ]
+        try:
+            before_time = min(timeit.repeat(before, number=iterations, repeat=3))
+            after_time = min(timeit.repeat(after, number=iterations, repeat=3))
+        finally:
+            sys.stdout = stdout
+            for handler, stream in streams:
+                handler.setStream(stream)
+
+    before_ms = before_time / iterations * 1000
+    after_ms = after_time / iterations * 1000
+    print(f'before: {before_ms:.3f} ms/request')
+    print(f'after:  {after_ms:.3f} ms/request')
+    print(f'saved:  {before_ms - after_ms:.3f} ms/request '
+          f'({(1 - after_ms / before_ms) * 100:.1f}%)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)